@@ -18,12 +18,32 @@
 from __future__ import annotations
 
 import logging
-from argparse import ArgumentParser, Namespace
+from argparse import ArgumentParser, ArgumentTypeError, Namespace
 from typing import Dict, Type
 
 import bfebench
 
 
+def positive_float(value: str) -> float:
+    """
+    argparse type for numbers > 0.
+    """
+    number = float(value)
+    if number <= 0:
+        raise ArgumentTypeError("%s is not > 0" % value)
+    return number
+
+
+def non_negative_float(value: str) -> float:
+    """
+    argparse type for numbers >= 0.
+    """
+    number = float(value)
+    if number < 0:
+        raise ArgumentTypeError("%s is not >= 0" % value)
+    return number
+
+
 class SubCommand(object):
     help: str | None = None
 
@@ -20,11 +20,20 @@ from argparse import ArgumentParser, Namespace
 
 from bfebench.environments_configuration import EnvironmentsConfiguration
 from bfebench.protocols import PROTOCOL_SPECIFICATIONS
-from bfebench.simulation import Simulation
+from bfebench.simulation import (
+    P2P_TRANSPORT_SOCKET,
+    P2P_TRANSPORTS,
+    WORKER_MODE_FORK,
+    WORKER_MODE_WARM,
+    WORKER_MODES,
+    Simulation,
+)
 
 from ..const import DEFAULT_PRICE
 from ..simulation_result_collector import SimulationResultCollector
-from .command import SubCommand
+from ..utils.link import LinkProfile
+from ..utils.serializer import SERIALIZER_CLASSES, JsonSerializer, get_serializer
+from .command import SubCommand, non_negative_float, positive_float
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +70,54 @@ class RunCommand(SubCommand):
             default=1,
         )
         argument_parser.add_argument("-e", "--environments-configuration", default=".environments.yaml")
+        argument_parser.add_argument(
+            "--serializer",
+            choices=[serializer_cls.NAME for serializer_cls in SERIALIZER_CLASSES],
+            default=JsonSerializer.NAME,
+            help="encoding of the p2p messages",
+        )
+        argument_parser.add_argument(
+            "--p2p-transport",
+            choices=P2P_TRANSPORTS,
+            default=P2P_TRANSPORT_SOCKET,
+            help="channel between seller and buyer, shared-memory leaves out the IPC overhead of sockets",
+        )
+        argument_parser.add_argument(
+            "--link-latency",
+            type=non_negative_float,
+            default=None,
+            help="simulate a network link between seller and buyer with this one-way latency (in seconds)",
+        )
+        argument_parser.add_argument(
+            "--link-bandwidth",
+            type=positive_float,
+            default=None,
+            help="simulate a network link between seller and buyer with this bandwidth (in bytes per second)",
+        )
+        argument_parser.add_argument(
+            "--link-jitter",
+            type=non_negative_float,
+            default=None,
+            help="maximum deviation from the link latency (in seconds)",
+        )
+        argument_parser.add_argument(
+            "--worker-mode",
+            choices=WORKER_MODES,
+            default=WORKER_MODE_FORK,
+            help="fork new strategy processes for each iteration, or keep warm ones for all iterations",
+        )
+        argument_parser.add_argument(
+            "--parallel",
+            type=int,
+            default=1,
+            help="number of exchanges to run at the same time, each needs its own environment set",
+        )
+        argument_parser.add_argument(
+            "--no-pipeline",
+            dest="pipeline",
+            action="store_false",
+            help="do not prepare the next iteration while the current one is running",
+        )
         argument_parser.add_argument("--output-csv", help="write CSV file with results", default=None)
 
     def __call__(self, args: Namespace) -> int:
@@ -74,6 +131,34 @@ class RunCommand(SubCommand):
             logger.error("Could not load environments configuration: %s: %s" % (e.strerror, e.filename))
             return 1
 
+        try:
+            serializer = get_serializer(args.serializer)
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
+
+        if args.worker_mode == WORKER_MODE_WARM and args.p2p_transport != P2P_TRANSPORT_SOCKET:
+            logger.error("the %s worker mode requires the %s p2p transport" % (WORKER_MODE_WARM, P2P_TRANSPORT_SOCKET))
+            return 1
+
+        if not 1 <= args.parallel <= len(environments_configuration.environment_sets):
+            logger.error(
+                "--parallel has to be between 1 and the number of environment sets (%d)"
+                % len(environments_configuration.environment_sets)
+            )
+            return 1
+
+        link_profile = None
+        if args.link_latency is not None or args.link_bandwidth is not None or args.link_jitter is not None:
+            if args.p2p_transport != P2P_TRANSPORT_SOCKET:
+                logger.error("link simulation requires the %s p2p transport" % P2P_TRANSPORT_SOCKET)
+                return 1
+            link_profile = LinkProfile(
+                latency=args.link_latency or 0.0,
+                bandwidth=args.link_bandwidth,
+                jitter=args.link_jitter or 0.0,
+            )
+
         protocol = protocol_specification.protocol(
             filename=args.filename,
             price=args.price,
@@ -96,7 +181,11 @@ class RunCommand(SubCommand):
 
         buyer_strategy = buyer_strategy_cls(protocol=protocol)
 
-        result_collector = SimulationResultCollector(csv_file=args.output_csv)
+        try:
+            result_collector = SimulationResultCollector(csv_file=args.output_csv)
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
 
         simulation = Simulation(
             environments_configuration=environments_configuration,
@@ -105,6 +194,12 @@ class RunCommand(SubCommand):
             buyer_strategy=buyer_strategy,
             iterations=args.iterations,
             result_collector=result_collector,
+            serializer=serializer,
+            p2p_transport=args.p2p_transport,
+            link_profile=link_profile,
+            worker_mode=args.worker_mode,
+            parallel=args.parallel,
+            pipeline=args.pipeline,
         )
         simulation.run()
 
@@ -29,6 +29,8 @@ from eth_typing.evm import ChecksumAddress
 from semantic_version import Version  # type: ignore
 from solcx.exceptions import SolcInstallationError  # type: ignore
 
+from .decorators import span
+
 logger = logging.getLogger(__name__)
 
 
@@ -107,6 +109,7 @@ class SolidityContractSourceCodeManager(object):
 
         self._source_files.append(tmp_source_code_file_abs)
 
+    @span("compile")
     def compile(self, solc_version: str) -> dict[str, SolidityContract]:
         self._ensure_solc(solc_version)
         solcx.set_solc_version(solc_version)
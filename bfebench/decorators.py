@@ -14,3 +14,144 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+
+from __future__ import annotations
+
+import time
+from functools import wraps
+from threading import Lock, local
+from types import TracebackType
+from typing import Any, Callable, Dict, List, NamedTuple, Type, TypeVar, cast
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# reasons for which a process can be blocked, see `blocked`
+BLOCKED_CHAIN = "chain"
+BLOCKED_P2P = "p2p"
+
+
+class SpanStats(NamedTuple):
+    """
+    Recorded calls of a `span`.
+    """
+
+    """number of times the span has been entered"""
+    calls: int
+
+    """time spent in the span in total, in nanoseconds"""
+    total_ns: int
+
+    @property
+    def seconds(self) -> float:
+        return self.total_ns / 1e9
+
+
+# spans recorded in this process: name -> [calls, total_ns]
+_spans: Dict[str, List[int]] = {}
+_spans_lock = Lock()
+
+
+class span(object):
+    """
+    Time a block (`with span("encode"):`) or each call of a function (`@span("encode")`) and add the time to the span
+    with the given name. Spans are recorded per process, see `get_spans`. Nested spans are recorded independently, so
+    the time of an inner span is also part of the outer one.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._start = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def __enter__(self) -> span:
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self._record(time.perf_counter_ns() - self._start)
+
+    def _record(self, duration: int) -> None:
+        with _spans_lock:
+            stats = _spans.setdefault(self._name, [0, 0])
+            stats[0] += 1
+            stats[1] += duration
+
+    def __call__(self, func: F) -> F:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            # a new instance per call, the function may run in several threads at once
+            with self.__class__(self._name):
+                return func(*args, **kwargs)
+
+        return cast(F, wrapper)
+
+
+def get_spans() -> Dict[str, SpanStats]:
+    """
+    :return: the spans recorded in this process since the last `reset_spans`
+    """
+    with _spans_lock:
+        return {name: SpanStats(*stats) for name, stats in _spans.items()}
+
+
+def reset_spans() -> None:
+    with _spans_lock:
+        _spans.clear()
+
+
+# time blocked in this process: reason -> total_ns
+_blocked: Dict[str, int] = {}
+_blocked_lock = Lock()
+_blocked_local = local()
+
+
+class blocked(span):
+    """
+    Like `span`, but for the time in which the process waits for something outside of it, with the reason
+    (`BLOCKED_CHAIN` or `BLOCKED_P2P`) as name, see `get_blocked_times`.
+
+    Unlike spans, nested blocked sections are not recorded on their own: only the outermost one of a thread counts,
+    e.g. the RPC calls made while waiting for a block are part of the time blocked by the wait.
+    """
+
+    def __enter__(self) -> blocked:
+        depth: int = getattr(_blocked_local, "depth", 0)
+        _blocked_local.depth = depth + 1
+        self._outermost = depth == 0
+        super().__enter__()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        super().__exit__(exc_type, exc_value, traceback)
+        _blocked_local.depth -= 1
+
+    def _record(self, duration: int) -> None:
+        if self._outermost:
+            with _blocked_lock:
+                _blocked[self.name] = _blocked.get(self.name, 0) + duration
+
+
+def get_blocked_times() -> Dict[str, float]:
+    """
+    :return: seconds blocked by reason in this process since the last `reset_blocked_times`
+    """
+    with _blocked_lock:
+        return {reason: total_ns / 1e9 for reason, total_ns in _blocked.items()}
+
+
+def reset_blocked_times() -> None:
+    with _blocked_lock:
+        _blocked.clear()
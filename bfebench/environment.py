@@ -31,9 +31,10 @@ from web3.datastructures import AttributeDict
 from web3.exceptions import TimeExhausted
 from web3.middleware.geth_poa import geth_poa_middleware
 from web3.middleware.signing import construct_sign_and_send_raw_middleware
-from web3.types import TxParams, TxReceipt
+from web3.types import RPCEndpoint, RPCResponse, TxParams, TxReceipt
 
 from .contract import Contract
+from .decorators import BLOCKED_CHAIN, blocked, span
 from .errors import EnvironmentRuntimeError
 
 DEFAULT_WAIT_POLL_INTERVAL = 0.3  # 300 ms
@@ -42,6 +43,20 @@ DEFAULT_WAIT_POLL_INTERVAL = 0.3  # 300 ms
 logger = logging.getLogger(__name__)
 
 
+def blocked_middleware(
+    make_request: Callable[[RPCEndpoint, Any], RPCResponse], web3: Web3
+) -> Callable[[RPCEndpoint, Any], RPCResponse]:
+    """
+    Records the time spent in RPC requests as blocked by the chain.
+    """
+
+    def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+        with blocked(BLOCKED_CHAIN):
+            return make_request(method, params)
+
+    return middleware
+
+
 class EnvironmentWaitResult(Enum):
     TIMEOUT = 1
     CONDITION = 2
@@ -80,6 +95,8 @@ class Environment(object):
         self._total_tx_fees = 0
 
         self.web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        # innermost, so that e.g. signing transactions does not count as blocked
+        self.web3.middleware_onion.inject(blocked_middleware, layer=0)
 
         if self.private_key is not None:
             self.web3.middleware_onion.add(construct_sign_and_send_raw_middleware(self.private_key))
@@ -145,6 +162,7 @@ class Environment(object):
     def send_direct_transaction(self, to: ChecksumAddress | None, value: int = 0) -> TxReceipt:
         return self._send_transaction(to=to, value=value)
 
+    @span("transaction")
     def _send_transaction(
         self,
         to: ChecksumAddress | None = None,
@@ -184,7 +202,8 @@ class Environment(object):
         for retry in range(1, retries + 1):
             try:
                 tx_hash = self.web3.eth.send_transaction(tx_draft)
-                tx_receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash, poll_latency=1, timeout=60)
+                with blocked(BLOCKED_CHAIN):
+                    tx_receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash, poll_latency=1, timeout=60)
                 return tx_receipt
             except TimeExhausted as e:
                 try:
@@ -198,6 +217,8 @@ class Environment(object):
                     raise e
         raise RuntimeError("should never reach here")
 
+    @span("wait")
+    @blocked(BLOCKED_CHAIN)
     def wait(
         self,
         timeout: float | None = None,
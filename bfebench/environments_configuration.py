@@ -15,7 +15,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Any, Dict
+from typing import Any, Dict, List, NamedTuple
 
 import yaml
 from web3 import Web3
@@ -25,6 +25,12 @@ from .environment import Environment
 from .errors import EnvironmentsConfigurationError
 
 
+class EnvironmentSet(NamedTuple):
+    operator_environment: Environment
+    seller_environment: Environment
+    buyer_environment: Environment
+
+
 class EnvironmentsConfiguration(object):
     def __init__(self, filename: str) -> None:
         with open(filename, "r") as fp:
@@ -33,9 +39,20 @@ class EnvironmentsConfiguration(object):
         if data is None:
             raise EnvironmentsConfigurationError("%s does not seem to contain valid YAML" % filename)
 
-        self._operator_environment = self._yaml2environment(data.get("operator"), "Operator")
-        self._seller_environment = self._yaml2environment(data.get("seller"), "Seller")
-        self._buyer_environment = self._yaml2environment(data.get("buyer"), "Buyer")
+        self._environment_sets = [self._yaml2environment_set(data)]
+        parallel_data = data.get("parallel", [])
+        if not isinstance(parallel_data, list):
+            raise EnvironmentsConfigurationError("parallel has to be a list of environment sets")
+        for set_data in parallel_data:
+            self._environment_sets.append(self._yaml2environment_set(set_data))
+
+    @classmethod
+    def _yaml2environment_set(cls, data: Any) -> EnvironmentSet:
+        return EnvironmentSet(
+            operator_environment=cls._yaml2environment(data.get("operator"), "Operator"),
+            seller_environment=cls._yaml2environment(data.get("seller"), "Seller"),
+            buyer_environment=cls._yaml2environment(data.get("buyer"), "Buyer"),
+        )
 
     @staticmethod
     def _yaml2environment(data: Dict[str, Any], wallet_name: str) -> Environment:
@@ -54,14 +71,21 @@ class EnvironmentsConfiguration(object):
             private_key=wallet_config.get("privateKey"),
         )
 
+    @property
+    def environment_sets(self) -> List[EnvironmentSet]:
+        """
+        The main environment set followed by the ones for running exchanges in parallel.
+        """
+        return self._environment_sets
+
     @property
     def operator_environment(self) -> Environment:
-        return self._operator_environment
+        return self._environment_sets[0].operator_environment
 
     @property
     def seller_environment(self) -> Environment:
-        return self._seller_environment
+        return self._environment_sets[0].seller_environment
 
     @property
     def buyer_environment(self) -> Environment:
-        return self._buyer_environment
+        return self._environment_sets[0].buyer_environment
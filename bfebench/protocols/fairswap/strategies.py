@@ -17,26 +17,35 @@
 
 import os
 from math import log2
+from typing import Any, Tuple
 
 from eth_typing.evm import ChecksumAddress
 
 from ...contract import Contract, SolidityContractSourceCodeManager
+from ...decorators import span
 from ...environment import Environment, EnvironmentWaitResult
 from ...utils.bytes import generate_bytes
 from ...utils.json_stream import JsonObjectSocketStream
-from ...utils.merkle import MerkleTreeNode, from_bytes, mt2obj, obj2mt
+from ...utils.keccak import keccak
+from ...utils.merkle import (
+    MerkleTreeNode,
+    digest_from_file,
+    from_file,
+)
 from ..strategy import BuyerStrategy, SellerStrategy
 from .protocol import Fairswap
 from .util import (
     B032,
     LeafDigestMismatchError,
-    NodeDigestMismatchError,
     crypt,
-    decode,
     encode,
     encode_forge_first_leaf,
     encode_forge_first_leaf_first_hash,
-    keccak,
+    encode_from_file,
+    find_complaint,
+    get_plain_root_digest,
+    obj2tree,
+    tree2obj,
 )
 
 
@@ -49,39 +58,21 @@ class FaithfulSeller(SellerStrategy[Fairswap]):
     ) -> None:
         # === PHASE 1: transfer file / initialize (deploy contract) ===
         # transmit encrypted data
-        with open(self.protocol.filename, "rb") as fp:
-            data = fp.read()
-        data_merkle = from_bytes(data, keccak, slice_count=self.protocol.slice_count)
         data_key = generate_bytes(32)
-        data_merkle_encrypted = self.encode_file(data_merkle, data_key)
+        with span("encode"):
+            data_merkle_digest, data_merkle_encrypted = self.encode_file(data_key)
 
         # deploy contract
-        scscm = SolidityContractSourceCodeManager()
-        scscm.add_contract_template_file(
-            os.path.join(os.path.dirname(__file__), Fairswap.CONTRACT_TEMPLATE_FILE),
-            {
-                "merkle_tree_depth": log2(self.protocol.slice_count) + 1,
-                "slice_length": self.protocol.slice_length,
-                "slice_count": self.protocol.slice_count,
-                "receiver": str(opposite_address),
-                "price": self.protocol.price,
-                "key_commitment": "0x" + keccak(data_key).hex(),
-                "ciphertext_root_hash": "0x" + data_merkle_encrypted.digest.hex(),
-                "file_root_hash": "0x" + data_merkle.digest.hex(),
-                "timeout": self.protocol.timeout,
-            },
+        contract = self.deploy_contract(
+            environment, opposite_address, data_key, data_merkle_digest, data_merkle_encrypted.digest
         )
-        contracts = scscm.compile(Fairswap.CONTRACT_SOLC_VERSION)
-        contract = contracts[Fairswap.CONTRACT_NAME]
-        tx_receipt = environment.deploy_contract(contract)
-        self.logger.debug("deployed contract at %s (%s gas used)" % (contract.address, tx_receipt["gasUsed"]))
         web3_contract = environment.get_web3_contract(contract)
 
         p2p_stream.send_object(
             {
                 "contract_address": contract.address,
                 "contract_abi": contract.abi,
-                "tree": mt2obj(data_merkle_encrypted, encode_func=lambda b: bytes(b).hex()),
+                "tree": tree2obj(data_merkle_encrypted, self.protocol.binary_tree),
             }
         )
 
@@ -93,12 +84,12 @@ class FaithfulSeller(SellerStrategy[Fairswap]):
         )
         if result == EnvironmentWaitResult.TIMEOUT:
             self.logger.debug("timeout reached, requesting refund")
-            environment.send_contract_transaction(contract, "refund")
+            self.refund(environment, contract)
             return
         self.logger.debug("accepted")
 
         # === PHASE 3: reveal key ===
-        environment.send_contract_transaction(contract, "revealKey", data_key, gas_limit=65000)
+        self.reveal_key(environment, contract, data_key)
 
         # === PHASE 5: finalize
         self.logger.debug("waiting for confirmation or timeout...")
@@ -108,26 +99,76 @@ class FaithfulSeller(SellerStrategy[Fairswap]):
         )
         if result == EnvironmentWaitResult.TIMEOUT:
             self.logger.debug("timeout reached, requesting refund")
-            environment.send_contract_transaction(contract, "refund")
+            self.refund(environment, contract)
             return
 
-    def encode_file(self, data_merkle: MerkleTreeNode, data_key: bytes) -> MerkleTreeNode:
-        return encode(data_merkle, data_key)
+    @span("deploy")
+    def deploy_contract(
+        self,
+        environment: Environment,
+        opposite_address: ChecksumAddress,
+        data_key: bytes,
+        file_root_hash: bytes,
+        ciphertext_root_hash: bytes,
+    ) -> Contract:
+        scscm = SolidityContractSourceCodeManager()
+        scscm.add_contract_template_file(
+            os.path.join(os.path.dirname(__file__), Fairswap.CONTRACT_TEMPLATE_FILE),
+            {
+                "merkle_tree_depth": log2(self.protocol.slice_count) + 1,
+                "slice_length": self.protocol.slice_length,
+                "slice_count": self.protocol.slice_count,
+                "receiver": str(opposite_address),
+                "price": self.protocol.price,
+                "key_commitment": "0x" + keccak(data_key).hex(),
+                "ciphertext_root_hash": "0x" + ciphertext_root_hash.hex(),
+                "file_root_hash": "0x" + file_root_hash.hex(),
+                "timeout": self.protocol.timeout,
+            },
+        )
+        contracts = scscm.compile(Fairswap.CONTRACT_SOLC_VERSION)
+        contract = contracts[Fairswap.CONTRACT_NAME]
+        tx_receipt = environment.deploy_contract(contract)
+        self.logger.debug("deployed contract at %s (%s gas used)" % (contract.address, tx_receipt["gasUsed"]))
+        return contract
+
+    @span("reveal")
+    def reveal_key(self, environment: Environment, contract: Contract, data_key: bytes) -> None:
+        environment.send_contract_transaction(contract, "revealKey", data_key, gas_limit=65000)
+
+    @span("refund")
+    def refund(self, environment: Environment, contract: Contract) -> None:
+        environment.send_contract_transaction(contract, "refund")
+
+    def encode_file(self, data_key: bytes) -> Tuple[bytes, MerkleTreeNode]:
+        """
+        Encode the file in a single pass, without building the plain tree.
+
+        :return: the root digest of the plain file and the encoded file
+        """
+        data_merkle_encrypted = encode_from_file(self.protocol.filename, data_key, self.protocol.slice_count)
+        return get_plain_root_digest(data_merkle_encrypted, data_key), data_merkle_encrypted
+
+    def get_plain_file(self) -> MerkleTreeNode:
+        return from_file(self.protocol.filename, keccak, slice_count=self.protocol.slice_count)
 
 
 class RootForgingSeller(FaithfulSeller):
-    def encode_file(self, data_merkle: MerkleTreeNode, data_key: bytes) -> MerkleTreeNode:
-        return encode(data_merkle, generate_bytes(32, avoid=data_key))
+    def encode_file(self, data_key: bytes) -> Tuple[bytes, MerkleTreeNode]:
+        data_merkle = self.get_plain_file()
+        return data_merkle.digest, encode(data_merkle, generate_bytes(32, avoid=data_key))
 
 
 class LeafForgingSeller(FaithfulSeller):
-    def encode_file(self, data_merkle: MerkleTreeNode, data_key: bytes) -> MerkleTreeNode:
-        return encode_forge_first_leaf(data_merkle, data_key)
+    def encode_file(self, data_key: bytes) -> Tuple[bytes, MerkleTreeNode]:
+        data_merkle = self.get_plain_file()
+        return data_merkle.digest, encode_forge_first_leaf(data_merkle, data_key)
 
 
 class NodeForgingSeller(FaithfulSeller):
-    def encode_file(self, data_merkle: MerkleTreeNode, data_key: bytes) -> MerkleTreeNode:
-        return encode_forge_first_leaf_first_hash(data_merkle, data_key)
+    def encode_file(self, data_key: bytes) -> Tuple[bytes, MerkleTreeNode]:
+        data_merkle = self.get_plain_file()
+        return data_merkle.digest, encode_forge_first_leaf_first_hash(data_merkle, data_key)
 
 
 class FairswapBuyer(BuyerStrategy[Fairswap]):
@@ -135,15 +176,29 @@ class FairswapBuyer(BuyerStrategy[Fairswap]):
         super().__init__(protocol)
 
         # caching expected file digest here to avoid hashing to be counted during execution
-        with open(self.protocol.filename, "rb") as fp:
-            data = fp.read()
-        data_merkle = from_bytes(data, keccak, slice_count=self.protocol.slice_count)
-        self._expected_plain_digest = data_merkle.digest
+        self._expected_plain_digest = digest_from_file(
+            self.protocol.filename, keccak, slice_count=self.protocol.slice_count
+        )
 
     @property
     def expected_plain_digest(self) -> bytes:
         return self._expected_plain_digest
 
+    @span("accept")
+    def accept(self, environment: Environment, contract: Contract) -> None:
+        tx_receipt = environment.send_contract_transaction(
+            contract, "accept", value=self.protocol.price, gas_limit=50000
+        )
+        self.logger.debug("Sent 'accept' transaction (%s Gas used)" % tx_receipt["gasUsed"])
+
+    @span("complain")
+    def complain(self, environment: Environment, contract: Contract, method: str, *args: Any) -> None:
+        environment.send_contract_transaction(contract, method, *args)
+
+    @span("refund")
+    def refund(self, environment: Environment, contract: Contract) -> None:
+        environment.send_contract_transaction(contract, "refund")
+
     def run(
         self,
         environment: Environment,
@@ -162,11 +217,7 @@ class FaithfulBuyer(FairswapBuyer):
     ) -> None:
         # === PHASE 1: wait for seller initialization ===
         init_info, byte_count = p2p_stream.receive_object()
-        data_merkle_encrypted = obj2mt(
-            data=init_info.get("tree"),
-            digest_func=keccak,
-            decode_func=lambda s: bytes.fromhex(str(s)),
-        )
+        data_merkle_encrypted = obj2tree(init_info["tree"])
         contract = Contract(abi=init_info.get("contract_abi"), address=init_info.get("contract_address"))
         web3_contract = environment.get_web3_contract(contract)
 
@@ -183,10 +234,7 @@ class FaithfulBuyer(FairswapBuyer):
             self.logger.debug("wrong ciphertext hash")
             return
 
-        tx_receipt = environment.send_contract_transaction(
-            contract, "accept", value=self.protocol.price, gas_limit=50000
-        )
-        self.logger.debug("Sent 'accept' transaction (%s Gas used)" % tx_receipt["gasUsed"])
+        self.accept(environment, contract)
 
         # === PHASE 3: wait for key revelation ===
         self.logger.debug("waiting for key revelation")
@@ -196,36 +244,39 @@ class FaithfulBuyer(FairswapBuyer):
         )
         if result == EnvironmentWaitResult.TIMEOUT:
             self.logger.debug("timeout reached, requesting refund")
-            environment.send_contract_transaction(contract, "refund")
+            self.refund(environment, contract)
             return
 
         data_key = web3_contract.functions.key().call()
         self.logger.debug("key revealed")
 
         # === PHASE 4: complain ===
-        if (
-            crypt(data_merkle_encrypted.leaves[-2].data, 2 * self.protocol.slice_count - 2, data_key)
-            != self.expected_plain_digest
-        ):
-            environment.send_contract_transaction(
+        with span("verify"):
+            plain_root_digest = crypt(
+                data_merkle_encrypted.leaves[-2].data, 2 * self.protocol.slice_count - 2, data_key
+            )
+        if plain_root_digest != self.expected_plain_digest:
+            self.complain(
+                environment,
                 contract,
                 "complainAboutRoot",
                 data_merkle_encrypted.leaves[-2].digest,
-                data_merkle_encrypted.get_proof(data_merkle_encrypted.leaves[-2]),
+                data_merkle_encrypted.get_proof_by_index(data_merkle_encrypted.leaf_count - 2),
             )
             return
         else:
-            data_merkle, errors = decode(data_merkle_encrypted, data_key)
-            if len(errors) == 0:
+            with span("decode"):
+                error = find_complaint(data_merkle_encrypted, data_key)
+            if error is None:
                 if self.protocol.send_buyer_confirmation:
                     environment.send_contract_transaction(contract, "noComplain")
                 else:
                     self.logger.debug("file successfully decrypted, quitting.")
                     # not calling `noComplain` here, no benefit for buyer (rational party)
                 return
-            elif isinstance(errors[-1], LeafDigestMismatchError):
-                error: NodeDigestMismatchError = errors[-1]
-                environment.send_contract_transaction(
+            elif isinstance(error, LeafDigestMismatchError):
+                self.complain(
+                    environment,
                     contract,
                     "complainAboutLeaf",
                     error.index_out,
@@ -233,13 +284,13 @@ class FaithfulBuyer(FairswapBuyer):
                     error.out.digest,
                     error.in1.data_as_list(),
                     error.in2.data_as_list(),
-                    data_merkle_encrypted.get_proof(error.out),
-                    data_merkle_encrypted.get_proof(error.in1),
+                    data_merkle_encrypted.get_proof_by_index(error.index_out),
+                    data_merkle_encrypted.get_proof_by_index(error.index_in),
                 )
                 return
             else:
-                error = errors[-1]
-                environment.send_contract_transaction(
+                self.complain(
+                    environment,
                     contract,
                     "complainAboutNode",
                     error.index_out,
@@ -247,8 +298,8 @@ class FaithfulBuyer(FairswapBuyer):
                     error.out.digest,
                     error.in1.digest,
                     error.in2.digest,
-                    data_merkle_encrypted.get_proof(error.out),
-                    data_merkle_encrypted.get_proof(error.in1),
+                    data_merkle_encrypted.get_proof_by_index(error.index_out),
+                    data_merkle_encrypted.get_proof_by_index(error.index_in),
                 )
                 return
 
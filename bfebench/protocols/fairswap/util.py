@@ -15,33 +15,129 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
+from base64 import b64decode
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
 from math import log2
-from typing import List, Tuple, Type
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
 
-from Crypto.Hash import keccak as base_keccak
-
-from bfebench.utils.merkle import MerkleTreeLeaf, MerkleTreeNode, from_leaves
+from bfebench.utils.bytes import Buffer
+from bfebench.utils.keccak import keccak, keccak_many
+from bfebench.utils.merkle import (
+    FlatMerkleTree,
+    MerkleTreeLeaf,
+    MerkleTreeNode,
+    bytes2mt,
+    from_list,
+    mt2bytes,
+    mt2obj,
+    obj2mt,
+    read_slices,
+)
 from bfebench.utils.xor import xor_crypt
 
 B032 = b"\x00" * 32
 
+# maximum number of cached (index, key) pads, about 200 bytes each
+KEYSTREAM_CACHE_SIZE = 2**16
+
+# number of leaves or digests a worker process decrypts or hashes at once in `decode` and `find_complaint`
+DECODE_CHUNK_SIZE = 2**12
+
 
-def keccak(data: bytes) -> bytes:
-    return base_keccak.new(data=data, digest_bytes=32).digest()
+@lru_cache(maxsize=KEYSTREAM_CACHE_SIZE)
+def keystream(index: int, key: bytes) -> bytes:
+    """
+    Pad used by `crypt` for the given index and key. Pads are cached, since `encode` and `decode` of one tree (and
+    the buyer's checks afterwards) use every (index, key) pair more than once. The cache is bounded by
+    `KEYSTREAM_CACHE_SIZE` entries.
+    """
+    return keccak(index.to_bytes(length=32, byteorder="big") + key)
 
 
-def crypt(value: bytes, index: int, key: bytes) -> bytes:
-    return xor_crypt(value, keccak(index.to_bytes(length=32, byteorder="big") + key))
+def crypt(value: Buffer, index: int, key: bytes) -> bytes:
+    return xor_crypt(value, keystream(index, key))
 
 
 def encode(root: MerkleTreeNode, key: bytes) -> MerkleTreeNode:
-    leaves_enc = [crypt(leaf.data, index, key) for index, leaf in enumerate(root.leaves)]
-    digests_enc = [crypt(digest, len(leaves_enc) + index, key) for index, digest in enumerate(root.digests_pack)]
-    return from_leaves(
-        [MerkleTreeLeaf(keccak, x) for x in leaves_enc]
-        + [MerkleTreeLeaf(keccak, x) for x in digests_enc]
-        + [MerkleTreeLeaf(keccak, B032)]
-    )
+    # the encrypted leaves are consumed by the tree one by one instead of being collected in a list first
+    items: Iterator[Buffer] = itertools.chain((leaf.data_view for leaf in root.leaves), root.digests_pack)
+    items_enc = itertools.chain((crypt(data, index, key) for index, data in enumerate(items)), [B032])
+    if root.leaf_count > 0 and log2(root.leaf_count).is_integer():
+        return FlatMerkleTree(keccak, items_enc, 2 * root.leaf_count)
+    return from_list(list(items_enc), keccak)
+
+
+def encode_stream(leaves_data: Iterable[Buffer], key: bytes) -> Iterator[bytes]:
+    """
+    Encode plain leaves without building the plain tree first. Yields the leaves of the tree `encode` creates, in the
+    same order: every encrypted leaf as soon as its plain leaf has been consumed, followed by the encrypted digests
+    and the terminating `B032`.
+
+    Only the digests are kept in memory, since all digests of a level precede the next level in the encoded tree.
+    The number of leaves has to be a power of 2.
+    """
+    # roots of complete subtrees waiting for their right sibling, by height
+    pending: List[Optional[bytes]] = []
+    # digests of all inner nodes by height (height 0 are the parents of the leaves), each level left to right
+    levels: List[List[bytes]] = []
+    leaf_count = 0
+    for leaf_count, data in enumerate(leaves_data, start=1):
+        yield crypt(data, leaf_count - 1, key)
+        digest, height = keccak(data), 0
+        while height < len(pending):
+            left = pending[height]
+            if left is None:
+                break
+            digest = keccak(left + digest)
+            pending[height] = None
+            if len(levels) == height:
+                levels.append([])
+            levels[height].append(digest)
+            height += 1
+        if height == len(pending):
+            pending.append(digest)
+        else:
+            pending[height] = digest
+
+    if leaf_count == 0 or not log2(leaf_count).is_integer():
+        raise ValueError("leaf count must be a power of 2")
+    index = leaf_count
+    for level in levels:
+        for digest in level:
+            yield crypt(digest, index, key)
+            index += 1
+    yield B032
+
+
+def encode_from_file(filename: str, key: bytes, slice_count: int = 8) -> MerkleTreeNode:
+    """
+    Create the same tree as `encode(from_file(filename, keccak, slice_count), key)`, reading the file slice by slice
+    and building the encoded tree while reading.
+    """
+    return FlatMerkleTree(keccak, encode_stream(read_slices(filename, slice_count), key), 2 * slice_count)
+
+
+def get_plain_root_digest(root: MerkleTreeNode, key: bytes) -> bytes:
+    """
+    :return: the root digest of the plain tree, which the encoded tree (as created by `encode`) contains as its
+        second to last leaf
+    """
+    return crypt(root.leaves[-2].data, root.leaf_count - 2, key)
 
 
 def encode_forge_first_leaf(root: MerkleTreeNode, key: bytes) -> MerkleTreeNode:
@@ -49,11 +145,7 @@ def encode_forge_first_leaf(root: MerkleTreeNode, key: bytes) -> MerkleTreeNode:
     leaf_data[0] = b"\0" * len(leaf_data[0])
     leaf_data_enc = [crypt(data, index, key) for index, data in enumerate(leaf_data)]
     digests_enc = [crypt(digest, len(leaf_data_enc) + index, key) for index, digest in enumerate(root.digests_pack)]
-    return from_leaves(
-        [MerkleTreeLeaf(keccak, x) for x in leaf_data_enc]
-        + [MerkleTreeLeaf(keccak, x) for x in digests_enc]
-        + [MerkleTreeLeaf(keccak, B032)]
-    )
+    return from_list(leaf_data_enc + digests_enc + [B032], keccak)
 
 
 def encode_forge_first_leaf_first_hash(root: MerkleTreeNode, key: bytes) -> MerkleTreeNode:
@@ -67,75 +159,201 @@ def encode_forge_first_leaf_first_hash(root: MerkleTreeNode, key: bytes) -> Merk
         MerkleTreeLeaf(keccak, leaf_data[1]),
     ).digest
     digests_enc = [crypt(digest, len(leaf_data_enc) + index, key) for index, digest in enumerate(digests)]
-    return from_leaves(
-        [MerkleTreeLeaf(keccak, x) for x in leaf_data_enc]
-        + [MerkleTreeLeaf(keccak, x) for x in digests_enc]
-        + [MerkleTreeLeaf(keccak, B032)]
-    )
+    return from_list(leaf_data_enc + digests_enc + [B032], keccak)
+
+
+def decode(
+    root: MerkleTreeNode, key: bytes, workers: int = 1
+) -> Tuple[MerkleTreeNode, List["NodeDigestMismatchError"]]:
+    """
+    Decrypt the encoded tree and check all of its digests level by level.
+
+    :param root: encoded tree as created by `encode`
+    :param key: key used for encoding
+    :param workers: number of processes decrypting and hashing the levels
+    :return: the decoded tree and all digest mismatches, bottom-up and left to right
+    """
+    leaves_enc = _get_encoded_leaves(root)
+    digest_start_index = len(leaves_enc) // 2
+    with _executor(workers) as executor:
+        tree = from_list(_map_chunks(executor, _crypt_chunk, leaves_enc[:digest_start_index], 0, key), keccak)
+        # decrypted digests, each one is the expected digest on its own level and an input on the next level
+        digests_dec = _map_chunks(executor, _crypt_chunk, leaves_enc[digest_start_index:-1], digest_start_index, key)
+
+        errors: List[NodeDigestMismatchError] = []
+        for first, last in _get_levels(digest_start_index):
+            if first == 0:
+                actual_digests = tree.digests_pack[:last]
+            else:
+                actual_digests = _map_chunks(
+                    executor, _keccak_chunk, _get_digest_pairs(digests_dec, first, last, digest_start_index), 0, key
+                )
+            errors += _get_level_errors(leaves_enc, digests_dec, first, actual_digests)
+    return tree, errors
+
+
+def find_complaint(root: MerkleTreeNode, key: bytes, workers: int = 1) -> Optional["NodeDigestMismatchError"]:
+    """
+    Find the mismatch a buyer complains about, which is the last error reported by `decode` (the right-most mismatch
+    on the highest level containing mismatches).
+
+    The levels are checked top-down, the search stops at the first level containing a mismatch. Levels below it
+    (including the leaves) are neither decrypted nor hashed.
+
+    :return: the mismatch or None, if the encoded tree is consistent
+    """
+    leaves_enc = _get_encoded_leaves(root)
+    digest_start_index = len(leaves_enc) // 2
+    levels = list(reversed(_get_levels(digest_start_index)))
+    digests_dec: List[bytes] = [b""] * (digest_start_index - 1)
+    with _executor(workers) as executor:
+        first, last = levels[0]
+        digests_dec[first:last] = _map_chunks(
+            executor,
+            _crypt_chunk,
+            leaves_enc[digest_start_index + first : digest_start_index + last],
+            digest_start_index + first,
+            key,
+        )
+        for first, last in levels:
+            if first == 0:
+                leaves_dec = _map_chunks(executor, _crypt_chunk, leaves_enc[:digest_start_index], 0, key)
+                leaf_digests = _map_chunks(executor, _keccak_chunk, leaves_dec, 0, key)
+                actual_digests = _map_chunks(
+                    executor, _keccak_chunk, _get_digest_pairs(leaf_digests, first, last, 0), 0, key
+                )
+            else:
+                children_first, children_last = 2 * first - digest_start_index, 2 * last - digest_start_index
+                digests_dec[children_first:children_last] = _map_chunks(
+                    executor,
+                    _crypt_chunk,
+                    leaves_enc[2 * first : 2 * last],
+                    2 * first,
+                    key,
+                )
+                actual_digests = _map_chunks(
+                    executor, _keccak_chunk, _get_digest_pairs(digests_dec, first, last, digest_start_index), 0, key
+                )
+            errors = _get_level_errors(leaves_enc, digests_dec, first, actual_digests)
+            if len(errors) > 0:
+                return errors[-1]
+    return None
+
+
+def tree2obj(tree: MerkleTreeNode, binary: bool = False) -> Union[bytes, str, List[Any]]:
+    """
+    Representation of a tree in a p2p message: nested lists of hex encoded leaves or, if `binary` is set, the
+    `mt2bytes` format. The latter is carried as raw bytes by serializers supporting it and base64 encoded otherwise,
+    which is still about a third smaller and does not need recursive parsing.
+    """
+    if binary:
+        return mt2bytes(tree)
+    return mt2obj(tree, encode_func=lambda b: bytes(b).hex())
+
 
+def obj2tree(obj: Union[bytes, str, List[Any]]) -> MerkleTreeNode:
+    """
+    Inverse of `tree2obj`, for all representations.
+    """
+    if isinstance(obj, bytes):
+        return bytes2mt(obj, keccak)
+    if isinstance(obj, str):
+        return bytes2mt(b64decode(obj), keccak)
+    return obj2mt(obj, digest_func=keccak, decode_func=lambda s: bytes.fromhex(str(s)))
 
-def decode(root: MerkleTreeNode, key: bytes) -> Tuple[MerkleTreeNode, List["NodeDigestMismatchError"]]:
-    leaf_bytes_enc = root.leaves
-    if not log2(len(leaf_bytes_enc)).is_integer():
+
+def _get_encoded_leaves(root: MerkleTreeNode) -> List[MerkleTreeLeaf]:
+    leaves_enc = root.leaves
+    if not log2(len(leaves_enc)).is_integer():
         raise ValueError("Merkle Tree must have 2^x leaves")
-    if leaf_bytes_enc[-1] != B032:
+    if leaves_enc[-1] != B032:
         raise ValueError("The provided Merkle Tree does not appear to be encoded")
+    return leaves_enc
 
-    errors: List[NodeDigestMismatchError] = []
-    digest_start_index = int(len(leaf_bytes_enc) / 2)
-    node_index = 0
-    digest_index = digest_start_index
-    nodes: List[MerkleTreeNode] = [
-        MerkleTreeLeaf(keccak, crypt(leaf_bytes_enc[i].data, i, key)) for i in range(0, digest_start_index)
-    ]
-    while len(nodes) > 1:
-        nodes_new = []
-        for i in range(0, len(nodes), 2):
-            node = MerkleTreeNode(keccak, nodes[i], nodes[i + 1])
-            expected_digest = crypt(
-                leaf_bytes_enc[digest_index].data,
-                digest_index,
-                key,
-            )
 
+def _get_levels(leaf_count: int) -> List[Tuple[int, int]]:
+    """
+    Ranges of the offsets of all levels in the packed digests, bottom-up.
+    """
+    levels = []
+    first, size = 0, leaf_count // 2
+    while size > 0:
+        levels.append((first, first + size))
+        first, size = first + size, size // 2
+    return levels
+
+
+def _get_digest_pairs(digests: List[bytes], first: int, last: int, offset: int) -> List[bytes]:
+    """
+    Concatenated inputs of the packed digests first to last (exclusive). The inputs of the n-th packed digest are
+    `digests[2n - offset]` and `digests[2n + 1 - offset]`.
+    """
+    return [digests[2 * i - offset] + digests[2 * i + 1 - offset] for i in range(first, last)]
+
+
+def _get_level_errors(
+    leaves_enc: List[MerkleTreeLeaf], digests_dec: List[bytes], first: int, actual_digests: List[bytes]
+) -> List["NodeDigestMismatchError"]:
+    digest_start_index = len(leaves_enc) // 2
+    errors: List[NodeDigestMismatchError] = []
+    for offset, actual_digest in enumerate(actual_digests, start=first):
+        # inputs of the n-th packed digest are the encoded leaves 2n and 2n+1
+        node_index = 2 * offset
+        digest_index = digest_start_index + offset
+        if digests_dec[offset] != actual_digest:
             if node_index < digest_start_index:
                 error_type: Type[NodeDigestMismatchError] = LeafDigestMismatchError
-                actual_digest = node.digest
             else:
                 error_type = NodeDigestMismatchError
-                actual_digest = keccak(
-                    crypt(
-                        leaf_bytes_enc[node_index].data,
-                        node_index,
-                        key,
-                    )
-                    + crypt(
-                        leaf_bytes_enc[node_index + 1].data,
-                        node_index + 1,
-                        key,
-                    )
+            errors.append(
+                error_type(
+                    in1=leaves_enc[node_index],
+                    in2=leaves_enc[node_index + 1],
+                    out=leaves_enc[digest_index],
+                    index_in=node_index,
+                    index_out=digest_index,
+                    expected_digest=digests_dec[offset],
+                    actual_digest=actual_digest,
                 )
+            )
+    return errors
+
+
+def _executor(workers: int) -> ContextManager[Optional[Executor]]:
+    if workers < 1:
+        raise ValueError("workers must be >= 1")
+    if workers == 1:
+        return nullcontext()
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def _map_chunks(
+    executor: Optional[Executor],
+    func: Callable[[Sequence[Buffer], int, bytes], List[bytes]],
+    items: Sequence[Union[MerkleTreeLeaf, bytes]],
+    first_index: int,
+    key: bytes,
+) -> List[bytes]:
+    """
+    Apply `func` to the items, split into chunks of `DECODE_CHUNK_SIZE` items if an executor is given. The results
+    keep the order of the items.
+    """
+    if executor is None:
+        return func([item.data_view if isinstance(item, MerkleTreeLeaf) else item for item in items], first_index, key)
+    data = [item.data if isinstance(item, MerkleTreeLeaf) else item for item in items]
+    futures = [
+        executor.submit(func, data[start : start + DECODE_CHUNK_SIZE], first_index + start, key)
+        for start in range(0, len(data), DECODE_CHUNK_SIZE)
+    ]
+    return list(itertools.chain.from_iterable(future.result() for future in futures))
 
-            if expected_digest != actual_digest:
-                errors.append(
-                    error_type(
-                        in1=leaf_bytes_enc[node_index],
-                        in2=leaf_bytes_enc[node_index + 1],
-                        out=leaf_bytes_enc[digest_index],
-                        index_in=node_index,
-                        index_out=digest_index,
-                        expected_digest=expected_digest,
-                        actual_digest=actual_digest,
-                    )
-                )
 
-            node_index += 2
-            digest_index += 1
-            nodes_new.append(node)
+def _crypt_chunk(data: Sequence[Buffer], first_index: int, key: bytes) -> List[bytes]:
+    return [crypt(value, first_index + i, key) for i, value in enumerate(data)]
 
-        nodes = nodes_new
 
-    return nodes[0], errors
+def _keccak_chunk(data: Sequence[Buffer], first_index: int, key: bytes) -> List[bytes]:
+    return keccak_many(data)
 
 
 class DecodingError(Exception):
@@ -26,8 +26,8 @@ from eth_typing.evm import ChecksumAddress
 
 from ...contract import Contract, SolidityContractSourceCodeManager
 from ...environment import Environment
+from ...utils.keccak import keccak
 from ..fairswap.protocol import Fairswap
-from ..fairswap.util import keccak
 
 logger = logging.getLogger(__name__)
 
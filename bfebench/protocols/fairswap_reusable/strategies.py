@@ -16,20 +16,24 @@
 # limitations under the License.
 
 from math import log2
+from typing import Any
 
 from eth_typing.evm import ChecksumAddress
 
+from ...decorators import span
 from ...environment import Environment, EnvironmentWaitResult
 from ...utils.bytes import generate_bytes
 from ...utils.json_stream import JsonObjectSocketStream
-from ...utils.merkle import from_bytes, mt2obj, obj2mt
+from ...utils.keccak import keccak
+from ...utils.merkle import digest_from_file
 from ..fairswap.util import (
     B032,
     LeafDigestMismatchError,
-    NodeDigestMismatchError,
-    decode,
-    encode,
-    keccak,
+    encode_from_file,
+    find_complaint,
+    get_plain_root_digest,
+    obj2tree,
+    tree2obj,
 )
 from ..strategy import BuyerStrategy, SellerStrategy
 from .protocol import FairswapReusable, FileSaleSession
@@ -44,14 +48,12 @@ class FaithfulSeller(SellerStrategy[FairswapReusable]):
     ) -> None:
         # === PHASE 1: transfer file / initialize ===
         # transmit encrypted data
-        with open(self.protocol.filename, "rb") as fp:
-            data = fp.read()
-        data_merkle = from_bytes(data, keccak, slice_count=self.protocol.slice_count)
-        data_merkle_digest = data_merkle.digest
         data_key = generate_bytes(32)
-        data_merkle_encrypted = encode(data_merkle, data_key)
+        with span("encode"):
+            data_merkle_encrypted = encode_from_file(self.protocol.filename, data_key, self.protocol.slice_count)
+        data_merkle_digest = get_plain_root_digest(data_merkle_encrypted, data_key)
 
-        p2p_stream.send_object({"tree": mt2obj(data_merkle_encrypted, encode_func=lambda b: bytes(b).hex())})
+        p2p_stream.send_object({"tree": tree2obj(data_merkle_encrypted, self.protocol.binary_tree)})
 
         session_id = self.protocol.get_session_id(
             seller=environment.wallet_address,
@@ -60,19 +62,7 @@ class FaithfulSeller(SellerStrategy[FairswapReusable]):
         )
 
         self.logger.debug("initializing smart contract")
-        environment.send_contract_transaction(
-            self.protocol.contract,
-            "init",
-            opposite_address,
-            int(log2(self.protocol.slice_count) + 1),
-            self.protocol.slice_length,
-            self.protocol.slice_count,
-            self.protocol.timeout,
-            self.protocol.price,
-            keccak(data_key),
-            data_merkle_encrypted.digest,
-            data_merkle_digest,
-        )
+        self.init_session(environment, opposite_address, data_key, data_merkle_digest, data_merkle_encrypted.digest)
 
         # === PHASE 2: wait for buyer accept ===
         self.logger.debug("waiting for accept")
@@ -85,12 +75,12 @@ class FaithfulSeller(SellerStrategy[FairswapReusable]):
 
         if result == EnvironmentWaitResult.TIMEOUT:
             self.logger.debug("timeout reached, requesting refund")
-            environment.send_contract_transaction(self.protocol.contract, "refund", session_id)
+            self.refund(environment, session_id)
             return
         self.logger.debug("accepted")
 
         # === PHASE 3: reveal key ===
-        environment.send_contract_transaction(self.protocol.contract, "revealKey", session_id, data_key)
+        self.reveal_key(environment, session_id, data_key)
 
         # === PHASE 5: finalize
         self.logger.debug("waiting for confirmation or timeout...")
@@ -100,24 +90,66 @@ class FaithfulSeller(SellerStrategy[FairswapReusable]):
         )
         if result == EnvironmentWaitResult.TIMEOUT:
             self.logger.debug("timeout reached, requesting refund")
-            environment.send_contract_transaction(self.protocol.contract, "refund", session_id)
+            self.refund(environment, session_id)
             return
 
+    @span("initialize")
+    def init_session(
+        self,
+        environment: Environment,
+        opposite_address: ChecksumAddress,
+        data_key: bytes,
+        file_root_hash: bytes,
+        ciphertext_root_hash: bytes,
+    ) -> None:
+        environment.send_contract_transaction(
+            self.protocol.contract,
+            "init",
+            opposite_address,
+            int(log2(self.protocol.slice_count) + 1),
+            self.protocol.slice_length,
+            self.protocol.slice_count,
+            self.protocol.timeout,
+            self.protocol.price,
+            keccak(data_key),
+            ciphertext_root_hash,
+            file_root_hash,
+        )
+
+    @span("reveal")
+    def reveal_key(self, environment: Environment, session_id: bytes, data_key: bytes) -> None:
+        environment.send_contract_transaction(self.protocol.contract, "revealKey", session_id, data_key)
+
+    @span("refund")
+    def refund(self, environment: Environment, session_id: bytes) -> None:
+        environment.send_contract_transaction(self.protocol.contract, "refund", session_id)
+
 
 class FairswapReusableBuyer(BuyerStrategy[FairswapReusable]):
     def __init__(self, protocol: FairswapReusable) -> None:
         super().__init__(protocol)
 
         # caching expected file digest here to avoid hashing to be counted during execution
-        with open(self.protocol.filename, "rb") as fp:
-            data = fp.read()
-        data_merkle = from_bytes(data, keccak, slice_count=self.protocol.slice_count)
-        self._expected_plain_digest = data_merkle.digest
+        self._expected_plain_digest = digest_from_file(
+            self.protocol.filename, keccak, slice_count=self.protocol.slice_count
+        )
 
     @property
     def expected_plain_digest(self) -> bytes:
         return self._expected_plain_digest
 
+    @span("accept")
+    def accept(self, environment: Environment, session_id: bytes) -> None:
+        environment.send_contract_transaction(self.protocol.contract, "accept", session_id, value=self.protocol.price)
+
+    @span("complain")
+    def complain(self, environment: Environment, method: str, *args: Any) -> None:
+        environment.send_contract_transaction(self.protocol.contract, method, *args)
+
+    @span("refund")
+    def refund(self, environment: Environment, session_id: bytes) -> None:
+        environment.send_contract_transaction(self.protocol.contract, "refund", session_id)
+
     def run(
         self,
         environment: Environment,
@@ -136,11 +168,7 @@ class FaithfulBuyer(FairswapReusableBuyer):
     ) -> None:
         # === PHASE 1: wait for seller initialization ===
         init_info, byte_count = p2p_stream.receive_object()
-        data_merkle_encrypted = obj2mt(
-            data=init_info.get("tree"),
-            digest_func=keccak,
-            decode_func=lambda s: bytes.fromhex(str(s)),
-        )
+        data_merkle_encrypted = obj2tree(init_info["tree"])
 
         session_id = self.protocol.get_session_id(
             seller=environment.wallet_address,
@@ -164,7 +192,7 @@ class FaithfulBuyer(FairswapReusableBuyer):
             self.logger.debug("wrong ciphertext hash")
             return
 
-        environment.send_contract_transaction(self.protocol.contract, "accept", session_id, value=self.protocol.price)
+        self.accept(environment, session_id)
 
         # === PHASE 3: wait for key revelation ===
         self.logger.debug("waiting for key revelation")
@@ -174,22 +202,22 @@ class FaithfulBuyer(FairswapReusableBuyer):
         )
         if result == EnvironmentWaitResult.TIMEOUT:
             self.logger.debug("timeout reached, requesting refund")
-            environment.send_contract_transaction(self.protocol.contract, "refund", session_id)
+            self.refund(environment, session_id)
             return
 
         data_key = FileSaleSession(*web3_contract.functions.sessions(session_id).call()).key
         self.logger.debug("key revealed")
 
         # === PHASE 4: complain ===
-        data_merkle, errors = decode(data_merkle_encrypted, data_key)
-        if len(errors) == 0:
+        with span("decode"):
+            error = find_complaint(data_merkle_encrypted, data_key)
+        if error is None:
             self.logger.debug("file successfully decrypted, quitting.")
             # not calling `noComplain` here, no benefit for buyer (rational party)
             return
-        elif isinstance(errors[-1], LeafDigestMismatchError):
-            error: NodeDigestMismatchError = errors[-1]
-            environment.send_contract_transaction(
-                self.protocol.contract,
+        elif isinstance(error, LeafDigestMismatchError):
+            self.complain(
+                environment,
                 "complainAboutLeaf",
                 session_id,
                 error.index_out,
@@ -197,14 +225,13 @@ class FaithfulBuyer(FairswapReusableBuyer):
                 error.out.data,
                 error.in1.data_as_list(),
                 error.in2.data_as_list(),
-                data_merkle_encrypted.get_proof(error.out),
-                data_merkle_encrypted.get_proof(error.in1),
+                data_merkle_encrypted.get_proof_by_index(error.index_out),
+                data_merkle_encrypted.get_proof_by_index(error.index_in),
             )
             return
         else:
-            error = errors[-1]
-            environment.send_contract_transaction(
-                self.protocol.contract,
+            self.complain(
+                environment,
                 "complainAboutNode",
                 session_id,
                 error.index_out,
@@ -212,8 +239,8 @@ class FaithfulBuyer(FairswapReusableBuyer):
                 error.out.data,
                 error.in1.data,
                 error.in2.data,
-                data_merkle_encrypted.get_proof(error.out),
-                data_merkle_encrypted.get_proof(error.in1),
+                data_merkle_encrypted.get_proof_by_index(error.index_out),
+                data_merkle_encrypted.get_proof_by_index(error.index_in),
             )
             return
 
@@ -25,13 +25,16 @@ from ..utils.types import to_bool
 
 
 class Protocol(object):
-    def __init__(self, filename: str, price: int, send_buyer_confirmation: bool = False, **kwargs: Any) -> None:
+    def __init__(
+        self, filename: str, price: int, send_buyer_confirmation: bool = False, binary_tree: bool = False, **kwargs: Any
+    ) -> None:
         if len(kwargs) > 0:
             raise BaseError("unhandled protocol keyword parameters: %s" % ", ".join(kwargs.keys()))
 
         self._filename = filename
         self._price = int(price)
         self._send_buyer_confirmation = to_bool(send_buyer_confirmation)
+        self._binary_tree = to_bool(binary_tree)
 
     @property
     def filename(self) -> str:
@@ -45,6 +48,13 @@ class Protocol(object):
     def send_buyer_confirmation(self) -> bool:
         return self._send_buyer_confirmation
 
+    @property
+    def binary_tree(self) -> bool:
+        """
+        Whether trees are sent in the compact binary format instead of nested lists of hex strings.
+        """
+        return self._binary_tree
+
     def set_up_simulation(
         self,
         environment: Environment,
@@ -30,6 +30,7 @@ from web3._utils.filters import LogFilter
 from web3.contract import ContractFunction
 from web3.datastructures import AttributeDict
 
+from ...decorators import span
 from ...environment import Environment
 from ..fairswap.util import B032
 from .file_sale import FileSale
@@ -96,6 +97,7 @@ class FileSaleHelper(object):
     def hash_channel_state(self, state: Channel.State) -> bytes:
         return bytes(Web3.solidityKeccak(["bytes"], [self.encode_channel_state(state)]))
 
+    @span("sign")
     def sign_channel_state(self, channel_state: Channel.State, private_key: HexBytes | bytes | None = None) -> bytes:
         if private_key is None:
             private_key = self._environment.private_key
@@ -103,6 +105,7 @@ class FileSaleHelper(object):
         signed_message = Account.sign_message(encode_defunct(self.hash_channel_state(channel_state)), private_key)
         return bytes(signed_message.signature)
 
+    @span("verify")
     def validate_signed_channel_state(
         self,
         channel_state: Channel.State,
@@ -123,6 +126,7 @@ class FileSaleHelper(object):
     def hash_withdrawal_auth(self, authorization: AssetHolder.WithdrawalAuth) -> bytes:
         return bytes(Web3.solidityKeccak(["bytes"], [self.encode_withdrawal_auth(authorization)]))
 
+    @span("sign")
     def sign_withdrawal_auth(
         self,
         authorization: AssetHolder.WithdrawalAuth,
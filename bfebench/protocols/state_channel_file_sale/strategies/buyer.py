@@ -23,15 +23,16 @@ from typing import Callable
 
 from eth_typing.evm import ChecksumAddress
 
+from ....decorators import span
 from ....environment import Environment
 from ....utils.json_stream import JsonObjectSocketStream
-from ....utils.merkle import from_bytes, obj2mt
+from ....utils.keccak import keccak
+from ....utils.merkle import digest_from_file
 from ...fairswap.util import (
     LeafDigestMismatchError,
-    NodeDigestMismatchError,
     crypt,
-    decode,
-    keccak,
+    find_complaint,
+    obj2tree,
 )
 from ...strategy import BuyerStrategy
 from ..file_sale import FileSale, FileSalePhase
@@ -45,10 +46,9 @@ class StateChannelFileSaleBuyer(BuyerStrategy[StateChannelFileSale]):
         super().__init__(protocol)
 
         # caching expected file digest here to avoid hashing to be counted during execution
-        with open(self.protocol.filename, "rb") as fp:
-            data = fp.read()
-        data_merkle = from_bytes(data, keccak, slice_count=self.protocol.slice_count)
-        self._expected_plain_digest = data_merkle.digest
+        self._expected_plain_digest = digest_from_file(
+            self.protocol.filename, keccak, slice_count=self.protocol.slice_count
+        )
 
     def run(
         self,
@@ -102,6 +102,7 @@ class StateChannelFileSaleBuyer(BuyerStrategy[StateChannelFileSale]):
         # see https://labs.hyperledger.org/perun-doc/concepts/protocols_phases.html#finalize-phase
         self.close_state_channel(environment, p2p_stream, last_common_state)
 
+    @span("open")
     def open_state_channel(
         self, environment: Environment, p2p_stream: JsonObjectSocketStream
     ) -> Adjudicator.SignedState:
@@ -127,6 +128,7 @@ class StateChannelFileSaleBuyer(BuyerStrategy[StateChannelFileSale]):
             sigs=[remote_signature, file_sale_helper.sign_channel_state(channel_state)],
         )
 
+    @span("fund")
     def fund_state_channel(self, environment: Environment, funding_id: bytes) -> None:
         if self.protocol.buyer_deposit > 0:
             environment.send_contract_transaction(
@@ -157,11 +159,7 @@ class StateChannelFileSaleBuyer(BuyerStrategy[StateChannelFileSale]):
             raise StateChannelDisagreement("seller does not reply to initialization", last_common_state)
 
         assert msg_init["action"] == "initialize"
-        data_merkle_encrypted = obj2mt(
-            data=msg_init.get("tree"),
-            digest_func=keccak,
-            decode_func=lambda s: bytes.fromhex(str(s)),
-        )
+        data_merkle_encrypted = obj2tree(msg_init["tree"])
         key_commitment = bytes.fromhex(msg_init["key_commitment"])
 
         # === PHASE 2: accept (check before!) ===
@@ -238,10 +236,11 @@ class StateChannelFileSaleBuyer(BuyerStrategy[StateChannelFileSale]):
             # released key does not match key commitment
             raise StateChannelDisagreement("key does not match commitment", last_common_state)
 
-        if (
-            crypt(data_merkle_encrypted.leaves[-2].data, 2 * self.protocol.slice_count - 2, proposed_app_state.key)
-            != self._expected_plain_digest
-        ):
+        with span("verify"):
+            plain_root_digest = crypt(
+                data_merkle_encrypted.leaves[-2].data, 2 * self.protocol.slice_count - 2, proposed_app_state.key
+            )
+        if plain_root_digest != self._expected_plain_digest:
             # released key matches key commitment,
             # but decoding root element using this key reveals wrong plain root hash
             raise StateChannelDisagreement(
@@ -254,12 +253,13 @@ class StateChannelFileSaleBuyer(BuyerStrategy[StateChannelFileSale]):
                     tuple(last_common_state.state),
                     last_common_state.sigs[0],
                     data_merkle_encrypted.leaves[-2].digest,
-                    data_merkle_encrypted.get_proof(data_merkle_encrypted.leaves[-2]),
+                    data_merkle_encrypted.get_proof_by_index(data_merkle_encrypted.leaf_count - 2),
                 ),
             )
 
-        data_merkle, errors = decode(data_merkle_encrypted, proposed_app_state.key)
-        if len(errors) == 0:
+        with span("decode"):
+            error = find_complaint(data_merkle_encrypted, proposed_app_state.key)
+        if error is None:
             self.logger.debug("file successfully decrypted")
             last_common_state.state = proposed_channel_state
             last_common_state.sigs = [
@@ -271,8 +271,7 @@ class StateChannelFileSaleBuyer(BuyerStrategy[StateChannelFileSale]):
             return
 
         # === PHASE 4: complain ===
-        elif isinstance(errors[-1], LeafDigestMismatchError):
-            error: NodeDigestMismatchError = errors[-1]
+        elif isinstance(error, LeafDigestMismatchError):
             raise StateChannelDisagreement(
                 reason="leaf hash mismatch",
                 last_common_state=last_common_state,
@@ -287,12 +286,11 @@ class StateChannelFileSaleBuyer(BuyerStrategy[StateChannelFileSale]):
                     error.out.digest,
                     error.in1.data_as_list(),
                     error.in2.data_as_list(),
-                    data_merkle_encrypted.get_proof(error.out),
-                    data_merkle_encrypted.get_proof(error.in1),
+                    data_merkle_encrypted.get_proof_by_index(error.index_out),
+                    data_merkle_encrypted.get_proof_by_index(error.index_in),
                 ),
             )
         else:
-            error = errors[-1]
             raise StateChannelDisagreement(
                 reason="node hash mismatch",
                 last_common_state=last_common_state,
@@ -307,11 +305,12 @@ class StateChannelFileSaleBuyer(BuyerStrategy[StateChannelFileSale]):
                     error.out.digest,
                     error.in1.digest,
                     error.in2.digest,
-                    data_merkle_encrypted.get_proof(error.out),
-                    data_merkle_encrypted.get_proof(error.in1),
+                    data_merkle_encrypted.get_proof_by_index(error.index_out),
+                    data_merkle_encrypted.get_proof_by_index(error.index_in),
                 ),
             )
 
+    @span("close")
     def close_state_channel(
         self,
         environment: Environment,
@@ -330,6 +329,7 @@ class StateChannelFileSaleBuyer(BuyerStrategy[StateChannelFileSale]):
             }
         )
 
+    @span("dispute")
     def dispute(
         self,
         environment: Environment,
@@ -20,8 +20,8 @@ from .seller import StateChannelFileSaleSeller
 
 
 class NodeForgingSeller(StateChannelFileSaleSeller):
-    def encode_file(self, root: MerkleTreeNode, key: bytes, iteration: int) -> MerkleTreeNode:
+    def encode_file(self, key: bytes, iteration: int) -> MerkleTreeNode:
         if self.protocol.is_last_iteration(iteration):
-            return encode_forge_first_leaf_first_hash(root, key)
+            return encode_forge_first_leaf_first_hash(self.get_plain_file(), key)
         else:
-            return super().encode_file(root, key, iteration)
+            return super().encode_file(key, iteration)
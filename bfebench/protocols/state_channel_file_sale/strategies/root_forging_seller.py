@@ -21,8 +21,8 @@ from .seller import StateChannelFileSaleSeller
 
 
 class RootForgingSeller(StateChannelFileSaleSeller):
-    def encode_file(self, root: MerkleTreeNode, key: bytes, iteration: int) -> MerkleTreeNode:
+    def encode_file(self, key: bytes, iteration: int) -> MerkleTreeNode:
         if self.protocol.is_last_iteration(iteration):
-            return encode(root, generate_bytes(avoid=key))
+            return encode(self.get_plain_file(), generate_bytes(avoid=key))
         else:
-            return super().encode_file(root, key, iteration)
+            return super().encode_file(key, iteration)
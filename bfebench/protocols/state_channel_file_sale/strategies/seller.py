@@ -21,11 +21,13 @@ from time import sleep, time
 
 from eth_typing.evm import ChecksumAddress
 
+from ....decorators import span
 from ....environment import Environment
 from ....utils.bytes import generate_bytes
 from ....utils.json_stream import JsonObjectSocketStream
-from ....utils.merkle import MerkleTreeNode, from_bytes, mt2obj
-from ...fairswap.util import encode, keccak
+from ....utils.keccak import keccak
+from ....utils.merkle import MerkleTreeNode, from_file
+from ...fairswap.util import encode_from_file, tree2obj
 from ...strategy import SellerStrategy
 from ..file_sale import FileSale, FileSalePhase
 from ..file_sale_helper import FileSaleHelper
@@ -94,6 +96,7 @@ class StateChannelFileSaleSeller(SellerStrategy[StateChannelFileSale]):
 
             iteration += 1
 
+    @span("open")
     def open_state_channel(
         self, environment: Environment, p2p_stream: JsonObjectSocketStream
     ) -> Adjudicator.SignedState:
@@ -119,6 +122,7 @@ class StateChannelFileSaleSeller(SellerStrategy[StateChannelFileSale]):
             sigs=[file_sale_helper.sign_channel_state(channel_state), remote_signature],
         )
 
+    @span("fund")
     def fund_state_channel(self, environment: Environment, funding_id: bytes) -> None:
         if self.protocol.seller_deposit > 0:
             environment.send_contract_transaction(
@@ -142,11 +146,9 @@ class StateChannelFileSaleSeller(SellerStrategy[StateChannelFileSale]):
 
         # === PHASE 1: transfer file / initialize (deploy contract) ===
         # transmit encrypted data
-        with open(self.protocol.filename, "rb") as fp:
-            data = fp.read()
-        data_merkle = from_bytes(data, keccak, slice_count=self.protocol.slice_count)
         data_key = generate_bytes(32)
-        data_merkle_encrypted = self.encode_file(data_merkle, data_key, iteration)
+        with span("encode"):
+            data_merkle_encrypted = self.encode_file(data_key, iteration)
 
         new_app_state = FileSale.AppState(
             file_root=file_root,
@@ -170,7 +172,7 @@ class StateChannelFileSaleSeller(SellerStrategy[StateChannelFileSale]):
                 "ciphertext_root": new_app_state.ciphertext_root.hex(),
                 "key_commitment": new_app_state.key_commitment.hex(),
                 "price": new_app_state.price,
-                "tree": mt2obj(data_merkle_encrypted, encode_func=lambda b: bytes(b).hex()),
+                "tree": tree2obj(data_merkle_encrypted, self.protocol.binary_tree),
                 "signature": file_sale_helper.sign_channel_state(new_channel_state).hex(),
             }
         )
@@ -249,9 +251,16 @@ class StateChannelFileSaleSeller(SellerStrategy[StateChannelFileSale]):
                 "timeout, starting dispute", last_common_state, last_local_state=new_channel_state
             )
 
-    def encode_file(self, root: MerkleTreeNode, key: bytes, iteration: int) -> MerkleTreeNode:
-        return encode(root, key)
+    def encode_file(self, key: bytes, iteration: int) -> MerkleTreeNode:
+        """
+        Encode the file in a single pass, without building the plain tree.
+        """
+        return encode_from_file(self.protocol.filename, key, self.protocol.slice_count)
 
+    def get_plain_file(self) -> MerkleTreeNode:
+        return from_file(self.protocol.filename, keccak, slice_count=self.protocol.slice_count)
+
+    @span("close")
     def close_state_channel(self, environment: Environment, last_common_state: Adjudicator.SignedState) -> None:
         # see https://labs.hyperledger.org/perun-doc/concepts/protocols_phases.html#finalize-phase
         file_sale_helper = FileSaleHelper(environment, self.protocol)
@@ -270,6 +279,7 @@ class StateChannelFileSaleSeller(SellerStrategy[StateChannelFileSale]):
 
         file_sale_helper.withdraw_holdings(last_common_state.state.channel_id)
 
+    @span("dispute")
     def dispute(
         self,
         environment: Environment,
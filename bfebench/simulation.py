@@ -15,25 +15,60 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from __future__ import annotations
+
 import logging
 import os
+from copy import deepcopy
+from multiprocessing.connection import wait
 from shutil import rmtree
 from tempfile import mkdtemp
+from threading import Lock, Thread, current_thread
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
 
-from .environments_configuration import EnvironmentsConfiguration
+from .environments_configuration import EnvironmentsConfiguration, EnvironmentSet
 from .errors import ProtocolError
 from .protocols import BuyerStrategy, Protocol, SellerStrategy
 from .simulation_result import IterationResult
 from .simulation_result_collector import SimulationResultCollector
-from .strategy_process import StrategyProcess
+from .strategy_process import StrategyProcess, StrategyProcessResult, StrategyWorker
+from .utils.async_json_stream import AsyncJsonObjectSocketStreamForwarder
 from .utils.json_stream import (
-    JsonObjectSocketStreamForwarder,
+    JsonObjectSocketStream,
     JsonObjectUnixDomainSocketClientStream,
-    JsonObjectUnixDomainSocketServerStream,
 )
+from .utils.link import LinkProfile
+from .utils.serializer import Serializer
+from .utils.shm_stream import SharedMemoryChannel
 
 logger = logging.getLogger(__name__)
 
+P2P_TRANSPORT_SOCKET = "socket"  # Unix domain sockets with a forwarder in between
+P2P_TRANSPORT_SHARED_MEMORY = "shared-memory"  # shared memory ring buffers, see `bfebench.utils.shm_stream`
+P2P_TRANSPORTS = [P2P_TRANSPORT_SOCKET, P2P_TRANSPORT_SHARED_MEMORY]
+
+WORKER_MODE_FORK = "fork"  # new seller and buyer processes for each iteration
+WORKER_MODE_WARM = "warm"  # one seller and one buyer process for all iterations, see `StrategyWorker`
+WORKER_MODES = [WORKER_MODE_FORK, WORKER_MODE_WARM]
+
+
+class SimulationLane(NamedTuple):
+    """
+    What a sequence of exchanges needs for itself, when several of them run in parallel.
+    """
+
+    environments: EnvironmentSet
+    protocol: Protocol
+    seller_strategy: SellerStrategy[Protocol]
+    buyer_strategy: BuyerStrategy[Protocol]
+
+
+class PreparedIteration(NamedTuple):
+    iteration: int
+    p2p_channel: AsyncJsonObjectSocketStreamForwarder | SharedMemoryChannel
+    seller_p2p_client: JsonObjectSocketStream
+    buyer_p2p_client: JsonObjectSocketStream
+
 
 class Simulation(object):
     def __init__(
@@ -44,15 +79,55 @@ class Simulation(object):
         buyer_strategy: BuyerStrategy[Protocol],
         iterations: int,
         result_collector: SimulationResultCollector,
+        serializer: Serializer | None = None,
+        p2p_transport: str = P2P_TRANSPORT_SOCKET,
+        link_profile: LinkProfile | None = None,
+        worker_mode: str = WORKER_MODE_FORK,
+        parallel: int = 1,
+        pipeline: bool = True,
     ) -> None:
+        """
+        :param pipeline: prepare the next iteration (`Protocol.set_up_iteration`, p2p channel) while the current one
+            is running, so its `set_up_iteration` is called before the current one's `tear_down_iteration`
+        """
+        self._tmp_dir = mkdtemp(prefix="bfebench-")
         self._environments = environments_configuration
         self._protocol = protocol
         self._seller_strategy = seller_strategy
         self._buyer_strategy = buyer_strategy
         self._iterations = iterations
         self._result_collector = result_collector
+        self._serializer = serializer
+        if p2p_transport not in P2P_TRANSPORTS:
+            raise ValueError("unknown p2p transport %s" % p2p_transport)
+        self._p2p_transport = p2p_transport
+        if link_profile is not None and p2p_transport != P2P_TRANSPORT_SOCKET:
+            raise ValueError("a link profile can only be applied to the %s p2p transport" % P2P_TRANSPORT_SOCKET)
+        if link_profile is not None:
+            link_profile.validate()
+        self._link_profile = link_profile
+        if worker_mode not in WORKER_MODES:
+            raise ValueError("unknown worker mode %s" % worker_mode)
+        if worker_mode == WORKER_MODE_WARM and p2p_transport != P2P_TRANSPORT_SOCKET:
+            # the shared memory streams can only be passed to processes when starting them
+            raise ValueError("the %s worker mode requires the %s p2p transport" % (worker_mode, P2P_TRANSPORT_SOCKET))
+        self._worker_mode = worker_mode
+        if parallel < 1:
+            raise ValueError("parallel has to be at least 1")
+        if parallel > len(environments_configuration.environment_sets):
+            raise ValueError(
+                "running %d exchanges in parallel requires %d environment sets, but there are only %d"
+                % (parallel, parallel, len(environments_configuration.environment_sets))
+            )
+        self._parallel = parallel
+        self._pipeline = pipeline
 
-        self._tmp_dir = mkdtemp(prefix="bfebench-")
+        # shared by the lanes
+        self._lock = Lock()
+        self._next_iteration = 0
+        self._next_result = 0
+        self._pending_results: Dict[int, IterationResult] = {}
+        self._failed = False
 
     @property
     def environments(self) -> EnvironmentsConfiguration:
@@ -64,95 +139,275 @@ class Simulation(object):
 
     def run(self) -> None:
         logger.debug("starting simulation")
+        lanes = [self._create_lane(index) for index in range(self._parallel)]
+        self._next_iteration = 0
+        self._next_result = 0
+        self._pending_results = {}
+        self._failed = False
+        if len(lanes) == 1:
+            self._run_lane(lanes[0])
+        else:
+            # plain threads, processes forked from concurrent.futures workers fail on exit
+            errors: List[BaseException] = []
+            threads = [
+                Thread(target=self._run_lane, args=(lane, errors), name="simulation-lane-%d" % index)
+                for index, lane in enumerate(lanes)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            if len(errors) > 0:
+                raise errors[0]
+        rmtree(self._tmp_dir)
+        logger.debug("simulation has finished")
+
+    def _create_lane(self, index: int) -> SimulationLane:
+        environments = self.environments.environment_sets[index]
+        if index == 0:
+            return SimulationLane(environments, self._protocol, self._seller_strategy, self._buyer_strategy)
+        # further lanes need their own protocol state, the strategies have to refer to it
+        protocol, seller_strategy, buyer_strategy = deepcopy(
+            (self._protocol, self._seller_strategy, self._buyer_strategy)
+        )
+        return SimulationLane(environments, protocol, seller_strategy, buyer_strategy)
+
+    def _run_lane(self, lane: SimulationLane, errors: List[BaseException] | None = None) -> None:
+        """
+        Run iterations until there are none left. With `errors`, a failure is appended to it instead of raised.
+        """
         logger.debug("setting up protocol simulation...")
-        self.protocol.set_up_simulation(
-            environment=self.environments.operator_environment,
-            seller_address=self.environments.seller_environment.wallet_address,
-            buyer_address=self.environments.buyer_environment.wallet_address,
+        lane.protocol.set_up_simulation(
+            environment=lane.environments.operator_environment,
+            seller_address=lane.environments.seller_environment.wallet_address,
+            buyer_address=lane.environments.buyer_environment.wallet_address,
         )
-        for iteration in range(self._iterations):
-            logger.debug("setting up protocol iteration...")
-            self.protocol.set_up_iteration(
-                environment=self.environments.operator_environment,
-                seller_address=self.environments.seller_environment.wallet_address,
-                buyer_address=self.environments.buyer_environment.wallet_address,
-            )
+        workers = self._start_workers(lane) if self._worker_mode == WORKER_MODE_WARM else None
+        try:
+            prepared = self._prepare_next_iteration(lane)
+            while prepared is not None:
+                iteration = prepared.iteration
+                iteration_result, prepared = self._run_iteration(lane, prepared, workers)
+                self._add_iteration_result(iteration, iteration_result)
+        except BaseException as e:
+            self._failed = True  # let the other lanes stop as well
+            if errors is None:
+                raise
+            errors.append(e)
+            return
+        finally:
+            if workers is not None:
+                for worker in workers:
+                    worker.stop()
+
+        logger.debug("tearing down protocol simulation")
+        lane.protocol.tear_down_simulation(
+            environment=lane.environments.operator_environment,
+            seller_address=lane.environments.seller_environment.wallet_address,
+            buyer_address=lane.environments.buyer_environment.wallet_address,
+        )
+
+    def _take_iteration(self) -> int | None:
+        with self._lock:
+            if self._failed or self._next_iteration >= self._iterations:
+                return None
+            self._next_iteration += 1
+            return self._next_iteration - 1
 
-            logger.debug("setting up strategies...")
-            seller_socket = "seller-%d.ipc" % iteration
-            buyer_socket = "buyer-%d.ipc" % iteration
-            seller_p2p_server = JsonObjectUnixDomainSocketServerStream(os.path.join(self._tmp_dir, seller_socket))
-            buyer_p2p_server = JsonObjectUnixDomainSocketServerStream(os.path.join(self._tmp_dir, buyer_socket))
+    def _add_iteration_result(self, iteration: int, iteration_result: IterationResult) -> None:
+        """
+        Hand the results to the result collector in the order of the iterations, no matter which lane finishes first.
+        """
+        with self._lock:
+            self._pending_results[iteration] = iteration_result
+            while self._next_result in self._pending_results:
+                self._result_collector.add_iteration_result(self._pending_results.pop(self._next_result))
+                self._next_result += 1
 
-            p2p_forwarder = JsonObjectSocketStreamForwarder(seller_p2p_server, buyer_p2p_server)
-            p2p_forwarder.start()
+    def _prepare_next_iteration(self, lane: SimulationLane) -> PreparedIteration | None:
+        iteration = self._take_iteration()
+        if iteration is None:
+            return None
 
-            seller_p2p_client = JsonObjectUnixDomainSocketClientStream(os.path.join(self._tmp_dir, seller_socket))
-            buyer_p2p_client = JsonObjectUnixDomainSocketClientStream(os.path.join(self._tmp_dir, buyer_socket))
+        logger.debug("setting up protocol iteration...")
+        lane.protocol.set_up_iteration(
+            environment=lane.environments.operator_environment,
+            seller_address=lane.environments.seller_environment.wallet_address,
+            buyer_address=lane.environments.buyer_environment.wallet_address,
+        )
+
+        logger.debug("setting up strategies...")
+        p2p_channel: AsyncJsonObjectSocketStreamForwarder | SharedMemoryChannel
+        seller_p2p_client: JsonObjectSocketStream
+        buyer_p2p_client: JsonObjectSocketStream
+        if self._p2p_transport == P2P_TRANSPORT_SHARED_MEMORY:
+            p2p_channel = SharedMemoryChannel(serializer=self._serializer)
+            seller_p2p_client, buyer_p2p_client = p2p_channel.stream1, p2p_channel.stream2
+        else:
+            seller_socket = os.path.join(self._tmp_dir, "seller-%d.ipc" % iteration)
+            buyer_socket = os.path.join(self._tmp_dir, "buyer-%d.ipc" % iteration)
+            p2p_channel = AsyncJsonObjectSocketStreamForwarder(
+                seller_socket, buyer_socket, link_profile=self._link_profile
+            )
+            p2p_channel.start()
 
-            seller_process = StrategyProcess(
-                strategy=self._seller_strategy,
-                environment=self.environments.seller_environment,
-                p2p_stream=seller_p2p_client,
-                opposite_address=self.environments.buyer_environment.wallet_address,
+            seller_p2p_client = JsonObjectUnixDomainSocketClientStream(
+                seller_socket, framed=True, serializer=self._serializer
             )
-            buyer_process = StrategyProcess(
-                strategy=self._buyer_strategy,
-                environment=self.environments.buyer_environment,
-                p2p_stream=buyer_p2p_client,
-                opposite_address=self.environments.seller_environment.wallet_address,
+            buyer_p2p_client = JsonObjectUnixDomainSocketClientStream(
+                buyer_socket, framed=True, serializer=self._serializer
             )
 
-            logger.debug("launching exchange protocol")
-            seller_process.start()
-            buyer_process.start()
+        return PreparedIteration(iteration, p2p_channel, seller_p2p_client, buyer_p2p_client)
+
+    def _run_iteration(
+        self,
+        lane: SimulationLane,
+        prepared: PreparedIteration,
+        workers: Tuple[StrategyWorker, StrategyWorker] | None,
+    ) -> Tuple[IterationResult, PreparedIteration | None]:
+        """
+        Run the prepared iteration and prepare the next one. When pipelining, the next one is prepared in the
+        background while the strategies run, after they have received the protocol state of the current one.
+
+        :return: the result of the iteration and the next prepared iteration, if there is one
+        """
+        next_prepared: List[PreparedIteration | None] = []
+        preparation_errors: List[BaseException] = []
 
-            seller_process.join()
-            buyer_process.join()
+        def prepare_next() -> None:
+            try:
+                next_prepared.append(self._prepare_next_iteration(lane))
+            except BaseException as e:
+                preparation_errors.append(e)
 
-            if seller_process.exitcode != 0:
-                raise ProtocolError(f"seller process exited with code {seller_process.exitcode}")
+        preparation = Thread(target=prepare_next, name="%s-preparation" % current_thread().name)
 
-            if buyer_process.exitcode != 0:
-                raise ProtocolError(f"buyer process exited with code {buyer_process.exitcode}")
+        logger.debug("launching exchange protocol")
+        on_started = preparation.start if self._pipeline else None
+        try:
+            try:
+                if workers is None:
+                    seller_result, buyer_result = self._run_processes(lane, prepared, on_started)
+                else:
+                    seller_result, buyer_result = self._run_workers(lane, workers, prepared, on_started)
+            except BaseException:
+                if preparation.ident is not None:
+                    preparation.join()
+                    for unused in next_prepared:
+                        if unused is not None:
+                            unused.p2p_channel.close()
+                raise
+            if preparation.ident is not None:
+                preparation.join()
 
             logger.debug("tearing down protocol iteration")
-            self.protocol.tear_down_iteration(
-                environment=self.environments.operator_environment,
-                seller_address=self.environments.seller_environment.wallet_address,
-                buyer_address=self.environments.buyer_environment.wallet_address,
+            lane.protocol.tear_down_iteration(
+                environment=lane.environments.operator_environment,
+                seller_address=lane.environments.seller_environment.wallet_address,
+                buyer_address=lane.environments.buyer_environment.wallet_address,
             )
 
-            self._result_collector.add_iteration_result(
-                IterationResult(
-                    seller_result=seller_process.get_process_result(),
-                    buyer_result=buyer_process.get_process_result(),
-                    p2p_result=p2p_forwarder.get_stats(),
-                )
+            iteration_result = IterationResult(
+                seller_result=seller_result,
+                buyer_result=buyer_result,
+                p2p_result=prepared.p2p_channel.get_stats(),
             )
+        finally:
+            prepared.p2p_channel.close()
 
-            seller_p2p_client.close()
-            buyer_p2p_client.close()
-            del seller_p2p_client
-            del buyer_p2p_client
+        if not self._pipeline:
+            prepare_next()
+        if len(preparation_errors) > 0:
+            raise preparation_errors[0]
+        return iteration_result, next_prepared[0]
 
-            del seller_process
-            del buyer_process
+    def _run_processes(
+        self,
+        lane: SimulationLane,
+        prepared: PreparedIteration,
+        on_started: Callable[[], None] | None = None,
+    ) -> Tuple[StrategyProcessResult, StrategyProcessResult]:
+        seller_process = StrategyProcess(
+            strategy=lane.seller_strategy,
+            environment=lane.environments.seller_environment,
+            p2p_stream=prepared.seller_p2p_client,
+            opposite_address=lane.environments.buyer_environment.wallet_address,
+        )
+        buyer_process = StrategyProcess(
+            strategy=lane.buyer_strategy,
+            environment=lane.environments.buyer_environment,
+            p2p_stream=prepared.buyer_p2p_client,
+            opposite_address=lane.environments.seller_environment.wallet_address,
+        )
+        seller_process.start()
+        buyer_process.start()
+        if on_started is not None:
+            on_started()
 
-            seller_p2p_server.close()
-            buyer_p2p_server.close()
+        self._close_streams_when_done(
+            {
+                seller_process.sentinel: prepared.seller_p2p_client,
+                buyer_process.sentinel: prepared.buyer_p2p_client,
+            }
+        )
+        seller_process.join()
+        buyer_process.join()
 
-            del seller_p2p_server
-            del buyer_p2p_server
+        if seller_process.exitcode != 0:
+            raise ProtocolError(f"seller process exited with code {seller_process.exitcode}")
 
-        logger.debug("tearing down protocol simulation")
-        self.protocol.tear_down_simulation(
-            environment=self.environments.operator_environment,
-            seller_address=self.environments.seller_environment.wallet_address,
-            buyer_address=self.environments.buyer_environment.wallet_address,
+        if buyer_process.exitcode != 0:
+            raise ProtocolError(f"buyer process exited with code {buyer_process.exitcode}")
+
+        return seller_process.get_process_result(), buyer_process.get_process_result()
+
+    @staticmethod
+    def _start_workers(lane: SimulationLane) -> Tuple[StrategyWorker, StrategyWorker]:
+        seller_worker = StrategyWorker(
+            environment=lane.environments.seller_environment,
+            opposite_address=lane.environments.buyer_environment.wallet_address,
+            name="seller",
         )
-        rmtree(self._tmp_dir)
-        logger.debug("simulation has finished")
+        buyer_worker = StrategyWorker(
+            environment=lane.environments.buyer_environment,
+            opposite_address=lane.environments.seller_environment.wallet_address,
+            name="buyer",
+        )
+        seller_worker.start()
+        buyer_worker.start()
+        return seller_worker, buyer_worker
+
+    def _run_workers(
+        self,
+        lane: SimulationLane,
+        workers: Tuple[StrategyWorker, StrategyWorker],
+        prepared: PreparedIteration,
+        on_started: Callable[[], None] | None = None,
+    ) -> Tuple[StrategyProcessResult, StrategyProcessResult]:
+        seller_worker, buyer_worker = workers
+        seller_worker.submit(lane.seller_strategy, prepared.seller_p2p_client)
+        buyer_worker.submit(lane.buyer_strategy, prepared.buyer_p2p_client)
+        if on_started is not None:
+            on_started()
+
+        self._close_streams_when_done(
+            {
+                seller_worker.connection: prepared.seller_p2p_client,
+                buyer_worker.connection: prepared.buyer_p2p_client,
+            }
+        )
+        return seller_worker.get_process_result(), buyer_worker.get_process_result()
+
+    @staticmethod
+    def _close_streams_when_done(p2p_streams: Dict[Any, JsonObjectSocketStream]) -> None:
+        """
+        Wait until all parties are done (their waitable objects, the keys, are ready). Close the stream of a finished
+        party right away, so the other one is not left waiting for its messages.
+        """
+        while len(p2p_streams) > 0:
+            for ready in wait(list(p2p_streams.keys())):
+                p2p_streams.pop(ready).close()
 
     def __del__(self) -> None:
         rmtree(self._tmp_dir, ignore_errors=True)
@@ -16,10 +16,11 @@
 # limitations under the License.
 
 from statistics import stdev
-from typing import Any, List, NamedTuple
+from typing import Any, Dict, List, NamedTuple, Set
 
 from tabulate import tabulate
 
+from .decorators import SpanStats
 from .strategy_process import StrategyProcessResult
 from .utils.json_stream import JsonObjectSocketStreamForwarderStats
 
@@ -34,11 +35,29 @@ class SimulationResult(object):
     def __init__(self) -> None:
         self._iteration_results: List[IterationResult] = []
 
+    @property
+    def iteration_results(self) -> List[IterationResult]:
+        return self._iteration_results
+
     def add_iteration_result(self, iteration_result: IterationResult) -> None:
         self._iteration_results.append(iteration_result)
 
     @staticmethod
     def get_headers() -> List[str]:
+        return SimulationResult.get_stats_headers() + [
+            "S Spans",  # seller spans (name=seconds;...)
+            "B Spans",  # buyer spans (name=seconds;...)
+        ]
+
+    @staticmethod
+    def get_columns(iteration_result: IterationResult) -> List[Any]:
+        return SimulationResult.get_stats_columns(iteration_result) + [
+            SimulationResult.format_spans(iteration_result.seller_result.spans),
+            SimulationResult.format_spans(iteration_result.buyer_result.spans),
+        ]
+
+    @staticmethod
+    def get_stats_headers() -> List[str]:
         return [
             "S real",  # seller real time
             "B real",  # buyer real time
@@ -56,10 +75,16 @@ class SimulationResult(object):
             "B Tx Fees (Gas)",  # buyer blockchain transaction fees
             "S Funds Diff (Eth)",  # seller funds diff (Eth)
             "B Funds Diff (Eth)",  # buyer funds diff (Eth)
+            "S chain",  # seller real time blocked by the chain
+            "B chain",  # buyer real time blocked by the chain
+            "S p2p",  # seller real time blocked by waiting for the buyer
+            "B p2p",  # buyer real time blocked by waiting for the seller
+            "S comp",  # seller real time not blocked (computing)
+            "B comp",  # buyer real time not blocked (computing)
         ]
 
     @staticmethod
-    def get_columns(iteration_result: IterationResult) -> List[Any]:
+    def get_stats_columns(iteration_result: IterationResult) -> List[Any]:
         return [
             iteration_result.seller_result.realtime,
             iteration_result.buyer_result.realtime,
@@ -77,13 +102,20 @@ class SimulationResult(object):
             iteration_result.buyer_result.environment_stats.tx_fees,
             iteration_result.seller_result.environment_stats.funds_diff,
             iteration_result.buyer_result.environment_stats.funds_diff,
+            iteration_result.seller_result.time_stats.chain_wait,
+            iteration_result.buyer_result.time_stats.chain_wait,
+            iteration_result.seller_result.time_stats.p2p_wait,
+            iteration_result.buyer_result.time_stats.p2p_wait,
+            iteration_result.seller_result.time_stats.compute,
+            iteration_result.buyer_result.time_stats.compute,
         ]
 
     def __str__(self) -> str:
         iterations = len(self._iteration_results)
 
         data_body = [
-            [str(i)] + self.get_columns(iteration_result) for i, iteration_result in enumerate(self._iteration_results)
+            [str(i)] + self.get_stats_columns(iteration_result)
+            for i, iteration_result in enumerate(self._iteration_results)
         ]
 
         data_footer: List[List[Any]] = [
@@ -105,6 +137,12 @@ class SimulationResult(object):
                 sum([r.buyer_result.environment_stats.tx_fees for r in self._iteration_results]) / iterations,
                 sum([r.seller_result.environment_stats.funds_diff for r in self._iteration_results]) / iterations,
                 sum([r.buyer_result.environment_stats.funds_diff for r in self._iteration_results]) / iterations,
+                sum([r.seller_result.time_stats.chain_wait for r in self._iteration_results]) / iterations,
+                sum([r.buyer_result.time_stats.chain_wait for r in self._iteration_results]) / iterations,
+                sum([r.seller_result.time_stats.p2p_wait for r in self._iteration_results]) / iterations,
+                sum([r.buyer_result.time_stats.p2p_wait for r in self._iteration_results]) / iterations,
+                sum([r.seller_result.time_stats.compute for r in self._iteration_results]) / iterations,
+                sum([r.buyer_result.time_stats.compute for r in self._iteration_results]) / iterations,
             ]
         ]
 
@@ -128,7 +166,51 @@ class SimulationResult(object):
                     stdev([r.buyer_result.environment_stats.tx_fees for r in self._iteration_results]),
                     stdev([r.seller_result.environment_stats.funds_diff for r in self._iteration_results]),
                     stdev([r.buyer_result.environment_stats.funds_diff for r in self._iteration_results]),
+                    stdev([r.seller_result.time_stats.chain_wait for r in self._iteration_results]),
+                    stdev([r.buyer_result.time_stats.chain_wait for r in self._iteration_results]),
+                    stdev([r.seller_result.time_stats.p2p_wait for r in self._iteration_results]),
+                    stdev([r.buyer_result.time_stats.p2p_wait for r in self._iteration_results]),
+                    stdev([r.seller_result.time_stats.compute for r in self._iteration_results]),
+                    stdev([r.buyer_result.time_stats.compute for r in self._iteration_results]),
                 ]
             ]
 
-        return tabulate(headers=["#"] + self.get_headers(), tabular_data=data_body + data_footer)
+        output = tabulate(headers=["#"] + self.get_stats_headers(), tabular_data=data_body + data_footer)
+        if self.get_span_names():
+            output += "\n\n" + self._format_span_table()
+        return output
+
+    @staticmethod
+    def format_spans(spans: Dict[str, SpanStats]) -> str:
+        return ";".join("%s=%f" % (name, stats.seconds) for name, stats in sorted(spans.items()))
+
+    def get_span_names(self) -> List[str]:
+        names: Set[str] = set()
+        for r in self._iteration_results:
+            names.update(r.seller_result.spans.keys(), r.buyer_result.spans.keys())
+        return sorted(names)
+
+    def _format_span_table(self) -> str:
+        """
+        Time spent in each span per iteration, iterations in which a party did not enter a span count as 0.
+        """
+        iterations = len(self._iteration_results)
+        data = []
+        for name in self.get_span_names():
+            row: List[Any] = [name]
+            for results in (
+                [r.seller_result for r in self._iteration_results],
+                [r.buyer_result for r in self._iteration_results],
+            ):
+                spans = [result.spans.get(name, SpanStats(0, 0)) for result in results]
+                seconds = [stats.seconds for stats in spans]
+                row += [
+                    sum([stats.calls for stats in spans]) / iterations,
+                    sum(seconds) / iterations,
+                    stdev(seconds) if iterations > 1 else None,
+                ]
+            data.append(row)
+        return tabulate(
+            headers=["Span", "S Ct", "S Avg", "S StdDev", "B Ct", "B Avg", "B StdDev"],
+            tabular_data=data,
+        )
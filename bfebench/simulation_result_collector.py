@@ -19,6 +19,7 @@ from __future__ import annotations
 
 import csv
 from datetime import datetime
+from typing import List
 
 from bfebench.simulation_result import IterationResult, SimulationResult
 
@@ -32,10 +33,24 @@ class SimulationResultCollector(object):
         self._simulation_start_date = datetime.now().isoformat()
 
         if csv_file is not None:
+            headers = ["Start"] + SimulationResult.get_headers()
+            existing_headers = self._read_headers(csv_file)
+            if existing_headers is not None and existing_headers != headers:
+                # appending would write rows which do not match the existing header
+                raise ValueError("%s contains results with other columns, use a new file" % csv_file)
+
             self._csv_file = open(csv_file, "a")
             self._csv_writer = csv.writer(self._csv_file)
             if self._csv_file.tell() == 0:
-                self._csv_writer.writerow(["Start"] + SimulationResult.get_headers())
+                self._csv_writer.writerow(headers)
+
+    @staticmethod
+    def _read_headers(csv_file: str) -> List[str] | None:
+        try:
+            with open(csv_file, newline="") as f:
+                return next(csv.reader(f), None)
+        except FileNotFoundError:
+            return None
 
     def add_iteration_result(self, iteration_result: IterationResult) -> None:
         self._simulation_result.add_iteration_result(iteration_result)
@@ -19,15 +19,29 @@ from __future__ import annotations
 
 import logging
 import time
-from multiprocessing import Process, Queue
+from multiprocessing import Pipe, Process, Queue
+from multiprocessing.connection import Connection
 from resource import RUSAGE_SELF, getrusage
-from typing import NamedTuple
+from typing import Dict, NamedTuple
 
 from eth_typing.evm import ChecksumAddress
 
+from .decorators import (
+    BLOCKED_CHAIN,
+    BLOCKED_P2P,
+    SpanStats,
+    get_blocked_times,
+    get_spans,
+    reset_blocked_times,
+    reset_spans,
+)
 from .environment import Environment
+from .errors import BaseError, ProtocolError
 from .protocols import Protocol, Strategy
-from .utils.json_stream import JsonObjectSocketStream
+from .utils.json_stream import (
+    JsonObjectSocketStream,
+    JsonObjectUnixDomainSocketClientStream,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -92,10 +106,87 @@ class EnvironmentStatistics(NamedTuple):
     funds_diff: int
 
 
+class TimeStatistics(NamedTuple):
+    """
+    Real time of a strategy run, split up by what the process has been doing.
+    """
+
+    """seconds blocked by the chain (RPC requests, waiting for blocks and receipts)"""
+    chain_wait: float = 0.0
+
+    """seconds blocked by waiting for messages from the other party"""
+    p2p_wait: float = 0.0
+
+    """remaining seconds, in which the process has been computing"""
+    compute: float = 0.0
+
+
 class StrategyProcessResult(NamedTuple):
     realtime: float
     system_resource_stats: SystemResourceUsage
     environment_stats: EnvironmentStatistics
+    time_stats: TimeStatistics
+    spans: Dict[str, SpanStats]
+
+
+def run_strategy(
+    strategy: Strategy[Protocol],
+    environment: Environment,
+    p2p_stream: JsonObjectSocketStream,
+    opposite_address: ChecksumAddress,
+) -> StrategyProcessResult:
+    balance_start = environment.get_balance()
+    tx_count_start = environment.total_tx_count
+    tx_fees_start = environment.total_tx_fees
+    reset_spans()
+    reset_blocked_times()
+    time_start = time.time()
+    resources_start = getrusage(RUSAGE_SELF)
+    strategy.run(
+        environment=environment,
+        p2p_stream=p2p_stream,
+        opposite_address=opposite_address,
+    )
+    resources_end = getrusage(RUSAGE_SELF)
+    time_end = time.time()
+    blocked_times = get_blocked_times()
+    balance_end = environment.get_balance()
+
+    realtime = time_end - time_start
+    chain_wait = blocked_times.get(BLOCKED_CHAIN, 0.0)
+    p2p_wait = blocked_times.get(BLOCKED_P2P, 0.0)
+    return StrategyProcessResult(
+        realtime=realtime,
+        system_resource_stats=SystemResourceUsage(
+            utime=resources_end.ru_utime - resources_start.ru_utime,
+            stime=resources_end.ru_stime - resources_start.ru_stime,
+            maxrss=resources_end.ru_maxrss - resources_start.ru_maxrss,
+            ixrss=resources_end.ru_ixrss - resources_start.ru_ixrss,
+            idrss=resources_end.ru_idrss - resources_start.ru_idrss,
+            isrss=resources_end.ru_isrss - resources_start.ru_isrss,
+            minflt=resources_end.ru_minflt - resources_start.ru_minflt,
+            majflt=resources_end.ru_majflt - resources_start.ru_majflt,
+            nswap=resources_end.ru_nswap - resources_start.ru_nswap,
+            inblock=resources_end.ru_inblock - resources_start.ru_inblock,
+            oublock=resources_end.ru_oublock - resources_start.ru_oublock,
+            msgsnd=resources_end.ru_msgsnd - resources_start.ru_msgsnd,
+            msgrcv=resources_end.ru_msgrcv - resources_start.ru_msgrcv,
+            nsignals=resources_end.ru_nsignals - resources_start.ru_nsignals,
+            nvcsw=resources_end.ru_nvcsw - resources_start.ru_nvcsw,
+            nivcsw=resources_end.ru_nivcsw - resources_start.ru_nivcsw,
+        ),
+        environment_stats=EnvironmentStatistics(
+            tx_count=environment.total_tx_count - tx_count_start,
+            tx_fees=environment.total_tx_fees - tx_fees_start,
+            funds_diff=balance_end - balance_start,
+        ),
+        time_stats=TimeStatistics(
+            chain_wait=chain_wait,
+            p2p_wait=p2p_wait,
+            compute=max(realtime - chain_wait - p2p_wait, 0.0),
+        ),
+        spans=get_spans(),
+    )
 
 
 class StrategyProcess(Process):
@@ -116,48 +207,80 @@ class StrategyProcess(Process):
         self._result_queue: Queue[StrategyProcessResult] = Queue()
 
     def run(self) -> None:
-        balance_start = self._environment.get_balance()
-        time_start = time.time()
-        resources_start = getrusage(RUSAGE_SELF)
-        self._strategy.run(
-            environment=self._environment,
-            p2p_stream=self._p2p_stream,
-            opposite_address=self._opposite_address,
-        )
-        resources_end = getrusage(RUSAGE_SELF)
-        time_end = time.time()
-        balance_end = self._environment.get_balance()
-
+        JsonObjectUnixDomainSocketClientStream.close_inherited(keep=self._p2p_stream)
         self._result_queue.put(
-            StrategyProcessResult(
-                realtime=time_end - time_start,
-                system_resource_stats=SystemResourceUsage(
-                    utime=resources_end.ru_utime - resources_start.ru_utime,
-                    stime=resources_end.ru_stime - resources_start.ru_stime,
-                    maxrss=resources_end.ru_maxrss - resources_start.ru_maxrss,
-                    ixrss=resources_end.ru_ixrss - resources_start.ru_ixrss,
-                    idrss=resources_end.ru_idrss - resources_start.ru_idrss,
-                    isrss=resources_end.ru_isrss - resources_start.ru_isrss,
-                    minflt=resources_end.ru_minflt - resources_start.ru_minflt,
-                    majflt=resources_end.ru_majflt - resources_start.ru_majflt,
-                    nswap=resources_end.ru_nswap - resources_start.ru_nswap,
-                    inblock=resources_end.ru_inblock - resources_start.ru_inblock,
-                    oublock=resources_end.ru_oublock - resources_start.ru_oublock,
-                    msgsnd=resources_end.ru_msgsnd - resources_start.ru_msgsnd,
-                    msgrcv=resources_end.ru_msgrcv - resources_start.ru_msgrcv,
-                    nsignals=resources_end.ru_nsignals - resources_start.ru_nsignals,
-                    nvcsw=resources_end.ru_nvcsw - resources_start.ru_nvcsw,
-                    nivcsw=resources_end.ru_nivcsw - resources_start.ru_nivcsw,
-                ),
-                environment_stats=EnvironmentStatistics(
-                    tx_count=self._environment.total_tx_count,
-                    tx_fees=self._environment.total_tx_fees,
-                    funds_diff=balance_end - balance_start,
-                ),
-            )
+            run_strategy(self._strategy, self._environment, self._p2p_stream, self._opposite_address)
         )
 
     def get_process_result(self) -> StrategyProcessResult:
         if self._result is None:
             self._result = self._result_queue.get(block=True)
         return self._result
+
+
+class StrategyWorker(Process):
+    """
+    Process running the strategy of one party for many iterations, instead of starting a `StrategyProcess` per
+    iteration. Iterations are submitted over a pipe together with the strategy, so the worker gets the protocol state
+    as set up for the iteration.
+
+    The process stays warm between iterations, so e.g. the maximum resident set size only grows in the first one.
+    """
+
+    def __init__(self, environment: Environment, opposite_address: ChecksumAddress, name: str | None = None) -> None:
+        super().__init__(name=name, daemon=True)
+        self._environment = environment
+        self._opposite_address = opposite_address
+        self._connection, self._worker_connection = Pipe()
+
+    @property
+    def connection(self) -> Connection:
+        """
+        Parent end of the control pipe, readable as soon as the submitted iteration has finished.
+        """
+        return self._connection
+
+    def start(self) -> None:
+        super().start()
+        self._worker_connection.close()
+
+    def run(self) -> None:
+        self._connection.close()
+        JsonObjectUnixDomainSocketClientStream.close_inherited()
+        while True:
+            task = self._worker_connection.recv()
+            if task is None:
+                break
+            strategy, p2p_stream = task
+            result: StrategyProcessResult | None
+            try:
+                result = run_strategy(strategy, self._environment, p2p_stream, self._opposite_address)
+            except (BaseError, Exception):  # BaseError derives from BaseException, not from Exception
+                logger.exception("%s strategy failed" % self.name)
+                result = None
+            p2p_stream.close()
+            self._worker_connection.send(result)
+
+    def submit(self, strategy: Strategy[Protocol], p2p_stream: JsonObjectSocketStream) -> None:
+        self._connection.send((strategy, p2p_stream))
+
+    def get_process_result(self) -> StrategyProcessResult:
+        """
+        Wait for the result of the submitted iteration.
+        """
+        try:
+            result: StrategyProcessResult | None = self._connection.recv()
+        except EOFError:
+            self.join()
+            raise ProtocolError(f"{self.name} worker exited with code {self.exitcode}")
+        if result is None:
+            raise ProtocolError(f"{self.name} strategy failed")
+        return result
+
+    def stop(self) -> None:
+        try:
+            self._connection.send(None)
+        except OSError:
+            pass  # worker has exited already
+        self.join()
+        self._connection.close()
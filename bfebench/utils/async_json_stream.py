@@ -0,0 +1,376 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Any, Callable, Coroutine, List, Tuple, TypeVar
+
+from .json_stream import (
+    FRAME_HEADER,
+    FRAME_MARKER,
+    RELAY_BUFFER_SIZE,
+    JsonObjectSocketStreamClosedUnexpectedly,
+    JsonObjectSocketStreamForwarder,
+    JsonObjectSocketStreamForwarderStats,
+)
+from .link import LinkProfile, LinkShaper
+from .serializer import JsonSerializer, Serializer
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AsyncJsonObjectStream(object):
+    """
+    asyncio counterpart of `bfebench.utils.json_stream.JsonObjectSocketStream`, speaking the same wire format.
+    """
+
+    def __init__(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        chunk_size: int = 4096,
+        framed: bool = False,
+        serializer: Serializer | None = None,
+        link: LinkShaper | None = None,
+    ) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._link = link
+        self._deliveries: asyncio.Queue[Tuple[float, bytes]] = asyncio.Queue()
+        self._delivery_task: asyncio.Task[None] | None = None
+        self._chunk_size = chunk_size
+        self._framed = framed
+        self._serializer = JsonSerializer() if serializer is None else serializer
+        # unframed messages are always JSON documents
+        self._unframed_serializer = self._serializer if self._serializer.JSON else JsonSerializer()
+        self._buffer = b""
+
+        if not self._framed and not self._serializer.JSON:
+            raise ValueError("serializer %s requires framed mode" % self._serializer.NAME)
+
+    @classmethod
+    async def open_unix_connection(cls, socket_path: str, **kwargs: Any) -> AsyncJsonObjectStream:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        return cls(reader, writer, **kwargs)
+
+    @property
+    def framed(self) -> bool:
+        return self._framed
+
+    @property
+    def serializer(self) -> Serializer:
+        return self._serializer
+
+    async def receive_object(self, timeout: float | None = None) -> Tuple[Any, int]:
+        """
+        :return: the received object and the number of bytes it took on the wire, (None, 0) if the connection has
+            been closed
+        """
+        try:
+            return await asyncio.wait_for(self._receive_object(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError()
+
+    async def _receive_object(self) -> Tuple[Any, int]:
+        if not await self._receive_first_chunk():
+            return None, 0
+        if self._buffer[0] != FRAME_MARKER:
+            return await self._receive_unframed()
+
+        payload_length = await self._receive_frame_header()
+        bytes_count = FRAME_HEADER.size + payload_length
+        payload = self._buffer[FRAME_HEADER.size : bytes_count]
+        self._buffer = self._buffer[bytes_count:]
+        if len(payload) < payload_length:
+            payload += await self._read_exactly(payload_length - len(payload))
+        return self.serializer.loads(payload), bytes_count
+
+    async def relay_object(
+        self,
+        target: AsyncJsonObjectStream,
+        on_receive: Callable[[int], None] | None = None,
+    ) -> int:
+        """
+        Receive the next object and send it to `target`, see
+        `bfebench.utils.json_stream.JsonObjectSocketStream.relay_object`.
+        """
+        if not await self._receive_first_chunk():
+            return 0
+        if self._buffer[0] != FRAME_MARKER:
+            received, bytes_count = await self._receive_unframed()
+            if on_receive is not None:
+                on_receive(bytes_count)
+            await target.send_object(received)
+            return bytes_count
+
+        bytes_count = FRAME_HEADER.size + await self._receive_frame_header()
+        if on_receive is not None:
+            on_receive(bytes_count)
+        buffered = self._buffer[:bytes_count]
+        self._buffer = self._buffer[bytes_count:]
+        await target._write(buffered)
+
+        remaining = bytes_count - len(buffered)
+        while remaining > 0:
+            chunk = await self._reader.read(min(remaining, RELAY_BUFFER_SIZE))
+            if chunk == b"":
+                raise JsonObjectSocketStreamClosedUnexpectedly
+            await target._write(chunk)
+            remaining -= len(chunk)
+        return bytes_count
+
+    async def _receive_first_chunk(self) -> bool:
+        if self._buffer == b"":
+            self._buffer = await self._reader.read(self._chunk_size)
+        return self._buffer != b""
+
+    async def _receive_frame_header(self) -> int:
+        if len(self._buffer) < FRAME_HEADER.size:
+            self._buffer += await self._read_exactly(FRAME_HEADER.size - len(self._buffer))
+        _, payload_length = FRAME_HEADER.unpack_from(self._buffer)
+        return int(payload_length)
+
+    async def _receive_unframed(self) -> Tuple[Any, int]:
+        object_end_pos = 0
+
+        while True:
+            while True:
+                new_object_end_pos = self._buffer.find(b"}", object_end_pos + 1)
+                if new_object_end_pos == -1:
+                    break
+
+                object_end_pos = new_object_end_pos
+                try:
+                    bytes_count = new_object_end_pos + 1
+                    json_object = self._unframed_serializer.loads(self._buffer[0:bytes_count])
+                    self._buffer = self._buffer[new_object_end_pos + 1 :]
+                    return json_object, bytes_count
+                except ValueError:
+                    pass
+
+            chunk = await self._reader.read(self._chunk_size)
+            if chunk == b"":
+                raise JsonObjectSocketStreamClosedUnexpectedly
+            self._buffer += chunk
+
+    async def _read_exactly(self, n: int) -> bytes:
+        try:
+            return await self._reader.readexactly(n)
+        except asyncio.IncompleteReadError:
+            raise JsonObjectSocketStreamClosedUnexpectedly
+
+    async def send_object(self, obj: Any) -> int:
+        data = self.serializer.dumps(obj)
+        if self.framed:
+            data = FRAME_HEADER.pack(FRAME_MARKER, len(data)) + data
+        await self._write(data)
+        return len(data)
+
+    async def _write(self, data: bytes) -> None:
+        """
+        Write the data, through the simulated link if there is one: wait until the link has sent it and deliver it
+        after the link's latency, while further data can be sent.
+        """
+        if self._link is None:
+            self._writer.write(data)
+            await self._writer.drain()
+            return
+
+        loop = asyncio.get_running_loop()
+        sent_at, delivered_at = self._link.schedule(len(data), loop.time())
+        if self._delivery_task is None:
+            self._delivery_task = loop.create_task(self._deliver())
+        await asyncio.sleep(max(sent_at - loop.time(), 0))
+        self._deliveries.put_nowait((delivered_at, data))
+
+    async def _deliver(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            delivered_at, data = await self._deliveries.get()
+            await asyncio.sleep(max(delivered_at - loop.time(), 0))
+            self._writer.write(data)
+            await self._writer.drain()
+            self._deliveries.task_done()
+
+    async def write_eof(self) -> None:
+        """
+        Close the writing side once everything written so far has been delivered, so that the other side receives EOF
+        while it can still send.
+        """
+        if self._delivery_task is not None:
+            await self._deliveries.join()
+        if self._writer.can_write_eof():
+            self._writer.write_eof()
+
+    async def close(self) -> None:
+        if self._delivery_task is not None:
+            self._delivery_task.cancel()
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+class EventLoopThread(object):
+    """
+    Event loop running in a daemon thread, for using asyncio components from synchronous code.
+    """
+
+    _shared: EventLoopThread | None = None
+    _shared_lock = Lock()
+
+    def __init__(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def get_shared(cls) -> EventLoopThread:
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = EventLoopThread()
+            return cls._shared
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    def run(self, coroutine: Coroutine[Any, Any, T]) -> T:
+        """
+        Run the coroutine on the loop and wait for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+
+class AsyncJsonObjectSocketStreamForwarder(object):
+    """
+    Forwarder between two Unix domain sockets, with the same stats as
+    `bfebench.utils.json_stream.JsonObjectSocketStreamForwarder`. Listening, accepting and relaying happen on an event
+    loop (by default one shared by all forwarders) instead of in threads per server and direction.
+    """
+
+    def __init__(
+        self,
+        socket_path1: str,
+        socket_path2: str,
+        event_loop: EventLoopThread | None = None,
+        link_profile: LinkProfile | None = None,
+    ) -> None:
+        """
+        :param link_profile: if set, the traffic in each direction is shaped like on a network link with this profile
+        """
+        self._socket_paths = (socket_path1, socket_path2)
+        self._link_profile = link_profile
+        self._event_loop = EventLoopThread.get_shared() if event_loop is None else event_loop
+
+        self._counter_1to2 = JsonObjectSocketStreamForwarder.Counter()
+        self._counter_2to1 = JsonObjectSocketStreamForwarder.Counter()
+
+        self._servers: List[asyncio.AbstractServer] = []
+        self._streams: List[asyncio.Future[AsyncJsonObjectStream]] = []
+        self._relay_task: asyncio.Task[None] | None = None
+
+    def get_stats(self) -> JsonObjectSocketStreamForwarderStats:
+        return JsonObjectSocketStreamForwarderStats(
+            count_1to2=self._counter_1to2.count,
+            count_2to1=self._counter_2to1.count,
+            bytes_1to2=self._counter_1to2.bytes,
+            bytes_2to1=self._counter_2to1.bytes,
+        )
+
+    def start(self) -> None:
+        """
+        Listen on both sockets. Returns as soon as clients can connect.
+        """
+        self._event_loop.run(self._start())
+
+    def close(self) -> None:
+        self._event_loop.run(self._close())
+        for socket_path in self._socket_paths:
+            if Path(socket_path).exists():
+                Path(socket_path).unlink()
+
+    async def _start(self) -> None:
+        loop = asyncio.get_running_loop()
+        for socket_path in self._socket_paths:
+            stream: asyncio.Future[AsyncJsonObjectStream] = loop.create_future()
+            link = None if self._link_profile is None else LinkShaper(self._link_profile)
+            self._servers.append(await asyncio.start_unix_server(self._accept_callback(stream, link), socket_path))
+            self._streams.append(stream)
+        self._relay_task = loop.create_task(self._relay())
+
+    @staticmethod
+    def _accept_callback(
+        stream: asyncio.Future[AsyncJsonObjectStream],
+        link: LinkShaper | None,
+    ) -> Callable[[asyncio.StreamReader, asyncio.StreamWriter], None]:
+        def accept(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            if stream.done():
+                writer.close()  # like the threaded server streams, accept a single connection only
+            else:
+                stream.set_result(AsyncJsonObjectStream(reader, writer, link=link))
+
+        return accept
+
+    async def _relay(self) -> None:
+        stream1, stream2 = await asyncio.gather(*self._streams)
+        await asyncio.gather(
+            self._forward(stream1, stream2, self._counter_1to2),
+            self._forward(stream2, stream1, self._counter_2to1),
+        )
+
+    @staticmethod
+    async def _forward(
+        source: AsyncJsonObjectStream,
+        target: AsyncJsonObjectStream,
+        counter: JsonObjectSocketStreamForwarder.Counter,
+    ) -> None:
+        while True:
+            try:
+                if await source.relay_object(target, on_receive=counter.add) == 0:  # socket has been closed cleanly
+                    break
+            except JsonObjectSocketStreamClosedUnexpectedly:
+                logger.error("socket closed in the middle of a message")
+                break
+            except OSError as e:
+                logger.error("could not write to socket: %s" % str(e))
+                break
+
+        # pass the end of the stream on, like closing the socket it has been relayed from
+        try:
+            await target.write_eof()
+        except OSError as e:
+            logger.error("could not close socket: %s" % str(e))
+
+    async def _close(self) -> None:
+        if self._relay_task is not None:
+            self._relay_task.cancel()
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        for stream in self._streams:
+            if stream.done():
+                await stream.result().close()
+            else:
+                stream.cancel()
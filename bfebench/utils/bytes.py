@@ -18,6 +18,10 @@
 from __future__ import annotations
 
 import random
+from typing import Union
+
+# bytes-like objects which can be hashed, sliced and xor-ed without copying them first
+Buffer = Union[bytes, bytearray, memoryview]
 
 
 def generate_bytes(length: int = 32, seed: int | None = None, avoid: bytes | None = None) -> bytes:
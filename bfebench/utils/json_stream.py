@@ -17,15 +17,26 @@
 
 from __future__ import annotations
 
-import json
 import logging
 import socket
+import struct
 from pathlib import Path
 from threading import Thread
-from typing import Any, NamedTuple, Tuple
+from typing import Any, Callable, List, NamedTuple, Tuple
+from weakref import WeakSet
+
+from ..decorators import BLOCKED_P2P, blocked
+from .serializer import JsonSerializer, Serializer
 
 logger = logging.getLogger(__name__)
 
+# header of framed messages: a marker byte (which cannot start an unframed JSON object) and the payload length
+FRAME_HEADER = struct.Struct("!BQ")
+FRAME_MARKER = 0
+
+# size of the buffer the forwarder moves framed messages through
+RELAY_BUFFER_SIZE = 2**18
+
 
 class JsonObjectSocketStreamError(IOError):
     pass
@@ -36,11 +47,34 @@ class JsonObjectSocketStreamClosedUnexpectedly(JsonObjectSocketStreamError):
 
 
 class JsonObjectSocketStream(object):
-    def __init__(self, socket_path: str, chunk_size: int = 4096) -> None:
+    """
+    Stream of JSON objects over a socket.
+
+    Objects are sent either unframed, as plain JSON documents which the receiver has to find the end of by parsing,
+    or, if `framed` is set, with a `FRAME_HEADER` holding the payload length, so the receiver reads exactly the
+    payload into a preallocated buffer and parses it once. Receiving accepts both kinds of messages in any order.
+
+    Objects are encoded with `serializer`, by default as JSON. Serializers with a non-JSON output need framing.
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        chunk_size: int = 4096,
+        framed: bool = False,
+        serializer: Serializer | None = None,
+    ) -> None:
         self._socket_path = socket_path
         self._chunk_size = chunk_size
+        self._framed = framed
+        self._serializer = JsonSerializer() if serializer is None else serializer
+        # unframed messages are always JSON documents
+        self._unframed_serializer = self._serializer if self._serializer.JSON else JsonSerializer()
         self._buffer = b""
 
+        if not self._framed and not self._serializer.JSON:
+            raise ValueError("serializer %s requires framed mode" % self._serializer.NAME)
+
     @property
     def socket_path(self) -> str:
         return self._socket_path
@@ -49,32 +83,123 @@ class JsonObjectSocketStream(object):
     def chunk_size(self) -> int:
         return self._chunk_size
 
+    @property
+    def framed(self) -> bool:
+        return self._framed
+
+    @property
+    def serializer(self) -> Serializer:
+        return self._serializer
+
     @property
     def socket_connection(self) -> socket.socket:
         raise NotImplementedError()
 
     def receive_object(self, timeout: float | None = None) -> Tuple[Any, int]:
+        """
+        :return: the received object and the number of bytes it took on the wire, (None, 0) if the connection has
+            been closed
+        """
         self.socket_connection.settimeout(timeout)
 
-        object_end_pos = 0
-
-        while True:
-            try:
-                chunk = self.socket_connection.recv(self.chunk_size)
-            except socket.timeout:
-                raise TimeoutError()
-            except ConnectionResetError:
-                logger.warning("ConnectionResetError during receiving")
+        try:
+            if not self._receive_first_chunk():
                 return None, 0
-
-            if chunk == b"":
-                if self._buffer == b"":
-                    return None, 0
-                else:
+            if self._buffer[0] == FRAME_MARKER:
+                return self._receive_frame()
+            else:
+                return self._receive_unframed()
+        except socket.timeout:
+            raise TimeoutError()
+        except ConnectionResetError:
+            logger.warning("ConnectionResetError during receiving")
+            return None, 0
+
+    def relay_object(
+        self,
+        target: JsonObjectSocketStream,
+        relay_buffer: memoryview,
+        on_receive: Callable[[int], None] | None = None,
+    ) -> int:
+        """
+        Receive the next object and send it to `target`. Framed messages are copied as they are, chunk by chunk
+        through `relay_buffer`, without parsing or even holding the whole payload. Unframed messages have to be
+        parsed to find their end and are sent with `target.send_object`.
+
+        `on_receive` is called with the number of bytes of the object before anything is sent to `target`.
+
+        :return: the number of bytes the object took on the wire, 0 if the connection has been closed
+        """
+        self.socket_connection.settimeout(None)
+
+        try:
+            if not self._receive_first_chunk():
+                return 0
+            if self._buffer[0] != FRAME_MARKER:
+                received, bytes_count = self._receive_unframed()
+                if on_receive is not None:
+                    on_receive(bytes_count)
+                target.send_object(received)
+                return bytes_count
+
+            bytes_count = FRAME_HEADER.size + self._receive_frame_header()
+            if on_receive is not None:
+                on_receive(bytes_count)
+            buffered = self._buffer[:bytes_count]
+            self._buffer = self._buffer[bytes_count:]
+            target.socket_connection.sendall(buffered)
+
+            remaining = bytes_count - len(buffered)
+            while remaining > 0:
+                received_now = self.socket_connection.recv_into(relay_buffer, min(remaining, len(relay_buffer)))
+                if received_now == 0:
                     raise JsonObjectSocketStreamClosedUnexpectedly
+                target.socket_connection.sendall(relay_buffer[:received_now])
+                remaining -= received_now
+            return bytes_count
+        except ConnectionResetError:
+            logger.warning("ConnectionResetError during relaying")
+            return 0
+
+    def _receive_first_chunk(self) -> bool:
+        if self._buffer == b"":
+            with blocked(BLOCKED_P2P):
+                chunk = self.socket_connection.recv(self.chunk_size)
+            if chunk == b"":
+                return False
+            self._buffer = chunk
+        return True
+
+    def _receive_frame_header(self) -> int:
+        while len(self._buffer) < FRAME_HEADER.size:
+            self._buffer += self._receive_chunk()
+        _, payload_length = FRAME_HEADER.unpack_from(self._buffer)
+        return int(payload_length)
+
+    def _receive_frame(self) -> Tuple[Any, int]:
+        payload_length = self._receive_frame_header()
+        bytes_count = FRAME_HEADER.size + payload_length
+
+        payload = bytearray(payload_length)
+        payload_view = memoryview(payload)
+        buffered = self._buffer[FRAME_HEADER.size : bytes_count]
+        payload_view[: len(buffered)] = buffered
+        self._buffer = self._buffer[bytes_count:]
+
+        received = len(buffered)
+        while received < payload_length:
+            with blocked(BLOCKED_P2P):
+                received_now = self.socket_connection.recv_into(payload_view[received:])
+            if received_now == 0:
+                raise JsonObjectSocketStreamClosedUnexpectedly
+            received += received_now
+
+        return self.serializer.loads(payload), bytes_count
+
+    def _receive_unframed(self) -> Tuple[Any, int]:
+        object_end_pos = 0
 
-            self._buffer += chunk
-
+        while True:
             while True:
                 new_object_end_pos = self._buffer.find(b"}", object_end_pos + 1)
                 if new_object_end_pos == -1:
@@ -83,22 +208,59 @@ class JsonObjectSocketStream(object):
                 object_end_pos = new_object_end_pos
                 try:
                     bytes_count = new_object_end_pos + 1
-                    json_object = json.loads(self._buffer[0:bytes_count])
+                    json_object = self._unframed_serializer.loads(self._buffer[0:bytes_count])
                     self._buffer = self._buffer[new_object_end_pos + 1 :]
                     return json_object, bytes_count
-                except json.JSONDecodeError:
+                except ValueError:
                     pass
 
+            self._buffer += self._receive_chunk()
+
+    def _receive_chunk(self) -> bytes:
+        with blocked(BLOCKED_P2P):
+            chunk = self.socket_connection.recv(self.chunk_size)
+        if chunk == b"":
+            raise JsonObjectSocketStreamClosedUnexpectedly
+        return chunk
+
     def send_object(self, obj: Any) -> int:
-        return self.socket_connection.send(json.dumps(obj).encode("utf-8"))
+        """
+        :return: the number of bytes the object takes on the wire, all of which have been written
+        """
+        data = self.serializer.dumps(obj)
+        if self.framed:
+            return self._send_buffers([FRAME_HEADER.pack(FRAME_MARKER, len(data)), data])
+        self.socket_connection.sendall(data)
+        return len(data)
+
+    def _send_buffers(self, buffers: List[bytes]) -> int:
+        """
+        Write the buffers back to back with scatter-gather `sendmsg` calls instead of concatenating them first, until
+        everything is written.
+        """
+        views = [memoryview(buffer) for buffer in buffers]
+        bytes_count = sum(len(view) for view in views)
+        while len(views) > 0:
+            sent = self.socket_connection.sendmsg(views)
+            while len(views) > 0 and sent >= len(views[0]):
+                sent -= len(views.pop(0))
+            if sent > 0:
+                views[0] = views[0][sent:]
+        return bytes_count
 
     def close(self) -> None:
         self.socket_connection.close()
 
 
 class JsonObjectUnixDomainSocketServerStream(JsonObjectSocketStream):
-    def __init__(self, socket_path: str, chunk_size: int = 4096) -> None:
-        super().__init__(socket_path, chunk_size)
+    def __init__(
+        self,
+        socket_path: str,
+        chunk_size: int = 4096,
+        framed: bool = False,
+        serializer: Serializer | None = None,
+    ) -> None:
+        super().__init__(socket_path, chunk_size, framed, serializer)
         self._socket_connection: socket.socket | None = None
 
         self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
@@ -130,11 +292,31 @@ class JsonObjectUnixDomainSocketServerStream(JsonObjectSocketStream):
 
 
 class JsonObjectUnixDomainSocketClientStream(JsonObjectSocketStream):
-    def __init__(self, socket_path: str, chunk_size: int = 4096) -> None:
-        super().__init__(socket_path, chunk_size)
+    # client streams opened in this process, see `close_inherited`
+    _instances: WeakSet[JsonObjectUnixDomainSocketClientStream] = WeakSet()
+
+    def __init__(
+        self,
+        socket_path: str,
+        chunk_size: int = 4096,
+        framed: bool = False,
+        serializer: Serializer | None = None,
+    ) -> None:
+        super().__init__(socket_path, chunk_size, framed, serializer)
 
         self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         self._socket.connect(self.socket_path)
+        JsonObjectUnixDomainSocketClientStream._instances.add(self)
+
+    @classmethod
+    def close_inherited(cls, keep: JsonObjectSocketStream | None = None) -> None:
+        """
+        Close the client streams a forked process has inherited from its parent, except `keep`. Otherwise, when the
+        parent closes one of them, the other side would not notice until this process exits.
+        """
+        for stream in list(cls._instances):
+            if stream is not keep:
+                stream.close()
 
     @property
     def socket_connection(self) -> socket.socket:
@@ -160,6 +342,10 @@ class JsonObjectSocketStreamForwarder(object):
             self.count = 0
             self.bytes = 0
 
+        def add(self, bytes_count: int) -> None:
+            self.count += 1
+            self.bytes += bytes_count
+
     def __init__(self, stream1: JsonObjectSocketStream, stream2: JsonObjectSocketStream) -> None:
         self._stream1 = stream1
         self._stream2 = stream2
@@ -196,15 +382,13 @@ class JsonObjectSocketStreamForwarder(object):
         target: JsonObjectSocketStream,
         counter: "JsonObjectSocketStreamForwarder.Counter",
     ) -> None:
+        relay_buffer = memoryview(bytearray(RELAY_BUFFER_SIZE))
         while True:
             try:
-                received, bytes_count = source.receive_object()
-                if received is None:  # socket has been closed cleanly
+                # count before forwarding, so the stats include a message once it has arrived at the target
+                bytes_count = source.relay_object(target, relay_buffer, on_receive=counter.add)
+                if bytes_count == 0:  # socket has been closed cleanly
                     break
             except OSError as e:
                 logger.error("could not write to socket: %s" % str(e))
                 break
-
-            counter.count += 1
-            counter.bytes += bytes_count
-            target.send_object(received)
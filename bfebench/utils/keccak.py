@@ -0,0 +1,198 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import os
+from ctypes import ArgumentError
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Type
+
+from .bytes import Buffer
+
+# keccak(b""), to check a backend against
+EMPTY_KECCAK = bytes.fromhex("c5d2460186f7233c927e7db2dcc703c0e500b653ca82273b7bfad8045d85a470")
+
+
+class KeccakBackend(object):
+    """
+    Keccak-256 (as used by Ethereum) implementation. Subclasses implement `keccak`, `keccak_many` may be overridden
+    if the implementation can hash a batch of inputs with less overhead than one call per input.
+    """
+
+    NAME = ""
+
+    def keccak(self, data: Buffer) -> bytes:
+        raise NotImplementedError()
+
+    def keccak_many(self, inputs: Iterable[Buffer]) -> List[bytes]:
+        return [self.keccak(data) for data in inputs]
+
+
+class Pysha3KeccakBackend(KeccakBackend):
+    NAME = "pysha3"
+
+    def __init__(self) -> None:
+        import sha3  # type: ignore
+
+        self._keccak_256 = sha3.keccak_256
+
+    def keccak(self, data: Buffer) -> bytes:
+        digest: bytes = self._keccak_256(data).digest()
+        return digest
+
+
+class PycryptodomeRawKeccakBackend(KeccakBackend):
+    """
+    Uses the C functions behind pycryptodome's `Crypto.Hash.keccak` directly. This skips the creation of a hash
+    object (and its pointer wrappers) per input, which is most of the cost of hashing 32 or 64 bytes.
+
+    The C functions are private to pycryptodome and their signatures differ between releases, so the backend checks
+    a known digest on creation and raises `ImportError` if it does not match.
+    """
+
+    NAME = "pycryptodome-raw"
+
+    def __init__(self) -> None:
+        from Crypto.Hash.keccak import _raw_keccak_lib  # type: ignore[attr-defined]
+        from Crypto.Util._raw_api import (
+            VoidPointer,
+            c_size_t,
+            c_uint8_ptr,
+            create_string_buffer,
+            get_raw_buffer,
+        )
+
+        self._lib = _raw_keccak_lib
+        self._void_pointer = VoidPointer
+        self._c_size_t = c_size_t
+        self._c_uint8_ptr = c_uint8_ptr
+        self._create_string_buffer = create_string_buffer
+        self._get_raw_buffer = get_raw_buffer
+
+        try:
+            digest = self.keccak(b"")
+        except (TypeError, ValueError, ArgumentError) as e:
+            raise ImportError("incompatible pycryptodome keccak library: %s" % e) from e
+        if digest != EMPTY_KECCAK:
+            raise ImportError("incompatible pycryptodome keccak library: wrong digest")
+
+    def keccak(self, data: Buffer) -> bytes:
+        return self.keccak_many([data])[0]
+
+    def keccak_many(self, inputs: Iterable[Buffer]) -> List[bytes]:
+        init, absorb, digest, destroy = (
+            self._lib.keccak_init,
+            self._lib.keccak_absorb,
+            self._lib.keccak_digest,
+            self._lib.keccak_destroy,
+        )
+        c_size_t, c_uint8_ptr, get_raw_buffer = self._c_size_t, self._c_uint8_ptr, self._get_raw_buffer
+        capacity, digest_size = c_size_t(64), c_size_t(32)
+        state = self._void_pointer()
+        state_address = state.address_of()
+        out = self._create_string_buffer(32, None)
+
+        results = []
+        for data in inputs:
+            if init(state_address, capacity, 0x01):
+                raise ValueError("Error while instantiating keccak")
+            try:
+                if absorb(state.get(), c_uint8_ptr(data), c_size_t(len(data))):
+                    raise ValueError("Error while updating keccak")
+                if digest(state.get(), out, digest_size):
+                    raise ValueError("Error while computing keccak digest")
+            finally:
+                destroy(state.get())
+            results.append(get_raw_buffer(out))
+        return results
+
+
+class PycryptodomeKeccakBackend(KeccakBackend):
+    NAME = "pycryptodome"
+
+    def __init__(self) -> None:
+        from Crypto.Hash import keccak
+
+        self._new = keccak.new
+
+    def keccak(self, data: Buffer) -> bytes:
+        digest: bytes = self._new(data=data, digest_bytes=32).digest()
+        return digest
+
+
+class EthHashKeccakBackend(KeccakBackend):
+    NAME = "eth-hash"
+
+    def __init__(self) -> None:
+        from eth_hash.auto import keccak
+
+        self._keccak: Callable[[Any], bytes] = keccak
+
+    def keccak(self, data: Buffer) -> bytes:
+        return self._keccak(bytes(data) if isinstance(data, memoryview) else data)
+
+
+# ordered from fastest to slowest, the first one which can be loaded is used
+KECCAK_BACKEND_CLASSES: Sequence[Type[KeccakBackend]] = [
+    Pysha3KeccakBackend,
+    PycryptodomeRawKeccakBackend,
+    PycryptodomeKeccakBackend,
+    EthHashKeccakBackend,
+]
+
+
+def get_available_backends() -> Dict[str, KeccakBackend]:
+    backends = {}
+    for backend_class in KECCAK_BACKEND_CLASSES:
+        try:
+            backends[backend_class.NAME] = backend_class()
+        except (ImportError, AttributeError):
+            pass
+    return backends
+
+
+def get_backend(name: str | None = None) -> KeccakBackend:
+    """
+    :param name: name of the backend, defaults to the environment variable `BFEBENCH_KECCAK_BACKEND` or, if not
+        set, the fastest available backend
+    """
+    backends = get_available_backends()
+    if name is None:
+        name = os.environ.get("BFEBENCH_KECCAK_BACKEND")
+    if name is None:
+        return next(iter(backends.values()))
+    if name not in backends:
+        raise ValueError("keccak backend '%s' is not available (available: %s)" % (name, ", ".join(backends.keys())))
+    return backends[name]
+
+
+class Keccak(object):
+    """
+    Callable usable as `digest_func`, with an additional `many` method for batches. See `bfebench.utils.merkle`.
+    """
+
+    def __init__(self, backend: KeccakBackend) -> None:
+        self.backend = backend
+        self.many = backend.keccak_many
+
+    def __call__(self, data: Buffer) -> bytes:
+        return self.backend.keccak(data)
+
+
+BACKEND = get_backend()
+keccak = Keccak(BACKEND)
+keccak_many = BACKEND.keccak_many
@@ -0,0 +1,113 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+from random import Random
+from typing import NamedTuple, Tuple
+
+
+class LinkProfile(NamedTuple):
+    """
+    Properties of a simulated network link, applied to each direction separately.
+    """
+
+    """one-way latency in seconds"""
+    latency: float = 0.0
+
+    """bandwidth in bytes per second, None for unlimited"""
+    bandwidth: float | None = None
+
+    """maximum deviation from the latency in seconds (uniformly distributed)"""
+    jitter: float = 0.0
+
+    """number of bytes which can be sent at once after the link has been idle"""
+    burst: int = 2**16
+
+    """seed for the jitter"""
+    seed: int | None = None
+
+    def validate(self) -> None:
+        """
+        :raises ValueError: if the profile does not describe a possible link
+        """
+        if self.latency < 0:
+            raise ValueError("latency must be >= 0")
+        if self.bandwidth is not None and self.bandwidth <= 0:
+            raise ValueError("bandwidth must be > 0")
+        if self.jitter < 0:
+            raise ValueError("jitter must be >= 0")
+        if self.burst < 0:
+            raise ValueError("burst must be >= 0")
+
+
+class TokenBucket(object):
+    """
+    Token bucket in virtual time: `reserve` does not wait but tells when the reserved tokens are available.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._time: float | None = None
+
+    def reserve(self, tokens: float, now: float) -> float:
+        """
+        Take `tokens` tokens out of the bucket, running into debt if there are not enough.
+
+        :return: the time at which the tokens are available
+        """
+        if self._time is not None and now > self._time:
+            self._tokens = min(self._capacity, self._tokens + (now - self._time) * self._rate)
+        self._time = now if self._time is None else max(now, self._time)
+        self._tokens -= tokens
+        if self._tokens >= 0:
+            return self._time
+        return self._time + (-self._tokens) / self._rate
+
+
+class LinkShaper(object):
+    """
+    Timing of the data sent over one direction of a link with the given profile. Data is delivered in order, like over
+    a TCP connection, so jitter never reorders it.
+    """
+
+    def __init__(self, profile: LinkProfile) -> None:
+        profile.validate()
+        self._profile = profile
+        self._bucket = TokenBucket(profile.bandwidth, profile.burst) if profile.bandwidth is not None else None
+        self._random = Random(profile.seed)
+        self._last_delivery = 0.0
+
+    @property
+    def profile(self) -> LinkProfile:
+        return self._profile
+
+    def schedule(self, bytes_count: int, now: float) -> Tuple[float, float]:
+        """
+        :return: the time at which the data has been sent (which is when the sender may continue) and the time at
+            which it arrives
+        """
+        sent_at = now if self._bucket is None else self._bucket.reserve(bytes_count, now)
+        latency = self._profile.latency
+        if self._profile.jitter > 0:
+            latency = max(latency + self._random.uniform(-self._profile.jitter, self._profile.jitter), 0.0)
+        self._last_delivery = max(sent_at + latency, self._last_delivery)
+        return sent_at, self._last_delivery
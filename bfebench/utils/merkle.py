@@ -19,19 +19,39 @@ from __future__ import annotations
 
 import itertools
 import math
-from typing import Any, Callable, List, Tuple, Union
+import mmap
+import os
+import struct
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Sequence, Union
+
+from .bytes import Buffer
+
+# number of inputs passed to the digest function's batch method at once
+DIGEST_BATCH_SIZE = 4096
+
+# header of the binary tree format: length and count of the leading slices, length and count of the trailing leaves
+TREE_BYTES_HEADER = struct.Struct("!IIII")
 
 
 class MerkleTreeNode(object):
-    def __init__(self, digest_func: Callable[[bytes], bytes], *children: "MerkleTreeNode") -> None:
+    def __init__(self, digest_func: Callable[[Buffer], bytes], *children: "MerkleTreeNode") -> None:
         if len(children) > 2:
             raise ValueError("Cannot have more than two children")
 
         self._digest_func = digest_func
         self._children = list(children)
+        self._parents: List[MerkleTreeNode] = []
+        for child in self._children:
+            child._parents.append(self)
+
+        # caches, digest is invalidated via `invalidate()` whenever leaf data below this node changes
+        self._digest: bytes | None = None
+        self._leaves: List[MerkleTreeLeaf] | None = None
 
     @property
-    def digest_func(self) -> Callable[[bytes], bytes]:
+    def digest_func(self) -> Callable[[Buffer], bytes]:
         return self._digest_func
 
     @property
@@ -40,14 +60,29 @@ class MerkleTreeNode(object):
 
     @property
     def leaves(self) -> List["MerkleTreeLeaf"]:
-        return list(itertools.chain.from_iterable([c.leaves for c in self.children]))
+        if self._leaves is None:
+            self._leaves = list(itertools.chain.from_iterable([c.leaves for c in self.children]))
+        return list(self._leaves)
 
     @property
     def digest(self) -> bytes:
-        digest_input = b""
-        for child in self.children:
-            digest_input += child.digest
-        return self._digest_func(digest_input)
+        if self._digest is None:
+            digest_input = b""
+            for child in self.children:
+                digest_input += child.digest
+            self._digest = self._digest_func(digest_input)
+        return self._digest
+
+    @property
+    def leaf_count(self) -> int:
+        if self._leaves is None:
+            self._leaves = list(itertools.chain.from_iterable([c.leaves for c in self.children]))
+        return len(self._leaves)
+
+    def invalidate(self) -> None:
+        self._digest = None
+        for parent in self._parents:
+            parent.invalidate()
 
     @property
     def digests_dfs(self) -> List[bytes]:
@@ -55,12 +90,17 @@ class MerkleTreeNode(object):
 
     @property
     def digests_pack(self) -> List[bytes]:
-        return [digest for digest, level in sorted(self._digests_pack(0), key=lambda d: d[1], reverse=True)]
-
-    def _digests_pack(self, level: int) -> List[Tuple[bytes, int]]:
-        return list(itertools.chain.from_iterable([c._digests_pack(level + 1) for c in self.children])) + [
-            (self.digest, level)
-        ]
+        """
+        Digests of all inner nodes, the deepest level first, each level from left to right.
+        """
+        levels: List[List[MerkleTreeNode]] = []
+        level: List[MerkleTreeNode] = [self]
+        while len(level) > 0:
+            inner_nodes = [node for node in level if not isinstance(node, MerkleTreeLeaf)]
+            if len(inner_nodes) > 0:
+                levels.append(inner_nodes)
+            level = [child for node in inner_nodes for child in node.children]
+        return [node.digest for inner_nodes in reversed(levels) for node in inner_nodes]
 
     def has_indirect_child(self, node: "MerkleTreeNode") -> bool:
         if node in self.children:
@@ -85,13 +125,29 @@ class MerkleTreeNode(object):
         else:
             raise ValueError("Node is not part of this tree")
 
+    def get_proof_by_index(self, index: int) -> List[bytes]:
+        if index < 0 or index >= self.leaf_count:
+            raise ValueError("leaf index out of range")
+        proof = []
+        node = self
+        while not isinstance(node, MerkleTreeLeaf):
+            left, right = node.children
+            if index < left.leaf_count:
+                proof.append(right.digest)
+                node = left
+            else:
+                proof.append(left.digest)
+                index -= left.leaf_count
+                node = right
+        return proof
+
     @staticmethod
     def validate_proof(
         root_digest: bytes,
         node: "MerkleTreeNode",
         index: int,
         proof: List[bytes],
-        digest_func: Callable[[bytes], bytes],
+        digest_func: Callable[[Buffer], bytes],
     ) -> bool:
         tmp_digest = node.digest
         for i in range(len(proof)):
@@ -118,7 +174,7 @@ class MerkleTreeNode(object):
 
 
 class MerkleTreeLeaf(MerkleTreeNode):
-    def __init__(self, digest_func: Callable[[bytes], bytes], data: bytes) -> None:
+    def __init__(self, digest_func: Callable[[Buffer], bytes], data: Buffer) -> None:
         super(MerkleTreeLeaf, self).__init__(digest_func=digest_func)
         if (len(data) % 32) != 0:
             raise ValueError("data length has to be a multiple of 32")
@@ -126,23 +182,38 @@ class MerkleTreeLeaf(MerkleTreeNode):
 
     @property
     def digest(self) -> bytes:
-        return self.digest_func(b"".join(self.data_as_list()))
+        if self._digest is None:
+            self._digest = self.digest_func(self._data)
+        return self._digest
 
     @property
     def data(self) -> bytes:
-        return self._data
+        return self._data if isinstance(self._data, bytes) else bytes(self._data)
 
     @data.setter
-    def data(self, data: bytes) -> None:
+    def data(self, data: Buffer) -> None:
         self._data = data
+        self.invalidate()
+
+    @property
+    def data_view(self) -> memoryview:
+        """
+        Zero-copy view on the leaf's data. The view is a snapshot, it is not affected by assigning new data later.
+        """
+        return memoryview(self._data)
 
     def data_as_list(self, slice_size: int = 32) -> List[bytes]:
-        return [self.data[i * slice_size : (i + 1) * slice_size] for i in range(int(len(self.data) / slice_size))]
+        view = self.data_view
+        return [bytes(view[i * slice_size : (i + 1) * slice_size]) for i in range(int(len(view) / slice_size))]
 
     @property
     def leaves(self) -> List["MerkleTreeLeaf"]:
         return [self]
 
+    @property
+    def leaf_count(self) -> int:
+        return 1
+
     @property
     def digests_dfs(self) -> List[bytes]:
         return []
@@ -151,9 +222,6 @@ class MerkleTreeLeaf(MerkleTreeNode):
     def digests_pack(self) -> List[bytes]:
         return []
 
-    def _digests_pack(self, level: int) -> List[Tuple[bytes, int]]:
-        return []
-
     def __repr__(self) -> str:
         return "<%s.%s %s>" % (__name__, MerkleTreeLeaf.__name__, str(self.data))
 
@@ -173,32 +241,490 @@ class MerkleTreeLeaf(MerkleTreeNode):
             return False
 
 
-def from_leaves(leaves: List[MerkleTreeLeaf]) -> MerkleTreeNode:
+class FlatMerkleTreeNode(MerkleTreeNode):
+    """
+    View on an inner node of a `FlatMerkleTree`.
+
+    Node numbers follow the heap layout of the tree: the root has number 1, the children of node i have the numbers
+    2i and 2i+1, the leaves occupy the numbers n to 2n-1.
+    """
+
+    def __init__(self, tree: "FlatMerkleTree", index: int) -> None:
+        super(FlatMerkleTreeNode, self).__init__(tree.digest_func)
+        self._tree = tree
+        self._index = index
+
+    @property
+    def tree(self) -> "FlatMerkleTree":
+        return self._tree
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def height(self) -> int:
+        return self._tree.height - (self._index.bit_length() - 1)
+
+    @property
+    def children(self) -> List[MerkleTreeNode]:
+        return [self._tree.get_node(2 * self._index), self._tree.get_node(2 * self._index + 1)]
+
+    @property
+    def leaves(self) -> List["MerkleTreeLeaf"]:
+        first = self._index * self.leaf_count - self._tree.leaf_count
+        return list(self._tree.get_leaves()[first : first + self.leaf_count])
+
+    @property
+    def leaf_count(self) -> int:
+        return 1 << self.height
+
+    @property
+    def digest(self) -> bytes:
+        return self._tree.get_digest(self._index)
+
+    @property
+    def digests_pack(self) -> List[bytes]:
+        digests = []
+        for depth in reversed(range(self.height)):
+            span = 1 << depth
+            digests += [self._tree.get_digest(i) for i in range(self._index * span, (self._index + 1) * span)]
+        return digests
+
+    def get_proof_by_index(self, index: int) -> List[bytes]:
+        if index < 0 or index >= self.leaf_count:
+            raise ValueError("leaf index out of range")
+        proof = []
+        node = self._index * self.leaf_count + index
+        while node > self._index:
+            proof.append(self._tree.get_digest(node ^ 1))
+            node //= 2
+        proof.reverse()
+        return proof
+
+
+class FlatMerkleTreeLeaf(MerkleTreeLeaf):
+    """
+    View on a leaf of a `FlatMerkleTree`. Setting `data` updates the tree buffers in place.
+    """
+
+    def __init__(self, tree: "FlatMerkleTree", index: int) -> None:
+        MerkleTreeNode.__init__(self, tree.digest_func)
+        self._tree = tree
+        self._index = index
+
+    @property
+    def tree(self) -> "FlatMerkleTree":
+        return self._tree
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def digest(self) -> bytes:
+        return self._tree.get_digest(self._index)
+
+    @property
+    def data(self) -> bytes:
+        return self._tree.get_leaf_data(self._index - self._tree.leaf_count)
+
+    @data.setter
+    def data(self, data: Buffer) -> None:
+        self._tree.set_leaf_data(self._index - self._tree.leaf_count, data)
+        self.invalidate()
+
+    @property
+    def data_view(self) -> memoryview:
+        return self._tree.get_leaf_view(self._index - self._tree.leaf_count)
+
+
+class FlatMerkleTree(FlatMerkleTreeNode):
+    """
+    Complete binary Merkle tree backed by contiguous buffers instead of one object per node.
+
+    The leaf data is kept in a single buffer (with an offset table), all digests (leaves and inner nodes) are kept in
+    a second buffer in heap layout. Every digest is computed exactly once during construction, node and leaf objects
+    are only created as lightweight views when accessed.
+
+    The leaf buffer is either owned by the tree or, when built with `from_buffer`, an existing buffer such as a
+    memory-mapped file which is used without copying it. In both cases it is never modified in place: `set_leaf_data`
+    replaces it with a modified copy, so views handed out by `get_leaf_view` stay valid and unchanged.
+    """
+
+    def __init__(
+        self,
+        digest_func: Callable[[Buffer], bytes],
+        leaves_data: Iterable[Buffer],
+        leaf_count: int | None = None,
+        workers: int = 1,
+    ) -> None:
+        """
+        :param digest_func: digest function used for leaves and inner nodes
+        :param leaves_data: data of the leaves, may be a generator if `leaf_count` is provided
+        :param leaf_count: number of leaves, required only if `leaves_data` has no length
+        :param workers: number of threads computing the digests, see `_build_parallel`
+        """
+        if leaf_count is None:
+            leaves_data = list(leaves_data)
+            leaf_count = len(leaves_data)
+
+        buffer = bytearray()
+
+        def collect() -> Iterator[Buffer]:
+            for data in leaves_data:
+                buffer.extend(data)
+                yield data
+
+        self._build(digest_func, collect(), leaf_count, workers)
+        self._set_buffer(buffer)
+        super(FlatMerkleTree, self).__init__(self, 1)
+
+    @classmethod
+    def from_buffer(
+        cls, digest_func: Callable[[Buffer], bytes], buffer: Buffer, leaf_count: int, workers: int = 1
+    ) -> FlatMerkleTree:
+        """
+        Build a tree over the given buffer without copying it. The leaves are slices of equal length (the last ones
+        may be shorter), the same way `from_bytes` slices its input.
+
+        The buffer must not be modified while the tree is in use.
+        """
+        view = memoryview(buffer)
+        slice_len = math.ceil(len(view) / leaf_count) if leaf_count > 0 else 0
+        return cls._from_views(
+            digest_func,
+            buffer,
+            (view[slice_len * s : slice_len * (s + 1)] for s in range(leaf_count)),
+            leaf_count,
+            workers,
+        )
+
+    @classmethod
+    def _from_views(
+        cls,
+        digest_func: Callable[[Buffer], bytes],
+        buffer: Buffer,
+        leaves_data: Iterable[memoryview],
+        leaf_count: int,
+        workers: int = 1,
+    ) -> FlatMerkleTree:
+        # leaves_data has to be consecutive views on buffer, covering it from the start
+        tree = cls.__new__(cls)
+        tree._build(digest_func, leaves_data, leaf_count, workers)
+        tree._set_buffer(buffer)
+        super(FlatMerkleTree, tree).__init__(tree, 1)
+        return tree
+
+    def _build(
+        self, digest_func: Callable[[Buffer], bytes], leaves_data: Iterable[Buffer], leaf_count: int, workers: int
+    ) -> None:
+        if leaf_count < 2 or not math.log2(leaf_count).is_integer():
+            raise ValueError("leaf count must be >= 2 and a power of 2")
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+
+        self._digest_func = digest_func
+        self._leaf_count = leaf_count
+        self._height = int(math.log2(leaf_count))
+
+        self._offsets = array("Q", [0])
+        self._digest_size = 0
+        self._digests = bytearray()
+
+        if workers > 1:
+            leaves = []
+            for leaf_index, data in enumerate(leaves_data):
+                self._append_offset(leaf_index, data)
+                leaves.append(data)
+            if len(leaves) == leaf_count:
+                self._build_parallel(leaves, workers)
+        else:
+            # leaves are hashed in batches while they are consumed, inner nodes level by level afterwards
+            batch: List[Buffer] = []
+            for leaf_index, data in enumerate(leaves_data):
+                self._append_offset(leaf_index, data)
+                batch.append(data)
+                if len(batch) == DIGEST_BATCH_SIZE or leaf_index == leaf_count - 1:
+                    self._set_digests(leaf_count + leaf_index + 1 - len(batch), _digest_many(digest_func, batch))
+                    batch = []
+            if len(self._offsets) == leaf_count + 1:
+                for depth in reversed(range(self._height)):
+                    self._update_digests(1 << depth, 2 << depth)
+
+        if len(self._offsets) != leaf_count + 1:
+            raise ValueError("got %d instead of %d leaves" % (len(self._offsets) - 1, leaf_count))
+
+        self._leaf_views: List[FlatMerkleTreeLeaf] | None = None
+
+    def _build_parallel(self, leaves_data: List[Buffer], workers: int) -> None:
+        """
+        Split the tree into (at least) as many complete subtrees as there are workers and compute the subtrees in a
+        thread pool. The digest functions release the GIL while hashing, so this scales for large leaves. The levels
+        above the subtrees are computed afterwards, the result does not depend on the scheduling of the threads.
+        """
+        subtree_count = min(self._leaf_count, 1 << (workers - 1).bit_length())
+        subtree_size = self._leaf_count // subtree_count
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            subtrees = list(
+                executor.map(
+                    lambda s: _subtree_levels(
+                        self._digest_func, leaves_data[s * subtree_size : (s + 1) * subtree_size]
+                    ),
+                    range(subtree_count),
+                )
+            )
+
+        for subtree_index, levels in enumerate(subtrees):
+            for depth, digests in enumerate(levels):
+                self._set_digests((subtree_count + subtree_index) << (len(levels) - 1 - depth), digests)
+        for depth in reversed(range(subtree_count.bit_length() - 1)):
+            self._update_digests(1 << depth, 2 << depth)
+
+    def _append_offset(self, leaf_index: int, data: Buffer) -> None:
+        if leaf_index >= self._leaf_count:
+            raise ValueError("got more than %d leaves" % self._leaf_count)
+        if (len(data) % 32) != 0:
+            raise ValueError("data length has to be a multiple of 32")
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def _allocate_digests(self, digest_size: int) -> None:
+        self._digest_size = digest_size
+        self._digests = bytearray(2 * self._leaf_count * digest_size)
+        self._digests_view = memoryview(self._digests)
+
+    def _set_buffer(self, buffer: Buffer) -> None:
+        self._buffer = buffer
+        self._buffer_view = memoryview(buffer)
+
+    @property
+    def leaf_count(self) -> int:
+        return self._leaf_count
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    @property
+    def leaves(self) -> List[MerkleTreeLeaf]:
+        return list(self.get_leaves())
+
+    def get_leaves(self) -> List[FlatMerkleTreeLeaf]:
+        if self._leaf_views is None:
+            self._leaf_views = [FlatMerkleTreeLeaf(self, self._leaf_count + i) for i in range(self._leaf_count)]
+        return self._leaf_views
+
+    def get_node(self, index: int) -> MerkleTreeNode:
+        if index < 1 or index >= 2 * self._leaf_count:
+            raise IndexError("node index out of range")
+        if index == 1:
+            return self
+        if index >= self._leaf_count:
+            return self.get_leaves()[index - self._leaf_count]
+        return FlatMerkleTreeNode(self, index)
+
+    def get_digest(self, index: int) -> bytes:
+        return bytes(self._digests[index * self._digest_size : (index + 1) * self._digest_size])
+
+    def get_multi_proof(self, indices: Sequence[int]) -> Dict[int, bytes]:
+        """
+        Create a combined proof for the leaves at the given indices.
+
+        Siblings shared between the individual proofs are contained only once, siblings which can be computed from
+        the proven leaves themselves are omitted.
+
+        :param indices: leaf indices to be proven
+        :return: mapping from node number (heap layout) to digest for all nodes required for the proof
+        """
+        nodes = set()
+        for index in indices:
+            if index < 0 or index >= self._leaf_count:
+                raise ValueError("leaf index out of range")
+            nodes.add(self._leaf_count + index)
+
+        proof = {}
+        while len(nodes) > 0 and nodes != {1}:
+            for node in nodes:
+                if node ^ 1 not in nodes:
+                    proof[node ^ 1] = self.get_digest(node ^ 1)
+            nodes = {node // 2 for node in nodes}
+        return proof
+
+    @staticmethod
+    def validate_multi_proof(
+        root_digest: bytes,
+        leaf_count: int,
+        leaf_digests: Dict[int, bytes],
+        proof: Dict[int, bytes],
+        digest_func: Callable[[Buffer], bytes],
+    ) -> bool:
+        """
+        Validate a proof created by `get_multi_proof`.
+
+        :param root_digest: expected root digest of the tree
+        :param leaf_count: number of leaves of the tree
+        :param leaf_digests: mapping from leaf index to leaf digest for all proven leaves
+        :param proof: the multi proof
+        :param digest_func: digest function of the tree
+        """
+        if len(leaf_digests) == 0 or any(index < 0 or index >= leaf_count for index in leaf_digests.keys()):
+            return False
+        digests = dict(proof)
+        digests.update({leaf_count + index: digest for index, digest in leaf_digests.items()})
+        nodes = {leaf_count + index for index in leaf_digests.keys()}
+        while nodes != {1}:
+            parents = set()
+            for node in nodes:
+                if node // 2 in parents:
+                    continue
+                left, right = digests.get(node & ~1), digests.get(node | 1)
+                if left is None or right is None:
+                    return False
+                digests[node // 2] = digest_func(left + right)
+                parents.add(node // 2)
+            nodes = parents
+        return digests[1] == root_digest
+
+    def get_leaf_data(self, leaf_index: int) -> bytes:
+        return bytes(self.get_leaf_view(leaf_index))
+
+    def get_leaf_view(self, leaf_index: int) -> memoryview:
+        return self._buffer_view[self._offsets[leaf_index] : self._offsets[leaf_index + 1]]
+
+    def set_leaf_data(self, leaf_index: int, data: Buffer) -> None:
+        if (len(data) % 32) != 0:
+            raise ValueError("data length has to be a multiple of 32")
+        start, end = self._offsets[leaf_index], self._offsets[leaf_index + 1]
+        buffer = bytearray(self._buffer_view[:start])
+        buffer += data
+        buffer += self._buffer_view[end:]
+        self._set_buffer(buffer)
+        if len(data) != end - start:
+            for i in range(leaf_index + 1, self._leaf_count + 1):
+                self._offsets[i] = self._offsets[i] + len(data) - (end - start)
+
+        index = self._leaf_count + leaf_index
+        self._set_digest(index, self._digest_func(data))
+        while index > 1:
+            index //= 2
+            self._update_digest(index)
+
+    def _set_digest(self, index: int, digest: bytes) -> None:
+        self._digests[index * self._digest_size : (index + 1) * self._digest_size] = digest
+
+    def _set_digests(self, first: int, digests: List[bytes]) -> None:
+        if self._digest_size == 0:
+            self._allocate_digests(len(digests[0]))
+        self._digests[first * self._digest_size : (first + len(digests)) * self._digest_size] = b"".join(digests)
+
+    def _update_digests(self, first: int, last: int) -> None:
+        """
+        Recompute the digests of the nodes first to last (exclusive) from their children, batch by batch.
+        """
+        size = self._digest_size
+        for start in range(first, last, DIGEST_BATCH_SIZE):
+            end = min(start + DIGEST_BATCH_SIZE, last)
+            inputs = [self._digests_view[2 * index * size : (2 * index + 2) * size] for index in range(start, end)]
+            self._set_digests(start, _digest_many(self._digest_func, inputs))
+
+    def _update_digest(self, index: int) -> None:
+        size = self._digest_size
+        self._set_digest(index, self._digest_func(self._digests_view[2 * index * size : (2 * index + 2) * size]))
+
+
+def _digest_many(digest_func: Callable[[Buffer], bytes], inputs: Sequence[Buffer]) -> List[bytes]:
+    """
+    Hash all inputs, in one call if the digest function provides a `many` method for batches (like
+    `bfebench.utils.keccak.keccak`).
+    """
+    many: Callable[[Sequence[Buffer]], List[bytes]] | None = getattr(digest_func, "many", None)
+    if many is not None:
+        return many(inputs)
+    return [digest_func(data) for data in inputs]
+
+
+def _subtree_levels(digest_func: Callable[[Buffer], bytes], leaves_data: Sequence[Buffer]) -> List[List[bytes]]:
+    levels = [_digest_many(digest_func, leaves_data)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        levels.append(_digest_many(digest_func, [level[i] + level[i + 1] for i in range(0, len(level), 2)]))
+    return levels
+
+
+def from_leaves(leaves: List[MerkleTreeLeaf], workers: int = 1) -> MerkleTreeNode:
     if len(leaves) == 0:
         raise ValueError("Cannot create tree from empty list")
     digest_func = leaves[0].digest_func
     for i in range(1, len(leaves)):
         if digest_func != leaves[i].digest_func:
             raise ValueError("All leaves have to use the same digest function!")
+    if len(leaves) > 1 and math.log2(len(leaves)).is_integer():
+        return FlatMerkleTree(digest_func, [leaf.data_view for leaf in leaves], workers=workers)
     nodes: List[MerkleTreeNode] = list(leaves)
     while len(nodes) > 1:
         nodes = [MerkleTreeNode(digest_func, *nodes[i : i + 2]) for i in range(0, len(nodes), 2)]
     return nodes[0]
 
 
-def from_bytes(data: bytes, digest_func: Callable[[bytes], bytes], slice_count: int = 8) -> MerkleTreeNode:
+def from_bytes(
+    data: Buffer, digest_func: Callable[[Buffer], bytes], slice_count: int = 8, workers: int = 1
+) -> MerkleTreeNode:
     if slice_count < 2 or not math.log2(slice_count).is_integer():
         raise ValueError("slices_count must be >= 2 integer and power of 2")
-    slice_len = math.ceil(len(data) / slice_count)
-    return from_leaves(
-        [
-            MerkleTreeLeaf(digest_func=digest_func, data=data[slice_len * s : slice_len * (s + 1)])
-            for s in range(slice_count)
-        ]
-    )
+    return FlatMerkleTree.from_buffer(digest_func, data, slice_count, workers)
 
 
-def from_list(items: List[bytes], digest_func: Callable[[bytes], bytes]) -> MerkleTreeNode:
+def from_file(
+    filename: str, digest_func: Callable[[Buffer], bytes], slice_count: int = 8, workers: int = 1
+) -> MerkleTreeNode:
+    """
+    Build the same tree as `from_bytes` on the file's content.
+
+    The file is memory-mapped and the leaves are views on the mapping, so its content is not copied into the process.
+    The file must not be modified while the tree is in use.
+    """
+    if slice_count < 2 or not math.log2(slice_count).is_integer():
+        raise ValueError("slices_count must be >= 2 integer and power of 2")
+    with open(filename, "rb") as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return from_bytes(b"", digest_func, slice_count, workers)  # empty files cannot be mapped
+        buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    return FlatMerkleTree.from_buffer(digest_func, memoryview(buffer), slice_count, workers)
+
+
+def digest_from_file(filename: str, digest_func: Callable[[Buffer], bytes], slice_count: int = 8) -> bytes:
+    """
+    Compute the root digest of `from_file` without building the tree.
+
+    Subtrees are folded as soon as they are complete, so only O(log n) digests and one slice are held in memory.
+    """
+    stack: List[bytes] = []
+    for slice_index, data in enumerate(read_slices(filename, slice_count)):
+        if (len(data) % 32) != 0:
+            raise ValueError("data length has to be a multiple of 32")
+        digest = digest_func(data)
+        while slice_index % 2 == 1:
+            digest = digest_func(stack.pop() + digest)
+            slice_index //= 2
+        stack.append(digest)
+    return stack[0]
+
+
+def read_slices(filename: str, slice_count: int) -> Iterator[bytes]:
+    """
+    Read the file slice by slice, with the same slice boundaries as `from_bytes` and `from_file`.
+    """
+    if slice_count < 2 or not math.log2(slice_count).is_integer():
+        raise ValueError("slices_count must be >= 2 integer and power of 2")
+    slice_len = math.ceil(os.path.getsize(filename) / slice_count)
+    with open(filename, "rb") as fp:
+        for _ in range(slice_count):
+            yield fp.read(slice_len)
+
+
+def from_list(items: List[bytes], digest_func: Callable[[Buffer], bytes]) -> MerkleTreeNode:
+    if len(items) > 1 and math.log2(len(items)).is_integer():
+        return FlatMerkleTree(digest_func, items)
     return from_leaves([MerkleTreeLeaf(digest_func=digest_func, data=item) for item in items])
 
 
@@ -206,7 +732,14 @@ def mt2obj(
     node: MerkleTreeNode,
     encode_func: Callable[[bytes], Union[bytes, str]] | None = None,
 ) -> Union[bytes, str, List[Any]]:
-    if isinstance(node, MerkleTreeLeaf):
+    if isinstance(node, FlatMerkleTreeNode):
+        # nest level by level instead of recursing through node views
+        objs: List[Any] = [mt2obj(leaf, encode_func) for leaf in node.leaves]
+        while len(objs) > 1:
+            objs = [[objs[i], objs[i + 1]] for i in range(0, len(objs), 2)]
+        root_obj: Union[bytes, str, List[Any]] = objs[0]
+        return root_obj
+    elif isinstance(node, MerkleTreeLeaf):
         if encode_func is None:
             return node.data
         else:
@@ -215,16 +748,85 @@ def mt2obj(
         return [mt2obj(child, encode_func) for child in node.children]
 
 
+def mt2bytes(node: MerkleTreeNode) -> bytes:
+    """
+    Serialize the leaves of the tree into the binary tree format, a compact alternative to `mt2obj`.
+
+    The format is a `TREE_BYTES_HEADER` followed by the concatenated leaf data. The header holds length and count of
+    the leading leaves (the slices) and of the trailing leaves, which have a different length (e.g. the digests in
+    trees created by `bfebench.protocols.fairswap.util.encode`). Other layouts cannot be serialized.
+    """
+    leaves_data = [leaf.data_view for leaf in node.leaves]
+    slice_length = len(leaves_data[0])
+    slice_count = next((i for i, data in enumerate(leaves_data) if len(data) != slice_length), len(leaves_data))
+    tail_length = len(leaves_data[slice_count]) if slice_count < len(leaves_data) else 0
+    if any(len(data) != tail_length for data in leaves_data[slice_count:]):
+        raise ValueError("leaves must consist of at most two runs of equal length")
+    header = TREE_BYTES_HEADER.pack(slice_length, slice_count, tail_length, len(leaves_data) - slice_count)
+    return b"".join(itertools.chain([header], leaves_data))
+
+
+def bytes2mt(data: Buffer, digest_func: Callable[[Buffer], bytes], workers: int = 1) -> MerkleTreeNode:
+    """
+    Inverse of `mt2bytes`. Trees with a power of 2 leaves are built as `FlatMerkleTree` on views of `data`, so
+    `data` must not be modified while the tree is in use.
+    """
+    view = memoryview(data)
+    if len(view) < TREE_BYTES_HEADER.size:
+        raise ValueError("data is too short to contain a tree header")
+    slice_length, slice_count, tail_length, tail_count = TREE_BYTES_HEADER.unpack_from(view)
+    start = TREE_BYTES_HEADER.size
+    boundary = start + slice_length * slice_count
+    if len(view) != boundary + tail_length * tail_count:
+        raise ValueError("data length does not match the tree header")
+    leaves_data = itertools.chain(
+        (view[start + slice_length * i : start + slice_length * (i + 1)] for i in range(slice_count)),
+        (view[boundary + tail_length * i : boundary + tail_length * (i + 1)] for i in range(tail_count)),
+    )
+    leaf_count = slice_count + tail_count
+    if leaf_count > 1 and math.log2(leaf_count).is_integer():
+        return FlatMerkleTree._from_views(digest_func, view[start:], leaves_data, leaf_count, workers)
+    return from_leaves([MerkleTreeLeaf(digest_func, leaf_data) for leaf_data in leaves_data])
+
+
 def obj2mt(
     data: Union[bytes, str, List[Any]],
-    digest_func: Callable[[bytes], bytes],
+    digest_func: Callable[[Buffer], bytes],
     decode_func: Callable[[Union[bytes, str]], bytes] | None = None,
 ) -> MerkleTreeNode:
     if isinstance(data, List):
+        leaves_data = _obj2leaves_data(data, decode_func)
+        if leaves_data is not None:
+            return FlatMerkleTree(digest_func, leaves_data)
         return MerkleTreeNode(digest_func, *[obj2mt(child, digest_func, decode_func) for child in data])
-    elif isinstance(data, bytes) and decode_func is None:
-        return MerkleTreeLeaf(digest_func, data)
+    else:
+        return MerkleTreeLeaf(digest_func, _obj2leaf_data(data, decode_func))
+
+
+def _obj2leaf_data(
+    data: Union[bytes, str, List[Any]],
+    decode_func: Callable[[Union[bytes, str]], bytes] | None = None,
+) -> bytes:
+    if isinstance(data, bytes) and decode_func is None:
+        return data
     elif (isinstance(data, bytes) or isinstance(data, str)) and decode_func is not None:
-        return MerkleTreeLeaf(digest_func, decode_func(data))
+        return decode_func(data)
     else:
         raise ValueError("cannot convert input of type %s to merkle tree" % type(data))
+
+
+def _obj2leaves_data(
+    data: List[Any],
+    decode_func: Callable[[Union[bytes, str]], bytes] | None = None,
+) -> List[bytes] | None:
+    """
+    Return the leaves of `data` from left to right if it describes a complete binary tree, otherwise None.
+    """
+    level: List[Any] = [data]
+    while all(isinstance(item, List) for item in level):
+        if not all(len(item) == 2 for item in level):
+            return None
+        level = list(itertools.chain.from_iterable(level))
+    if any(isinstance(item, List) for item in level):
+        return None
+    return [_obj2leaf_data(item, decode_func) for item in level]
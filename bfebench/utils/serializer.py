@@ -0,0 +1,152 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import json
+from base64 import b64encode
+from typing import Any, Dict, Sequence, Tuple, Type
+
+from .bytes import Buffer
+
+
+class Serializer(object):
+    """
+    Encoding of the objects sent over a `bfebench.utils.json_stream.JsonObjectSocketStream`.
+
+    Objects consist of what JSON can represent plus `bytes`. Serializers which cannot carry bytes natively send them
+    as base64 encoded strings, so receivers of bytes values have to accept both (see
+    `bfebench.protocols.fairswap.util.obj2tree`).
+    """
+
+    NAME = ""
+
+    # whether the output is a JSON document, which can be sent without framing
+    JSON = False
+
+    def dumps(self, obj: Any) -> bytes:
+        raise NotImplementedError()
+
+    def loads(self, data: Buffer) -> Any:
+        raise NotImplementedError()
+
+    def __reduce__(self) -> Tuple[Type[Serializer], Tuple[()]]:
+        # serializers are stateless, recreate them on unpickling instead of pickling the imported modules
+        return self.__class__, ()
+
+
+def _bytes_to_str(obj: Any) -> str:
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return b64encode(obj).decode()
+    raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+
+
+class JsonSerializer(Serializer):
+    NAME = "json"
+    JSON = True
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, default=_bytes_to_str).encode("utf-8")
+
+    def loads(self, data: Buffer) -> Any:
+        return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+class OrjsonSerializer(Serializer):
+    """
+    Produces the same documents as `JsonSerializer` (apart from whitespace), integers are limited to 64 bits.
+    """
+
+    NAME = "orjson"
+    JSON = True
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._orjson = orjson
+
+    def dumps(self, obj: Any) -> bytes:
+        data: bytes = self._orjson.dumps(obj, default=_bytes_to_str)
+        return data
+
+    def loads(self, data: Buffer) -> Any:
+        return self._orjson.loads(data)
+
+
+class MsgpackSerializer(Serializer):
+    """
+    Carries bytes natively, integers are limited to 64 bits.
+    """
+
+    NAME = "msgpack"
+
+    def __init__(self) -> None:
+        import msgpack  # type: ignore
+
+        self._msgpack = msgpack
+
+    def dumps(self, obj: Any) -> bytes:
+        data: bytes = self._msgpack.packb(obj, use_bin_type=True)
+        return data
+
+    def loads(self, data: Buffer) -> Any:
+        return self._msgpack.unpackb(data, raw=False)
+
+
+class CborSerializer(Serializer):
+    """
+    Carries bytes natively.
+    """
+
+    NAME = "cbor"
+
+    def __init__(self) -> None:
+        import cbor2  # type: ignore
+
+        self._cbor2 = cbor2
+
+    def dumps(self, obj: Any) -> bytes:
+        data: bytes = self._cbor2.dumps(obj)
+        return data
+
+    def loads(self, data: Buffer) -> Any:
+        return self._cbor2.loads(data)
+
+
+SERIALIZER_CLASSES: Sequence[Type[Serializer]] = [
+    JsonSerializer,
+    OrjsonSerializer,
+    MsgpackSerializer,
+    CborSerializer,
+]
+
+
+def get_available_serializers() -> Dict[str, Serializer]:
+    serializers = {}
+    for serializer_class in SERIALIZER_CLASSES:
+        try:
+            serializers[serializer_class.NAME] = serializer_class()
+        except ImportError:
+            pass
+    return serializers
+
+
+def get_serializer(name: str = JsonSerializer.NAME) -> Serializer:
+    serializers = get_available_serializers()
+    if name not in serializers:
+        raise ValueError("serializer '%s' is not available (available: %s)" % (name, ", ".join(serializers.keys())))
+    return serializers[name]
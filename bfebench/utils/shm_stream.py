@@ -0,0 +1,230 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from __future__ import annotations
+
+import struct
+import time
+from multiprocessing import Semaphore
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Iterable, Tuple
+
+from ..decorators import BLOCKED_P2P, blocked
+from .bytes import Buffer
+from .json_stream import (
+    FRAME_HEADER,
+    FRAME_MARKER,
+    JsonObjectSocketStream,
+    JsonObjectSocketStreamClosedUnexpectedly,
+    JsonObjectSocketStreamError,
+    JsonObjectSocketStreamForwarderStats,
+)
+from .serializer import Serializer
+
+DEFAULT_RING_SIZE = 2**22
+
+# positions of the 64 bit fields at the start of the ring's shared memory, the data starts at RING_DATA_OFFSET
+RING_FIELD = struct.Struct("Q")
+RING_HEAD, RING_TAIL, RING_MESSAGE_COUNT, RING_BYTE_COUNT, RING_CLOSED, RING_READER_CLOSED = range(6)
+RING_DATA_OFFSET = 64
+
+# seconds a writer waits for space before checking again whether the reader is still there
+RING_WRITER_POLL_INTERVAL = 1.0
+
+
+class SharedMemoryRingBuffer(object):
+    """
+    Byte ring buffer in shared memory for one writer and one reader process.
+
+    Head (written bytes) and tail (read bytes) only grow and are each changed by one side only, so no lock is needed.
+    A side which has to wait (for data or for space) blocks on a semaphore which the other side releases after each
+    change, instead of polling.
+    """
+
+    def __init__(self, size: int = DEFAULT_RING_SIZE) -> None:
+        self._shm = SharedMemory(create=True, size=RING_DATA_OFFSET + size)
+        if self._shm.buf is None:
+            raise JsonObjectSocketStreamError("could not map shared memory %s" % self._shm.name)
+        self._buf: memoryview = self._shm.buf
+        self._size = size
+        self._data_available = Semaphore(0)
+        self._space_available = Semaphore(0)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def message_count(self) -> int:
+        return self._get(RING_MESSAGE_COUNT)
+
+    @property
+    def byte_count(self) -> int:
+        return self._get(RING_BYTE_COUNT)
+
+    def _get(self, field: int) -> int:
+        value: int = RING_FIELD.unpack_from(self._buf, field * RING_FIELD.size)[0]
+        return value
+
+    def _set(self, field: int, value: int) -> None:
+        RING_FIELD.pack_into(self._buf, field * RING_FIELD.size, value)
+
+    def count_message(self, bytes_count: int) -> None:
+        self._set(RING_MESSAGE_COUNT, self.message_count + 1)
+        self._set(RING_BYTE_COUNT, self.byte_count + bytes_count)
+
+    def write(self, buffers: Iterable[Buffer]) -> None:
+        """
+        Write the buffers, waiting for space as long as the reader has not closed the ring.
+        """
+        for buffer in buffers:
+            view = memoryview(buffer)
+            written = 0
+            while written < len(view):
+                if self._get(RING_READER_CLOSED):
+                    raise JsonObjectSocketStreamClosedUnexpectedly
+                head = self._get(RING_HEAD)
+                free = self._size - (head - self._get(RING_TAIL))
+                if free == 0:
+                    self._space_available.acquire(timeout=RING_WRITER_POLL_INTERVAL)
+                    continue
+                n = min(free, len(view) - written)
+                self._copy_in(head % self._size, view[written : written + n])
+                self._set(RING_HEAD, head + n)
+                self._data_available.release()
+                written += n
+
+    def read_into(self, view: memoryview, deadline: float | None = None) -> bool:
+        """
+        Fill `view` with the next bytes, waiting for them until `deadline` (in terms of `time.monotonic`).
+
+        :return: False if the writer has closed the ring before any byte could be read
+        """
+        read = 0
+        while read < len(view):
+            tail = self._get(RING_TAIL)
+            available = self._get(RING_HEAD) - tail
+            if available == 0:
+                if self._get(RING_CLOSED):
+                    if read == 0:
+                        return False
+                    raise JsonObjectSocketStreamClosedUnexpectedly
+                timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+                with blocked(BLOCKED_P2P):
+                    acquired = self._data_available.acquire(timeout=timeout)
+                if not acquired:
+                    raise TimeoutError()
+                continue
+            n = min(available, len(view) - read)
+            self._copy_out(tail % self._size, view[read : read + n])
+            self._set(RING_TAIL, tail + n)
+            self._space_available.release()
+            read += n
+        return True
+
+    def _copy_in(self, position: int, data: memoryview) -> None:
+        first = min(len(data), self._size - position)
+        start = RING_DATA_OFFSET + position
+        self._buf[start : start + first] = data[:first]
+        self._buf[RING_DATA_OFFSET : RING_DATA_OFFSET + len(data) - first] = data[first:]
+
+    def _copy_out(self, position: int, view: memoryview) -> None:
+        first = min(len(view), self._size - position)
+        start = RING_DATA_OFFSET + position
+        view[:first] = self._buf[start : start + first]
+        view[first:] = self._buf[RING_DATA_OFFSET : RING_DATA_OFFSET + len(view) - first]
+
+    def close_writer(self) -> None:
+        self._set(RING_CLOSED, 1)
+        self._data_available.release()
+
+    def close_reader(self) -> None:
+        self._set(RING_READER_CLOSED, 1)
+        self._space_available.release()
+
+    def unlink(self) -> None:
+        self._shm.close()
+        self._shm.unlink()
+
+
+class SharedMemoryJsonObjectStream(JsonObjectSocketStream):
+    """
+    `JsonObjectSocketStream` sending framed messages through a `SharedMemoryRingBuffer` and receiving from another
+    one, without sockets and without a forwarder in between. Sent messages and bytes are counted in the ring.
+    """
+
+    def __init__(
+        self,
+        send_ring: SharedMemoryRingBuffer,
+        receive_ring: SharedMemoryRingBuffer,
+        serializer: Serializer | None = None,
+    ) -> None:
+        super().__init__(send_ring.name, framed=True, serializer=serializer)
+        self._send_ring = send_ring
+        self._receive_ring = receive_ring
+
+    def receive_object(self, timeout: float | None = None) -> Tuple[Any, int]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        header = bytearray(FRAME_HEADER.size)
+        if not self._receive_ring.read_into(memoryview(header), deadline):
+            return None, 0
+        _, payload_length = FRAME_HEADER.unpack(header)
+        payload = bytearray(payload_length)
+        if not self._receive_ring.read_into(memoryview(payload), deadline):
+            raise JsonObjectSocketStreamClosedUnexpectedly
+        return self.serializer.loads(payload), FRAME_HEADER.size + payload_length
+
+    def send_object(self, obj: Any) -> int:
+        data = self.serializer.dumps(obj)
+        bytes_count = FRAME_HEADER.size + len(data)
+        self._send_ring.count_message(bytes_count)
+        self._send_ring.write([FRAME_HEADER.pack(FRAME_MARKER, len(data)), data])
+        return bytes_count
+
+    def close(self) -> None:
+        self._send_ring.close_writer()
+        self._receive_ring.close_reader()
+
+
+class SharedMemoryChannel(object):
+    """
+    Pair of connected `SharedMemoryJsonObjectStream`s, with the same stats as
+    `bfebench.utils.json_stream.JsonObjectSocketStreamForwarder`.
+
+    The channel has to be created before the processes using its streams are started.
+    """
+
+    def __init__(self, ring_size: int = DEFAULT_RING_SIZE, serializer: Serializer | None = None) -> None:
+        self._ring_1to2 = SharedMemoryRingBuffer(ring_size)
+        self._ring_2to1 = SharedMemoryRingBuffer(ring_size)
+        self.stream1 = SharedMemoryJsonObjectStream(self._ring_1to2, self._ring_2to1, serializer)
+        self.stream2 = SharedMemoryJsonObjectStream(self._ring_2to1, self._ring_1to2, serializer)
+
+    def get_stats(self) -> JsonObjectSocketStreamForwarderStats:
+        return JsonObjectSocketStreamForwarderStats(
+            count_1to2=self._ring_1to2.message_count,
+            count_2to1=self._ring_2to1.message_count,
+            bytes_1to2=self._ring_1to2.byte_count,
+            bytes_2to1=self._ring_2to1.byte_count,
+        )
+
+    def close(self) -> None:
+        # a party still waiting to write (e.g. because the other one has died) fails instead of waiting forever
+        self._ring_1to2.close_reader()
+        self._ring_2to1.close_reader()
+        self._ring_1to2.unlink()
+        self._ring_2to1.unlink()
@@ -15,10 +15,34 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import math
+
+from .bytes import Buffer
+
+# upper bound for the length of the integers XOR-ed at once, larger inputs are processed chunk by chunk
+CHUNK_SIZE = 2**16
+
+
+def xor_crypt(data: Buffer, key: bytes) -> bytes:
+    """
+    XOR the data with the key repeated to the data's length. Instead of looping over single bytes, the data and the
+    keystream are converted to integers and XOR-ed in one operation per chunk.
+    """
+    if len(key) == 0:
+        raise ValueError("key must not be empty")
+    view = memoryview(data)
+    # chunk length is a multiple of the key length, so every chunk starts at the beginning of the key
+    key_repeats = max(min(math.ceil(len(view) / len(key)), CHUNK_SIZE // len(key)), 1)
+    chunk_len = key_repeats * len(key)
+    keystream = key * key_repeats
+    keystream_int = int.from_bytes(keystream, "big")
 
-def xor_crypt(data: bytes, key: bytes) -> bytes:
     result = bytearray()
-    for i in range(0, len(data), len(key)):
-        for x, y in zip(data[i : i + len(key)], key):
-            result.append(x ^ y)
+    for start in range(0, len(view), chunk_len):
+        chunk = view[start : start + chunk_len]
+        if len(chunk) == chunk_len:
+            chunk_key = keystream_int
+        else:
+            chunk_key = int.from_bytes(keystream[: len(chunk)], "big")
+        result += (int.from_bytes(chunk, "big") ^ chunk_key).to_bytes(len(chunk), "big")
     return bytes(result)
@@ -17,6 +17,7 @@
 
 import os
 from math import log2
+from tempfile import NamedTemporaryFile
 from typing import Tuple
 from unittest import TestCase
 
@@ -37,10 +38,18 @@ from bfebench.protocols.fairswap.util import (
     encode,
     encode_forge_first_leaf,
     encode_forge_first_leaf_first_hash,
-    keccak,
+    encode_from_file,
+    encode_stream,
+    find_complaint,
+    get_plain_root_digest,
+    keystream,
+    obj2tree,
+    tree2obj,
 )
 from bfebench.utils.bytes import generate_bytes
-from bfebench.utils.merkle import from_bytes, mt2obj, obj2mt
+from bfebench.utils.keccak import keccak
+from bfebench.utils.merkle import from_bytes, from_list, mt2obj, obj2mt
+from bfebench.utils.serializer import JsonSerializer
 
 
 class EncodingTest(TestCase):
@@ -66,6 +75,46 @@ class EncodingTest(TestCase):
             self.assertEqual(tree, tree_dec)
             self.assertEqual(tree.digest, tree_dec.digest)
 
+    def test_tree2obj2tree(self) -> None:
+        tree_enc = encode(from_bytes(generate_bytes(1024), keccak, 16), generate_bytes(32))
+        hex_obj, binary_obj = tree2obj(tree_enc), tree2obj(tree_enc, binary=True)
+        self.assertIsInstance(hex_obj, list)
+        self.assertIsInstance(binary_obj, bytes)
+        serializer = JsonSerializer()
+        self.assertLess(len(serializer.dumps(binary_obj)), len(serializer.dumps(hex_obj)) * 3 // 4)
+        for obj in [hex_obj, binary_obj, serializer.loads(serializer.dumps(binary_obj))]:
+            tree_enc2 = obj2tree(obj)
+            self.assertEqual(tree_enc.leaves, tree_enc2.leaves)
+            self.assertEqual(tree_enc.digest, tree_enc2.digest)
+
+    def test_encode_stream(self) -> None:
+        key = generate_bytes(32)
+        for size, slice_count in [(64, 2), (1024, 16), (2048, 32)]:
+            data = generate_bytes(size)
+            tree_enc = encode(from_bytes(data, keccak, slice_count), key)
+            slice_len = size // slice_count
+            leaves = [data[i * slice_len : (i + 1) * slice_len] for i in range(slice_count)]
+            self.assertEqual(list(encode_stream(leaves, key)), [leaf.data for leaf in tree_enc.leaves])
+
+            with NamedTemporaryFile() as fp:
+                fp.write(data)
+                fp.flush()
+                tree_enc_file = encode_from_file(fp.name, key, slice_count)
+            self.assertEqual(tree_enc_file.digest, tree_enc.digest)
+            self.assertEqual(get_plain_root_digest(tree_enc_file, key), from_bytes(data, keccak, slice_count).digest)
+
+        self.assertRaises(ValueError, list, encode_stream([B032] * 3, key))
+
+    def test_keystream_cache(self) -> None:
+        key = generate_bytes(32)
+        tree = from_bytes(generate_bytes(1024), keccak, 16)
+        keystream.cache_clear()
+        tree_dec, errors = decode(encode(tree, key), key)
+        self.assertEqual([], errors)
+        # one pad per encoded leaf (16 data leaves and 15 digests), computed by encode and reused by decode
+        self.assertEqual(keystream.cache_info().misses, 31)
+        self.assertEqual(keystream.cache_info().hits, 31)
+
     def test_encode_forge_first_leaf(self) -> None:
         tree = from_bytes(generate_bytes(128, seed=42), keccak, 4)
         tree_enc = encode_forge_first_leaf(tree, B032)
@@ -80,6 +129,33 @@ class EncodingTest(TestCase):
         self.assertEqual(1, len(errors))
         self.assertEqual(NodeDigestMismatchError, type(errors[0]))
 
+    def test_find_complaint(self) -> None:
+        key = generate_bytes(32)
+        tree = from_bytes(generate_bytes(1024, seed=42), keccak, 16)
+        self.assertIsNone(find_complaint(encode(tree, key), key))
+
+        for forged_index in [0, 5, 16, 24, 29]:
+            leaves = [leaf.data for leaf in encode(tree, key).leaves]
+            leaves[forged_index] = generate_bytes(len(leaves[forged_index]), avoid=leaves[forged_index])
+            tree_enc = from_list(leaves, keccak)
+            tree_dec, errors = decode(tree_enc, key)
+            complaint = find_complaint(tree_enc, key)
+            assert complaint is not None
+            self.assertEqual(type(complaint), type(errors[-1]))
+            self.assertEqual(complaint.index_in, errors[-1].index_in)
+            self.assertEqual(complaint.index_out, errors[-1].index_out)
+            self.assertEqual(complaint.actual_digest, errors[-1].actual_digest)
+
+    def test_decode_workers(self) -> None:
+        tree_enc = encode_forge_first_leaf(from_bytes(generate_bytes(1024, seed=42), keccak, 16), B032)
+        tree_dec, errors = decode(tree_enc, B032)
+        tree_dec_parallel, errors_parallel = decode(tree_enc, B032, workers=2)
+        self.assertEqual(tree_dec.digest, tree_dec_parallel.digest)
+        self.assertEqual([e.index_out for e in errors], [e.index_out for e in errors_parallel])
+        complaint = find_complaint(tree_enc, B032, workers=2)
+        assert complaint is not None
+        self.assertEqual(complaint.index_out, errors[-1].index_out)
+
 
 class ContractTest(TestCase):
     @staticmethod
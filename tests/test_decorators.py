@@ -0,0 +1,115 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from unittest import TestCase
+
+from bfebench.decorators import (
+    BLOCKED_CHAIN,
+    BLOCKED_P2P,
+    blocked,
+    get_blocked_times,
+    get_spans,
+    reset_blocked_times,
+    reset_spans,
+    span,
+)
+
+
+@span("decorated")
+def sleep_decorated(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+class SpanTest(TestCase):
+    def setUp(self) -> None:
+        reset_spans()
+
+    def tearDown(self) -> None:
+        reset_spans()
+
+    def test_context_manager(self) -> None:
+        for _ in range(3):
+            with span("block"):
+                time.sleep(0.01)
+        spans = get_spans()
+        self.assertEqual(list(spans.keys()), ["block"])
+        self.assertEqual(spans["block"].calls, 3)
+        self.assertGreaterEqual(spans["block"].seconds, 0.03)
+
+    def test_decorator(self) -> None:
+        self.assertEqual(sleep_decorated(0.01), 0.01)
+        self.assertEqual(sleep_decorated.__name__, "sleep_decorated")
+        self.assertEqual(get_spans()["decorated"].calls, 1)
+        self.assertGreaterEqual(get_spans()["decorated"].total_ns, 10**7)
+
+    def test_nested(self) -> None:
+        with span("outer"):
+            sleep_decorated(0.01)
+        spans = get_spans()
+        self.assertGreaterEqual(spans["outer"].total_ns, spans["decorated"].total_ns)
+
+    def test_exception(self) -> None:
+        with self.assertRaises(ValueError):
+            with span("failing"):
+                raise ValueError()
+        self.assertEqual(get_spans()["failing"].calls, 1)
+
+    def test_reset(self) -> None:
+        with span("block"):
+            pass
+        reset_spans()
+        self.assertEqual(get_spans(), {})
+
+
+class BlockedTest(TestCase):
+    def setUp(self) -> None:
+        reset_blocked_times()
+
+    def tearDown(self) -> None:
+        reset_blocked_times()
+
+    def test_blocked(self) -> None:
+        with blocked(BLOCKED_CHAIN):
+            time.sleep(0.01)
+        with blocked(BLOCKED_P2P):
+            time.sleep(0.02)
+        blocked_times = get_blocked_times()
+        self.assertGreaterEqual(blocked_times[BLOCKED_CHAIN], 0.01)
+        self.assertGreaterEqual(blocked_times[BLOCKED_P2P], 0.02)
+
+    def test_nested(self) -> None:
+        with blocked(BLOCKED_CHAIN):
+            with blocked(BLOCKED_P2P):
+                time.sleep(0.01)
+            time.sleep(0.01)
+        self.assertEqual(list(get_blocked_times().keys()), [BLOCKED_CHAIN])
+
+        # the nesting ends with the outermost section, even if it fails
+        with self.assertRaises(ValueError):
+            with blocked(BLOCKED_CHAIN):
+                raise ValueError()
+        with blocked(BLOCKED_P2P):
+            pass
+        self.assertIn(BLOCKED_P2P, get_blocked_times())
+
+    def test_blocked_is_not_a_span(self) -> None:
+        reset_spans()
+        with blocked(BLOCKED_CHAIN):
+            pass
+        self.assertEqual(get_spans(), {})
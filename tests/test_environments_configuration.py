@@ -53,3 +53,16 @@ class EnvironmentsConfigurationTest(TestCase):
             "0x98D5858f0347eCdEBBBa41067814C48Ed9B34153",
         )
         self.assertEqual(ec.buyer_environment.private_key, None)
+
+    def test_load_parallel(self) -> None:
+        ec = EnvironmentsConfiguration("./tests/testdata/environment-configuration-parallel.yaml")
+        self.assertEqual(len(ec.environment_sets), 2)
+        self.assertEqual(ec.environment_sets[0].seller_environment, ec.seller_environment)
+        self.assertEqual(
+            [environment.wallet_address for environment in ec.environment_sets[1]],
+            [
+                "0x7A8B7d50a76cE34e518A0830802dBFE6ADb6ef9c",
+                "0xbd8Ae831f910968e5755F4C3Da726E9472772D4D",
+                "0x7BBD65b9Cd93b6caef6d973CFb7c7B041488b5d7",
+            ],
+        )
@@ -16,12 +16,21 @@
 # limitations under the License.
 
 from unittest import TestCase
+from unittest.mock import patch
 
 from Crypto.Hash import keccak
 from eth_utils.crypto import keccak as eth_keccak
 from web3 import Web3
 
 from bfebench.utils.bytes import generate_bytes
+from bfebench.utils.keccak import (
+    EMPTY_KECCAK,
+    KECCAK_BACKEND_CLASSES,
+    PycryptodomeRawKeccakBackend,
+    get_available_backends,
+    get_backend,
+    keccak_many,
+)
 
 
 class KeccakEquivalenceTest(TestCase):
@@ -71,3 +80,32 @@ class KeccakEquivalenceTest(TestCase):
                 digest_bytes=32,
             ).digest(),
         )
+
+    def test_backends_equivalence(self) -> None:
+        backends = get_available_backends()
+        self.assertGreater(len(backends), 0)
+        inputs = [generate_bytes(32 * (i % 4 + 1)) for i in range(20)] + [b""]
+        expected = [eth_keccak(data) for data in inputs]
+        for name, backend in backends.items():
+            with self.subTest(backend=name):
+                self.assertEqual([backend.keccak(data) for data in inputs], expected)
+                self.assertEqual([backend.keccak(memoryview(data)) for data in inputs], expected)
+                self.assertEqual(backend.keccak_many(inputs), expected)
+                self.assertEqual(backend.keccak_many([]), [])
+        self.assertEqual(keccak_many(inputs), expected)
+
+    def test_backend_selection(self) -> None:
+        available = get_available_backends()
+        preferred = [backend_class.NAME for backend_class in KECCAK_BACKEND_CLASSES if backend_class.NAME in available]
+        self.assertEqual(get_backend().NAME, preferred[0])
+        self.assertEqual(get_backend(preferred[-1]).NAME, preferred[-1])
+        self.assertRaises(ValueError, get_backend, "unknown")
+
+    def test_incompatible_raw_backend(self) -> None:
+        self.assertEqual(eth_keccak(b""), EMPTY_KECCAK)
+        self.assertIn(PycryptodomeRawKeccakBackend.NAME, get_available_backends())
+        for side_effect in [lambda inputs: [bytes(32)], TypeError("wrong number of arguments")]:
+            with self.subTest(side_effect=side_effect):
+                with patch.object(PycryptodomeRawKeccakBackend, "keccak_many", side_effect=side_effect):
+                    self.assertRaises(ImportError, PycryptodomeRawKeccakBackend)
+                    self.assertNotIn(PycryptodomeRawKeccakBackend.NAME, get_available_backends())
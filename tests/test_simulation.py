@@ -0,0 +1,177 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import time
+from multiprocessing import active_children
+from typing import Any
+from unittest import TestCase
+
+from eth_typing.evm import ChecksumAddress
+from web3 import Web3
+
+from bfebench.environment import Environment
+from bfebench.environments_configuration import (
+    EnvironmentsConfiguration,
+    EnvironmentSet,
+)
+from bfebench.protocols import BuyerStrategy, Protocol, SellerStrategy
+from bfebench.simulation import WORKER_MODE_WARM, Simulation
+from bfebench.simulation_result_collector import SimulationResultCollector
+from bfebench.utils.json_stream import JsonObjectSocketStream
+
+from .test_strategy_process import OfflineEnvironment
+
+EXCHANGE_DURATION = 0.2
+
+
+class OfflineEnvironmentsConfiguration(EnvironmentsConfiguration):
+    def __init__(self, sets: int) -> None:
+        self._environment_sets = [
+            EnvironmentSet(
+                *[
+                    OfflineEnvironment(Web3(), wallet_address=Web3.toChecksumAddress("0x%040x" % (3 * i + j + 1)))
+                    for j in range(3)
+                ]
+            )
+            for i in range(sets)
+        ]
+
+
+class SleepingSeller(SellerStrategy[Protocol]):
+    def run(
+        self, environment: Environment, p2p_stream: JsonObjectSocketStream, opposite_address: ChecksumAddress
+    ) -> None:
+        time.sleep(EXCHANGE_DURATION)  # like waiting for a block
+        p2p_stream.send_object({"price": self.protocol.price})
+
+
+class ReceivingBuyer(BuyerStrategy[Protocol]):
+    def run(
+        self, environment: Environment, p2p_stream: JsonObjectSocketStream, opposite_address: ChecksumAddress
+    ) -> None:
+        received, _ = p2p_stream.receive_object(timeout=5)
+        assert received == {"price": self.protocol.price}
+
+
+class FailingSeller(SellerStrategy[Protocol]):
+    def run(
+        self, environment: Environment, p2p_stream: JsonObjectSocketStream, opposite_address: ChecksumAddress
+    ) -> None:
+        raise RuntimeError("seller failed")
+
+
+class SlowlySetUpProtocol(Protocol):
+    def __init__(self) -> None:
+        super().__init__(filename="", price=0)
+        self.iteration = 0
+
+    def set_up_iteration(
+        self, environment: Environment, seller_address: ChecksumAddress, buyer_address: ChecksumAddress
+    ) -> None:
+        time.sleep(EXCHANGE_DURATION)
+        self.iteration += 1
+
+
+class IterationReportingSeller(SellerStrategy[Protocol]):
+    def run(
+        self, environment: Environment, p2p_stream: JsonObjectSocketStream, opposite_address: ChecksumAddress
+    ) -> None:
+        time.sleep(EXCHANGE_DURATION)
+        assert isinstance(self.protocol, SlowlySetUpProtocol)
+        environment._total_tx_fees += self.protocol.iteration
+
+
+class IdleBuyer(BuyerStrategy[Protocol]):
+    def run(
+        self, environment: Environment, p2p_stream: JsonObjectSocketStream, opposite_address: ChecksumAddress
+    ) -> None:
+        pass
+
+
+class SimulationTest(TestCase):
+    def _simulate(self, iterations: int, parallel: int, **kwargs: Any) -> SimulationResultCollector:
+        protocol = Protocol(filename="", price=42)
+        result_collector = SimulationResultCollector()
+        Simulation(
+            environments_configuration=OfflineEnvironmentsConfiguration(2),
+            protocol=protocol,
+            seller_strategy=SleepingSeller(protocol),
+            buyer_strategy=ReceivingBuyer(protocol),
+            iterations=iterations,
+            result_collector=result_collector,
+            parallel=parallel,
+            **kwargs,
+        ).run()
+        return result_collector
+
+    def test_parallel(self) -> None:
+        for kwargs in [{}, {"worker_mode": WORKER_MODE_WARM}]:
+            with self.subTest(**kwargs):
+                start = time.monotonic()
+                result_collector = self._simulate(4, 2, **kwargs)
+                self.assertLess(time.monotonic() - start, 4 * EXCHANGE_DURATION)
+                self.assertEqual(len(result_collector.get_result().iteration_results), 4)
+
+    def test_parallel_without_environment_sets(self) -> None:
+        self.assertRaises(ValueError, self._simulate, 1, 3)
+
+    def test_failing_lane_stops_workers(self) -> None:
+        protocol = Protocol(filename="", price=42)
+        simulation = Simulation(
+            environments_configuration=OfflineEnvironmentsConfiguration(1),
+            protocol=protocol,
+            seller_strategy=FailingSeller(protocol),
+            buyer_strategy=ReceivingBuyer(protocol),
+            iterations=2,
+            result_collector=SimulationResultCollector(),
+            worker_mode=WORKER_MODE_WARM,
+        )
+        self.assertRaises(BaseException, simulation.run)
+        self.assertEqual(active_children(), [])
+        self.assertEqual(os.listdir(simulation._tmp_dir), [])  # the p2p channel has been closed
+
+    def test_pipeline(self) -> None:
+        for pipeline in [True, False]:
+            with self.subTest(pipeline=pipeline):
+                protocol = SlowlySetUpProtocol()
+                result_collector = SimulationResultCollector()
+                start = time.monotonic()
+                Simulation(
+                    environments_configuration=OfflineEnvironmentsConfiguration(1),
+                    protocol=protocol,
+                    seller_strategy=IterationReportingSeller(protocol),
+                    buyer_strategy=IdleBuyer(protocol),
+                    iterations=4,
+                    result_collector=result_collector,
+                    pipeline=pipeline,
+                ).run()
+                duration = time.monotonic() - start
+
+                # each iteration's strategies see the protocol state set up for it
+                self.assertEqual(
+                    [
+                        r.seller_result.environment_stats.tx_fees
+                        for r in result_collector.get_result().iteration_results
+                    ],
+                    [1, 2, 3, 4],
+                )
+                if pipeline:
+                    self.assertLess(duration, 6 * EXCHANGE_DURATION)
+                else:
+                    self.assertGreaterEqual(duration, 8 * EXCHANGE_DURATION)
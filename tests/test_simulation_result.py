@@ -0,0 +1,90 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Dict
+from unittest import TestCase
+
+from bfebench.decorators import SpanStats
+from bfebench.simulation_result import IterationResult, SimulationResult
+from bfebench.strategy_process import (
+    EnvironmentStatistics,
+    StrategyProcessResult,
+    SystemResourceUsage,
+    TimeStatistics,
+)
+from bfebench.utils.json_stream import JsonObjectSocketStreamForwarderStats
+
+
+def create_result(spans: Dict[str, SpanStats]) -> StrategyProcessResult:
+    return StrategyProcessResult(
+        realtime=1.0,
+        system_resource_stats=SystemResourceUsage(),
+        environment_stats=EnvironmentStatistics(tx_count=0, tx_fees=0, funds_diff=0),
+        time_stats=TimeStatistics(chain_wait=0.25, p2p_wait=0.5, compute=0.25),
+        spans=spans,
+    )
+
+
+class SimulationResultTest(TestCase):
+    def setUp(self) -> None:
+        self._simulation_result = SimulationResult()
+        for seller_spans in [{"encode": SpanStats(1, 2 * 10**9)}, {}]:
+            self._simulation_result.add_iteration_result(
+                IterationResult(
+                    seller_result=create_result(seller_spans),
+                    buyer_result=create_result({"accept": SpanStats(2, 10**9), "reveal": SpanStats(1, 5 * 10**8)}),
+                    p2p_result=JsonObjectSocketStreamForwarderStats(0, 0, 0, 0),
+                )
+            )
+
+    def test_columns(self) -> None:
+        columns = SimulationResult.get_columns(self._simulation_result.iteration_results[0])
+        self.assertEqual(len(columns), len(SimulationResult.get_headers()))
+        self.assertEqual(columns[SimulationResult.get_headers().index("S p2p")], 0.5)
+        self.assertEqual(columns[-2:], ["encode=2.000000", "accept=1.000000;reveal=0.500000"])
+
+    def test_existing_columns_first(self) -> None:
+        # new columns are appended, so existing result files keep their layout
+        self.assertEqual(
+            SimulationResult.get_headers()[:16],
+            [
+                "S real",
+                "B real",
+                "S user",
+                "B user",
+                "S sys",
+                "B sys",
+                "S>B bytes",
+                "B>S bytes",
+                "S>B obj",
+                "B>S obj",
+                "S Tx Ct",
+                "B Tx Ct",
+                "S Tx Fees (Gas)",
+                "B Tx Fees (Gas)",
+                "S Funds Diff (Eth)",
+                "B Funds Diff (Eth)",
+            ],
+        )
+
+    def test_span_names(self) -> None:
+        self.assertEqual(self._simulation_result.get_span_names(), ["accept", "encode", "reveal"])
+
+    def test_str(self) -> None:
+        output = str(self._simulation_result)
+        self.assertIn("Span", output)
+        self.assertIn("encode", output)
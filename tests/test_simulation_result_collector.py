@@ -0,0 +1,52 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from typing import List
+from unittest import TestCase
+
+from bfebench.simulation_result import SimulationResult
+from bfebench.simulation_result_collector import SimulationResultCollector
+
+
+class SimulationResultCollectorTest(TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = mkdtemp(prefix="bfebench-test-")
+        self._csv_file = os.path.join(self._tmp_dir, "results.csv")
+
+    def tearDown(self) -> None:
+        rmtree(self._tmp_dir, ignore_errors=True)
+
+    def _read_rows(self) -> List[List[str]]:
+        with open(self._csv_file, newline="") as f:
+            return list(csv.reader(f))
+
+    def test_append(self) -> None:
+        for i in range(2):
+            result_collector = SimulationResultCollector(csv_file=self._csv_file)
+            del result_collector
+        self.assertEqual(self._read_rows(), [["Start"] + SimulationResult.get_headers()])
+
+    def test_other_headers(self) -> None:
+        old_headers = ["Start"] + SimulationResult.get_headers()[:-1]
+        with open(self._csv_file, "w", newline="") as f:
+            csv.writer(f).writerow(old_headers)
+        self.assertRaises(ValueError, SimulationResultCollector, csv_file=self._csv_file)
+        self.assertEqual(self._read_rows(), [old_headers])
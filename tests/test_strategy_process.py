@@ -0,0 +1,96 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from eth_typing.evm import ChecksumAddress
+from web3 import Web3
+
+from bfebench.decorators import span
+from bfebench.environment import Environment
+from bfebench.errors import ProtocolError, ProtocolRuntimeError
+from bfebench.protocols import Protocol, Strategy
+from bfebench.strategy_process import StrategyWorker
+from bfebench.utils.async_json_stream import AsyncJsonObjectSocketStreamForwarder
+from bfebench.utils.json_stream import (
+    JsonObjectSocketStream,
+    JsonObjectUnixDomainSocketClientStream,
+)
+
+ADDRESS = Web3.toChecksumAddress("0x" + "11" * 20)
+
+
+class OfflineEnvironment(Environment):
+    def get_balance(self) -> int:
+        return -self.total_tx_fees
+
+
+class PriceSendingStrategy(Strategy[Protocol]):
+    def run(
+        self, environment: Environment, p2p_stream: JsonObjectSocketStream, opposite_address: ChecksumAddress
+    ) -> None:
+        if self.protocol.price < 0:
+            raise ProtocolRuntimeError("negative price")
+        environment._total_tx_count += 1
+        environment._total_tx_fees += self.protocol.price
+        with span("send"):
+            p2p_stream.send_object({"price": self.protocol.price})
+
+
+class StrategyWorkerTest(TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = mkdtemp(prefix="bfebench-test-")
+        self._worker = StrategyWorker(OfflineEnvironment(Web3(), wallet_address=ADDRESS), ADDRESS, name="seller")
+        self._worker.start()
+
+    def tearDown(self) -> None:
+        self._worker.stop()
+        rmtree(self._tmp_dir, ignore_errors=True)
+
+    def _run_iteration(self, iteration: int, price: int) -> None:
+        s1, s2 = os.path.join(self._tmp_dir, "s1-%d" % iteration), os.path.join(self._tmp_dir, "s2-%d" % iteration)
+        forwarder = AsyncJsonObjectSocketStreamForwarder(s1, s2)
+        forwarder.start()
+        c1 = JsonObjectUnixDomainSocketClientStream(s1, framed=True)
+        c2 = JsonObjectUnixDomainSocketClientStream(s2, framed=True)
+
+        self._worker.submit(PriceSendingStrategy(Protocol(filename="", price=price)), c1)
+        try:
+            if price >= 0:
+                self.assertEqual(c2.receive_object(timeout=5)[0], {"price": price})
+            result = self._worker.get_process_result()
+            self.assertEqual(result.environment_stats.tx_count, 1)
+            self.assertEqual(result.environment_stats.tx_fees, price)
+            self.assertEqual(result.environment_stats.funds_diff, -price)
+            self.assertEqual(list(result.spans.keys()), ["send"])  # spans of earlier iterations are not included
+            self.assertEqual(result.spans["send"].calls, 1)
+        finally:
+            c1.close()
+            c2.close()
+            forwarder.close()
+
+    def test_iterations(self) -> None:
+        for iteration, price in enumerate([10, 20, 30]):
+            self._run_iteration(iteration, price)
+
+    def test_strategy_failure(self) -> None:
+        self.assertRaises(ProtocolError, self._run_iteration, 0, -1)
+        self._run_iteration(1, 10)  # the worker keeps running
@@ -0,0 +1,127 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Thread
+from typing import Any, Tuple
+from unittest import TestCase
+
+from bfebench.utils.async_json_stream import (
+    AsyncJsonObjectSocketStreamForwarder,
+    AsyncJsonObjectStream,
+    EventLoopThread,
+)
+from bfebench.utils.json_stream import (
+    FRAME_HEADER,
+    JsonObjectSocketStreamClosedUnexpectedly,
+    JsonObjectUnixDomainSocketClientStream,
+)
+
+
+class AsyncJsonObjectSocketStreamForwarderTest(TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = mkdtemp(prefix="bfebench-test-")
+
+    def tearDown(self) -> None:
+        rmtree(self._tmp_dir, ignore_errors=True)
+
+    def test_forward(self) -> None:
+        s1, s2 = os.path.join(self._tmp_dir, "s1"), os.path.join(self._tmp_dir, "s2")
+        forwarder = AsyncJsonObjectSocketStreamForwarder(s1, s2)
+        forwarder.start()
+
+        c1 = JsonObjectUnixDomainSocketClientStream(s1, framed=True)
+        c2 = JsonObjectUnixDomainSocketClientStream(s2)
+
+        large = {"data": "ab" * 2**20}
+        sender = Thread(target=lambda: [c1.send_object(large), c1.send_object({"foo": "bar"})])
+        sender.start()
+        self.assertEqual(c2.receive_object(), (large, FRAME_HEADER.size + len(json.dumps(large))))
+        self.assertEqual(c2.receive_object(), ({"foo": "bar"}, FRAME_HEADER.size + 14))
+        sender.join()
+
+        c2.send_object({"reply": 42})
+        self.assertEqual(c1.receive_object(), ({"reply": 42}, 13))
+
+        stats = forwarder.get_stats()
+        self.assertEqual(stats.count_1to2, 2)
+        self.assertEqual(stats.bytes_1to2, 2 * FRAME_HEADER.size + len(json.dumps(large)) + 14)
+        self.assertEqual(stats.count_2to1, 1)
+        self.assertEqual(stats.bytes_2to1, 13)
+
+        c1.close()
+        c2.close()
+        forwarder.close()
+        self.assertFalse(os.path.exists(s1))
+        self.assertFalse(os.path.exists(s2))
+
+    def test_forward_eof(self) -> None:
+        s1, s2 = os.path.join(self._tmp_dir, "s1"), os.path.join(self._tmp_dir, "s2")
+        forwarder = AsyncJsonObjectSocketStreamForwarder(s1, s2)
+        forwarder.start()
+
+        c1 = JsonObjectUnixDomainSocketClientStream(s1, framed=True)
+        c2 = JsonObjectUnixDomainSocketClientStream(s2, framed=True)
+        c1.send_object({"foo": "bar"})
+        c1.close()
+        self.assertEqual(c2.receive_object(timeout=5), ({"foo": "bar"}, FRAME_HEADER.size + 14))
+        self.assertEqual(c2.receive_object(timeout=5), (None, 0))
+
+        c2.close()
+        forwarder.close()
+
+    def test_forward_closed_unexpectedly(self) -> None:
+        s1, s2 = os.path.join(self._tmp_dir, "s1"), os.path.join(self._tmp_dir, "s2")
+        forwarder = AsyncJsonObjectSocketStreamForwarder(s1, s2)
+        forwarder.start()
+
+        c1 = JsonObjectUnixDomainSocketClientStream(s1, framed=True)
+        c2 = JsonObjectUnixDomainSocketClientStream(s2, framed=True)
+        # the forwarder passes on what it has received, followed by the end of the stream
+        with self.assertLogs("bfebench.utils.async_json_stream", "ERROR"):
+            c1.socket_connection.sendall(FRAME_HEADER.pack(0, 100) + b"{")  # truncated frame
+            c1.close()
+            self.assertRaises(JsonObjectSocketStreamClosedUnexpectedly, c2.receive_object, 5)
+
+        c2.close()
+        forwarder.close()
+
+    def test_async_streams(self) -> None:
+        s1, s2 = os.path.join(self._tmp_dir, "s1"), os.path.join(self._tmp_dir, "s2")
+        event_loop = EventLoopThread.get_shared()
+        forwarder = AsyncJsonObjectSocketStreamForwarder(s1, s2, event_loop)
+        forwarder.start()
+
+        async def exchange() -> Tuple[Any, Any]:
+            c1 = await AsyncJsonObjectStream.open_unix_connection(s1, framed=True)
+            c2 = await AsyncJsonObjectStream.open_unix_connection(s2)
+            await c1.send_object({"foo": "bar"})
+            received1 = await c2.receive_object(timeout=5)
+            await c2.send_object({"reply": 42})
+            received2 = await c1.receive_object(timeout=5)
+            await c1.close()
+            await c2.close()
+            return received1, received2
+
+        self.assertEqual(
+            (({"foo": "bar"}, FRAME_HEADER.size + 14), ({"reply": 42}, 13)),
+            event_loop.run(exchange()),
+        )
+        forwarder.close()
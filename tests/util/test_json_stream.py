@@ -15,13 +15,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
 import os
+from multiprocessing import Process
 from shutil import rmtree
 from tempfile import mkdtemp
+from threading import Thread
 from time import sleep
+from typing import Any, List
 from unittest import TestCase
 
+from bfebench.decorators import BLOCKED_P2P, get_blocked_times, reset_blocked_times
+from bfebench.utils import json_stream
 from bfebench.utils.json_stream import (
+    FRAME_HEADER,
     JsonObjectSocketStreamForwarder,
     JsonObjectUnixDomainSocketClientStream,
     JsonObjectUnixDomainSocketServerStream,
@@ -71,6 +78,99 @@ class JsonObjectSocketStream(TestCase):
         received, bytes_count = server.receive_object()
         self.assertEqual(nested_test_data, received)
 
+    def test_framed(self) -> None:
+        server = JsonObjectUnixDomainSocketServerStream(os.path.join(self._tmp_dir, "socket"), framed=True)
+        client = JsonObjectUnixDomainSocketClientStream(os.path.join(self._tmp_dir, "socket"), chunk_size=16)
+        sleep(0.1)
+
+        # framed and unframed messages can be mixed
+        server.send_object({"foo": "bar"})
+        received, bytes_count = client.receive_object()
+        self.assertEqual(received, {"foo": "bar"})
+        self.assertEqual(bytes_count, FRAME_HEADER.size + 14)
+
+        client.send_object({"reply": 42})
+        received, bytes_count = server.receive_object()
+        self.assertEqual(received, {"reply": 42})
+        self.assertEqual(bytes_count, 13)
+
+        # frames larger than the socket buffer and received within the same chunk
+        large = {"data": "ab" * 2**20}
+        sender = Thread(target=lambda: [server.send_object(large), server.send_object({"small": True})])
+        sender.start()
+        self.assertEqual(client.receive_object(), (large, FRAME_HEADER.size + len(json.dumps(large))))
+        self.assertEqual(client.receive_object(), ({"small": True}, FRAME_HEADER.size + 15))
+        sender.join()
+
+    def test_blocked_time(self) -> None:
+        server = JsonObjectUnixDomainSocketServerStream(os.path.join(self._tmp_dir, "socket"))
+        client = JsonObjectUnixDomainSocketClientStream(os.path.join(self._tmp_dir, "socket"))
+        sleep(0.1)
+
+        def send_later() -> None:
+            sleep(0.2)
+            server.send_object({"foo": "bar"})
+
+        reset_blocked_times()
+        sender = Thread(target=send_later)
+        sender.start()
+        self.assertEqual(client.receive_object(), ({"foo": "bar"}, 14))
+        sender.join()
+        self.assertGreaterEqual(get_blocked_times()[BLOCKED_P2P], 0.15)
+
+    def test_unframed_same_chunk(self) -> None:
+        server = JsonObjectUnixDomainSocketServerStream(os.path.join(self._tmp_dir, "socket"))
+        client = JsonObjectUnixDomainSocketClientStream(os.path.join(self._tmp_dir, "socket"))
+        sleep(0.1)
+
+        client.socket_connection.sendall(b'{"a": 1}{"b": 2}')
+        self.assertEqual(server.receive_object(), ({"a": 1}, 8))
+        self.assertEqual(server.receive_object(timeout=1), ({"b": 2}, 8))
+
+    def test_partial_writes(self) -> None:
+        class PartialWritesSocket(object):
+            def __init__(self) -> None:
+                self.written = bytearray()
+
+            def sendmsg(self, buffers: List[memoryview]) -> int:
+                data = b"".join(buffers)[:5]
+                self.written += data
+                return len(data)
+
+            def sendall(self, data: bytes) -> None:
+                self.written += data
+
+        class PartialWritesStream(json_stream.JsonObjectSocketStream):
+            def __init__(self) -> None:
+                super().__init__("", framed=True)
+                self._socket_connection = PartialWritesSocket()
+
+            @property
+            def socket_connection(self) -> Any:
+                return self._socket_connection
+
+        stream = PartialWritesStream()
+        payload = json.dumps({"foo": "bar" * 10}).encode()
+        self.assertEqual(stream.send_object({"foo": "bar" * 10}), FRAME_HEADER.size + len(payload))
+        self.assertEqual(stream.socket_connection.written, FRAME_HEADER.pack(0, len(payload)) + payload)
+
+    def test_close_inherited(self) -> None:
+        server = JsonObjectUnixDomainSocketServerStream(os.path.join(self._tmp_dir, "socket"))
+        client = JsonObjectUnixDomainSocketClientStream(os.path.join(self._tmp_dir, "socket"))
+
+        def close_inherited_and_wait() -> None:
+            JsonObjectUnixDomainSocketClientStream.close_inherited()
+            sleep(5)
+
+        child = Process(target=close_inherited_and_wait, daemon=True)
+        child.start()
+        sleep(0.1)
+        client.close()
+        # the child must not keep the connection open
+        self.assertEqual(server.receive_object(timeout=1), (None, 0))
+        child.terminate()
+        child.join()
+
 
 class JsonObjectSocketStreamForwarderTest(TestCase):
     def setUp(self) -> None:
@@ -104,3 +204,32 @@ class JsonObjectSocketStreamForwarderTest(TestCase):
         stats = forwarder.get_stats()
         self.assertEqual(stats.count_1to2, 1)
         self.assertEqual(stats.bytes_1to2, 14)
+
+    def test_forward_framed(self) -> None:
+        s1 = JsonObjectUnixDomainSocketServerStream(os.path.join(self._tmp_dir, "s1"))
+        s2 = JsonObjectUnixDomainSocketServerStream(os.path.join(self._tmp_dir, "s2"))
+
+        forwarder = JsonObjectSocketStreamForwarder(s1, s2)
+        forwarder.start()
+
+        sleep(0.1)
+
+        c1 = JsonObjectUnixDomainSocketClientStream(os.path.join(self._tmp_dir, "s1"), framed=True)
+        c2 = JsonObjectUnixDomainSocketClientStream(os.path.join(self._tmp_dir, "s2"), framed=True)
+
+        sleep(0.1)
+        large = {"data": "ab" * 2**20}
+        sender = Thread(target=lambda: [c1.send_object(large), c1.send_object({"foo": "bar"})])
+        sender.start()
+        self.assertEqual(c2.receive_object(), (large, FRAME_HEADER.size + len(json.dumps(large))))
+        self.assertEqual(c2.receive_object(), ({"foo": "bar"}, FRAME_HEADER.size + 14))
+        sender.join()
+
+        c2.send_object({"reply": 42})
+        self.assertEqual(c1.receive_object(), ({"reply": 42}, FRAME_HEADER.size + 13))
+
+        stats = forwarder.get_stats()
+        self.assertEqual(stats.count_1to2, 2)
+        self.assertEqual(stats.bytes_1to2, 2 * FRAME_HEADER.size + len(json.dumps(large)) + 14)
+        self.assertEqual(stats.count_2to1, 1)
+        self.assertEqual(stats.bytes_2to1, FRAME_HEADER.size + 13)
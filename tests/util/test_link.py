@@ -0,0 +1,88 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+import time
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from bfebench.utils.async_json_stream import AsyncJsonObjectSocketStreamForwarder
+from bfebench.utils.json_stream import JsonObjectUnixDomainSocketClientStream
+from bfebench.utils.link import LinkProfile, LinkShaper, TokenBucket
+
+
+class TokenBucketTest(TestCase):
+    def test_reserve(self) -> None:
+        bucket = TokenBucket(rate=100, capacity=50)
+        self.assertEqual(bucket.reserve(50, 10.0), 10.0)  # initial burst
+        self.assertEqual(bucket.reserve(100, 10.0), 11.0)
+        self.assertEqual(bucket.reserve(100, 10.5), 12.0)  # still in debt
+        self.assertEqual(bucket.reserve(10, 20.0), 20.0)  # refilled, but not beyond the capacity
+        self.assertEqual(bucket.reserve(90, 20.0), 20.5)
+
+    def test_invalid_rate(self) -> None:
+        self.assertRaises(ValueError, TokenBucket, 0, 10)
+
+
+class LinkProfileTest(TestCase):
+    def test_validate(self) -> None:
+        LinkProfile(latency=0.1, bandwidth=1000).validate()
+        for profile in [LinkProfile(bandwidth=0), LinkProfile(bandwidth=-1), LinkProfile(latency=-0.1)]:
+            self.assertRaises(ValueError, profile.validate)
+            self.assertRaises(ValueError, LinkShaper, profile)
+
+
+class LinkShaperTest(TestCase):
+    def test_latency_and_bandwidth(self) -> None:
+        shaper = LinkShaper(LinkProfile(latency=0.5, bandwidth=1000, burst=0))
+        self.assertEqual(shaper.schedule(1000, 0.0), (1.0, 1.5))
+        self.assertEqual(shaper.schedule(500, 0.0), (1.5, 2.0))
+
+    def test_jitter_keeps_order(self) -> None:
+        shaper = LinkShaper(LinkProfile(latency=0.1, jitter=0.1, seed=1))
+        deliveries = [shaper.schedule(10, i * 0.01)[1] for i in range(100)]
+        self.assertEqual(deliveries, sorted(deliveries))
+        self.assertTrue(all(i * 0.01 <= delivery <= i * 0.01 + 0.2 for i, delivery in enumerate(deliveries)))
+
+
+class LinkForwarderTest(TestCase):
+    def setUp(self) -> None:
+        self._tmp_dir = mkdtemp(prefix="bfebench-test-")
+
+    def tearDown(self) -> None:
+        rmtree(self._tmp_dir, ignore_errors=True)
+
+    def test_latency(self) -> None:
+        s1, s2 = os.path.join(self._tmp_dir, "s1"), os.path.join(self._tmp_dir, "s2")
+        forwarder = AsyncJsonObjectSocketStreamForwarder(s1, s2, link_profile=LinkProfile(latency=0.1))
+        forwarder.start()
+        c1 = JsonObjectUnixDomainSocketClientStream(s1, framed=True)
+        c2 = JsonObjectUnixDomainSocketClientStream(s2, framed=True)
+
+        start = time.monotonic()
+        c1.send_object({"foo": "bar"})
+        self.assertEqual(c2.receive_object(timeout=5)[0], {"foo": "bar"})
+        c2.send_object({"reply": 42})
+        self.assertEqual(c1.receive_object(timeout=5)[0], {"reply": 42})
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)  # one round trip
+
+        self.assertEqual(forwarder.get_stats().count_1to2, 1)
+        c1.close()
+        c2.close()
+        forwarder.close()
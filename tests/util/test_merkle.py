@@ -17,14 +17,25 @@
 
 from base64 import b64decode, b64encode
 from math import log2
+from tempfile import NamedTemporaryFile
+from typing import List, Tuple
 from unittest import TestCase
 
-from bfebench.protocols.fairswap.util import B032, keccak
-from bfebench.utils.bytes import generate_bytes
+from bfebench.protocols.fairswap.util import B032
+from bfebench.utils.bytes import Buffer, generate_bytes
+from bfebench.utils.keccak import keccak
 from bfebench.utils.merkle import (
+    TREE_BYTES_HEADER,
+    FlatMerkleTree,
     MerkleTreeLeaf,
     MerkleTreeNode,
+    bytes2mt,
+    digest_from_file,
     from_bytes,
+    from_file,
+    from_leaves,
+    from_list,
+    mt2bytes,
     mt2obj,
     obj2mt,
 )
@@ -55,6 +66,33 @@ class MerkleTest(TestCase):
             MerkleTreeLeaf(keccak, B032),
         )
 
+    def test_digest_memoization(self) -> None:
+        digest_calls = []
+
+        def counting_keccak(data: Buffer) -> bytes:
+            digest_calls.append(data)
+            return keccak(data)
+
+        leaves = [MerkleTreeLeaf(counting_keccak, generate_bytes(32)) for _ in range(4)]
+        tree = MerkleTreeNode(
+            counting_keccak,
+            MerkleTreeNode(counting_keccak, leaves[0], leaves[1]),
+            MerkleTreeNode(counting_keccak, leaves[2], leaves[3]),
+        )
+        digest = tree.digest
+        self.assertEqual(len(digest_calls), 7)
+        self.assertEqual(tree.digest, digest)
+        self.assertEqual(len(tree.digests_pack), 3)
+        self.assertEqual(len(digest_calls), 7)
+
+        # changing leaf data invalidates the path to the root only
+        leaves[2].data = generate_bytes(32)
+        self.assertNotEqual(tree.digest, digest)
+        self.assertEqual(len(digest_calls), 10)
+        self.assertEqual(
+            tree.digest, keccak(keccak(keccak(leaves[0].data) + keccak(leaves[1].data)) + tree.children[1].digest)
+        )
+
     def test_get_proof_and_validate(self) -> None:
         for slice_count in [2, 4, 8, 16]:
             tree = from_bytes(generate_bytes(32 * slice_count), keccak, slice_count)
@@ -63,6 +101,43 @@ class MerkleTest(TestCase):
                 self.assertEqual(len(proof), int(log2(slice_count)))
                 self.assertTrue(MerkleTreeNode.validate_proof(tree.digest, leaf, index, proof, keccak))
 
+    def test_get_proof_by_index(self) -> None:
+        for slice_count in [2, 4, 8, 16]:
+            tree = from_bytes(generate_bytes(32 * slice_count), keccak, slice_count)
+            object_graph = FlatMerkleTest.build_object_graph([leaf.data for leaf in tree.leaves])
+            for index, leaf in enumerate(tree.leaves):
+                proof = tree.get_proof_by_index(index)
+                self.assertEqual(proof, tree.get_proof(leaf))
+                self.assertEqual(proof, object_graph.get_proof_by_index(index))
+                self.assertTrue(MerkleTreeNode.validate_proof(tree.digest, leaf, index, proof, keccak))
+            self.assertRaises(ValueError, tree.get_proof_by_index, slice_count)
+            self.assertRaises(ValueError, object_graph.get_proof_by_index, -1)
+
+    @staticmethod
+    def sorted_digests_pack(node: MerkleTreeNode) -> List[bytes]:
+        def collect(node: MerkleTreeNode, level: int) -> List[Tuple[bytes, int]]:
+            if isinstance(node, MerkleTreeLeaf):
+                return []
+            return [d for child in node.children for d in collect(child, level + 1)] + [(node.digest, level)]
+
+        return [digest for digest, level in sorted(collect(node, 0), key=lambda d: d[1], reverse=True)]
+
+    def test_digests_pack(self) -> None:
+        for leaf_count in range(1, 34):
+            items = [generate_bytes(32) for _ in range(leaf_count)]
+            trees = [from_list(items, keccak)]
+            if leaf_count > 1 and log2(leaf_count).is_integer():
+                trees.append(FlatMerkleTest.build_object_graph(items))
+            for tree in trees:
+                self.assertEqual(tree.digests_pack, self.sorted_digests_pack(tree))
+                self.assertEqual(len(tree.digests_pack), len(tree.digests_dfs))
+
+        leaves = [MerkleTreeLeaf(keccak, generate_bytes(32)) for _ in range(4)]
+        unbalanced = MerkleTreeNode(
+            keccak, leaves[0], MerkleTreeNode(keccak, MerkleTreeNode(keccak, leaves[1], leaves[2]), leaves[3])
+        )
+        self.assertEqual(unbalanced.digests_pack, self.sorted_digests_pack(unbalanced))
+
     def test_mt2obj2mt_plain(self) -> None:
         obj = mt2obj(self.EXAMPLE_TREE1)
         mt2 = obj2mt(obj, keccak)
@@ -87,6 +162,18 @@ class MerkleTest(TestCase):
     def test_obj2mt_error(self) -> None:
         self.assertRaises(ValueError, obj2mt, 3, keccak)
 
+    def test_from_file(self) -> None:
+        for size, slice_count in [(64, 2), (1024, 8), (32 * 4 * 32, 32)]:
+            data = generate_bytes(size)
+            with NamedTemporaryFile() as fp:
+                fp.write(data)
+                fp.flush()
+
+                tree = from_file(fp.name, keccak, slice_count)
+                self.assertEqual(tree.digest, from_bytes(data, keccak, slice_count).digest)
+                self.assertEqual(b"".join([leaf.data for leaf in tree.leaves]), data)
+                self.assertEqual(digest_from_file(fp.name, keccak, slice_count), tree.digest)
+
     def test_from_bytes_encode_decode(self) -> None:
         data = generate_bytes(32 * 2 * 16)
         tree_original = from_bytes(data, digest_func=keccak, slice_count=16)
@@ -102,3 +189,123 @@ class MerkleTest(TestCase):
 
         self.assertEqual(b"".join([leaf.data for leaf in tree_decoded.leaves]), data)
         self.assertEqual(tree_original.digest, tree_decoded.digest)
+
+
+class FlatMerkleTest(TestCase):
+    @staticmethod
+    def build_object_graph(items: List[bytes]) -> MerkleTreeNode:
+        nodes: List[MerkleTreeNode] = [MerkleTreeLeaf(keccak, item) for item in items]
+        while len(nodes) > 1:
+            nodes = [MerkleTreeNode(keccak, nodes[i], nodes[i + 1]) for i in range(0, len(nodes), 2)]
+        return nodes[0]
+
+    def test_object_graph_equivalence(self) -> None:
+        for slice_count in [2, 4, 8, 16, 32]:
+            items = [generate_bytes(64) for _ in range(slice_count)]
+            flat_tree = from_list(items, keccak)
+            object_graph = self.build_object_graph(items)
+
+            self.assertIsInstance(flat_tree, FlatMerkleTree)
+            self.assertEqual(flat_tree.digest, object_graph.digest)
+            self.assertEqual(flat_tree.digests_pack, object_graph.digests_pack)
+            self.assertEqual(flat_tree.digests_dfs, object_graph.digests_dfs)
+            self.assertEqual(flat_tree.leaves, object_graph.leaves)
+            self.assertEqual(mt2obj(flat_tree), mt2obj(object_graph))
+            self.assertEqual(flat_tree.children[1].digests_pack, object_graph.children[1].digests_pack)
+
+    def test_obj2mt_flat(self) -> None:
+        tree = obj2mt(mt2obj(self.build_object_graph([generate_bytes(32) for _ in range(8)])), keccak)
+        self.assertIsInstance(tree, FlatMerkleTree)
+
+        tree = obj2mt([[B032, B032], B032], keccak)
+        self.assertNotIsInstance(tree, FlatMerkleTree)
+        self.assertEqual(tree.digest, keccak(keccak(keccak(B032) + keccak(B032)) + keccak(B032)))
+
+    def test_mt2bytes2mt(self) -> None:
+        items = [generate_bytes(64) for _ in range(4)] + [generate_bytes(32) for _ in range(4)]
+        tree = from_list(items, keccak)
+        data = mt2bytes(tree)
+        self.assertEqual(TREE_BYTES_HEADER.pack(64, 4, 32, 4) + b"".join(items), data)
+        tree2 = bytes2mt(data, keccak)
+        self.assertIsInstance(tree2, FlatMerkleTree)
+        self.assertEqual(tree.digest, tree2.digest)
+        self.assertEqual(items, [leaf.data for leaf in tree2.leaves])
+
+        odd_tree = from_list([generate_bytes(32) for _ in range(3)], keccak)
+        self.assertEqual(odd_tree, bytes2mt(mt2bytes(odd_tree), keccak))
+
+    def test_mt2bytes2mt_error(self) -> None:
+        tree = from_list([generate_bytes(32), generate_bytes(64), generate_bytes(32), generate_bytes(64)], keccak)
+        self.assertRaises(ValueError, mt2bytes, tree)
+        data = mt2bytes(from_list([generate_bytes(32) for _ in range(4)], keccak))
+        self.assertRaises(ValueError, bytes2mt, data[:-1], keccak)
+        self.assertRaises(ValueError, bytes2mt, data[:3], keccak)
+
+    def test_set_leaf_data(self) -> None:
+        items = [generate_bytes(32) for _ in range(8)]
+        tree = from_list(items, keccak)
+        tree.leaves[5].data = items[5] = generate_bytes(64)
+        self.assertEqual(tree.digest, self.build_object_graph(items).digest)
+        self.assertEqual(b"".join(items), b"".join([leaf.data for leaf in tree.leaves]))
+
+    def test_from_buffer(self) -> None:
+        buffer = bytearray(generate_bytes(32 * 8))
+        tree = FlatMerkleTree.from_buffer(keccak, buffer, 8)
+        self.assertEqual(
+            tree.digest, from_list([bytes(buffer[32 * i : 32 * (i + 1)]) for i in range(8)], keccak).digest
+        )
+        self.assertIs(tree.leaves[3].data_view.obj, buffer)
+
+        view = tree.leaves[3].data_view
+        tree.leaves[3].data = B032
+        self.assertEqual(view, buffer[96:128])
+        self.assertEqual(tree.leaves[3].data, B032)
+        self.assertNotEqual(bytes(buffer[96:128]), B032)
+
+    def test_from_file_set_leaf_data(self) -> None:
+        data = generate_bytes(32 * 4)
+        with NamedTemporaryFile() as fp:
+            fp.write(data)
+            fp.flush()
+
+            tree = from_file(fp.name, keccak, 4)
+            tree.leaves[0].data = B032
+            self.assertEqual(tree.digest, from_list([B032, data[32:64], data[64:96], data[96:]], keccak).digest)
+            with open(fp.name, "rb") as f:
+                self.assertEqual(f.read(), data)
+
+    def test_invalid_leaf_count(self) -> None:
+        self.assertRaises(ValueError, FlatMerkleTree, keccak, [B032] * 3)
+        self.assertRaises(ValueError, FlatMerkleTree, keccak, [B032])
+
+    def test_parallel_build(self) -> None:
+        for slice_count in [2, 4, 8, 16, 64]:
+            data = generate_bytes(64 * slice_count)
+            serial = from_bytes(data, keccak, slice_count)
+            for workers in [2, 3, 4, 8, 128]:
+                parallel = from_bytes(data, keccak, slice_count, workers=workers)
+                self.assertEqual(parallel.digest, serial.digest)
+                self.assertEqual(parallel.digests_pack, serial.digests_pack)
+                self.assertEqual(parallel.leaves, serial.leaves)
+                self.assertEqual(from_leaves(serial.leaves, workers=workers).digests_pack, serial.digests_pack)
+
+        with NamedTemporaryFile() as fp:
+            fp.write(data)
+            fp.flush()
+            self.assertEqual(from_file(fp.name, keccak, 64, workers=4).digests_pack, serial.digests_pack)
+
+        self.assertRaises(ValueError, from_bytes, data, keccak, 64, 0)
+        self.assertRaises(ValueError, FlatMerkleTree, keccak, [B032] * 3, None, 2)
+
+    def test_multi_proof(self) -> None:
+        tree = from_list([generate_bytes(32) for _ in range(16)], keccak)
+        assert isinstance(tree, FlatMerkleTree)
+        leaf_digests = {index: tree.leaves[index].digest for index in [0, 1, 6, 13]}
+
+        proof = tree.get_multi_proof(list(leaf_digests.keys()))
+        self.assertEqual(set(proof.keys()), {23, 28, 9, 10, 15, 6})
+        self.assertTrue(FlatMerkleTree.validate_multi_proof(tree.digest, 16, leaf_digests, proof, keccak))
+
+        leaf_digests[6] = keccak(B032)
+        self.assertFalse(FlatMerkleTree.validate_multi_proof(tree.digest, 16, leaf_digests, proof, keccak))
+        self.assertFalse(FlatMerkleTree.validate_multi_proof(tree.digest, 16, {3: keccak(B032)}, proof, keccak))
@@ -0,0 +1,84 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from base64 import b64encode
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import sleep
+from unittest import TestCase
+
+from bfebench.utils.bytes import generate_bytes
+from bfebench.utils.json_stream import (
+    JsonObjectUnixDomainSocketClientStream,
+    JsonObjectUnixDomainSocketServerStream,
+)
+from bfebench.utils.serializer import (
+    JsonSerializer,
+    get_available_serializers,
+    get_serializer,
+)
+
+
+class SerializerTest(TestCase):
+    MESSAGE = {
+        "action": "initialize",
+        "price": 1000000000,
+        "signature": generate_bytes(65).hex(),
+        "tree": [["00" * 32, "ff" * 32], ["11" * 32, "22" * 32]],
+        "flags": [True, False, None],
+        "ratio": 0.5,
+    }
+
+    def test_round_trip(self) -> None:
+        for name, serializer in get_available_serializers().items():
+            with self.subTest(serializer=name):
+                self.assertEqual(self.MESSAGE, serializer.loads(serializer.dumps(self.MESSAGE)))
+                self.assertEqual(self.MESSAGE, serializer.loads(memoryview(serializer.dumps(self.MESSAGE))))
+
+    def test_bytes(self) -> None:
+        data = generate_bytes(64)
+        for name, serializer in get_available_serializers().items():
+            with self.subTest(serializer=name):
+                received = serializer.loads(serializer.dumps({"data": data}))["data"]
+                self.assertIn(received, [data, b64encode(data).decode()])
+                if serializer.JSON:
+                    self.assertEqual(received, b64encode(data).decode())
+
+    def test_get_serializer(self) -> None:
+        self.assertIsInstance(get_serializer(), JsonSerializer)
+        self.assertRaises(ValueError, get_serializer, "unknown")
+
+    def test_stream(self) -> None:
+        tmp_dir = mkdtemp(prefix="bfebench-test-")
+        try:
+            for name, serializer in get_available_serializers().items():
+                with self.subTest(serializer=name):
+                    socket_path = os.path.join(tmp_dir, name)
+                    server = JsonObjectUnixDomainSocketServerStream(socket_path, framed=True, serializer=serializer)
+                    client = JsonObjectUnixDomainSocketClientStream(socket_path, framed=True, serializer=serializer)
+                    sleep(0.1)
+                    bytes_count = client.send_object(self.MESSAGE)
+                    self.assertEqual(server.receive_object(), (self.MESSAGE, bytes_count))
+                    if not serializer.JSON:
+                        self.assertRaises(
+                            ValueError, JsonObjectUnixDomainSocketClientStream, socket_path, 4096, False, serializer
+                        )
+                    client.close()
+                    server.close()
+        finally:
+            rmtree(tmp_dir)
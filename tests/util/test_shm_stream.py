@@ -0,0 +1,74 @@
+# This file is part of the Blockchain-based Fair Exchange Benchmark Tool
+#    https://gitlab.com/MatthiasLohr/bfebench
+#
+# Copyright 2021-2022 Matthias Lohr <mail@mlohr.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from multiprocessing import Process
+from unittest import TestCase
+
+from bfebench.utils.json_stream import (
+    FRAME_HEADER,
+    JsonObjectSocketStream,
+    JsonObjectSocketStreamClosedUnexpectedly,
+)
+from bfebench.utils.shm_stream import SharedMemoryChannel
+
+
+def echo(stream: JsonObjectSocketStream) -> None:
+    while True:
+        received, _ = stream.receive_object()
+        if received is None:
+            break
+        stream.send_object(received)
+    stream.close()
+
+
+class SharedMemoryChannelTest(TestCase):
+    def test_exchange(self) -> None:
+        channel = SharedMemoryChannel(ring_size=1000)  # smaller than the messages, to wrap around while waiting
+        process = Process(target=echo, args=(channel.stream2,))
+        process.start()
+
+        messages = [{"foo": "bar"}, {"data": "ab" * 5000}, {"reply": 42}]
+        for message in messages:
+            bytes_count = channel.stream1.send_object(message)
+            self.assertEqual(bytes_count, FRAME_HEADER.size + len(json.dumps(message)))
+            self.assertEqual(channel.stream1.receive_object(timeout=5), (message, bytes_count))
+
+        channel.stream1.close()
+        self.assertEqual(channel.stream1.receive_object(timeout=5), (None, 0))
+        process.join()
+
+        stats = channel.get_stats()
+        total_bytes = sum(FRAME_HEADER.size + len(json.dumps(message)) for message in messages)
+        self.assertEqual((stats.count_1to2, stats.count_2to1), (3, 3))
+        self.assertEqual((stats.bytes_1to2, stats.bytes_2to1), (total_bytes, total_bytes))
+        channel.close()
+
+    def test_reader_closed(self) -> None:
+        channel = SharedMemoryChannel(ring_size=1000)
+        process = Process(target=channel.stream1.send_object, args=({"data": "ab" * 5000},))
+        process.start()
+        channel.stream2.close()  # while the writer is waiting for space
+        process.join(timeout=5)
+        self.assertEqual(process.exitcode, 1)
+        self.assertRaises(JsonObjectSocketStreamClosedUnexpectedly, channel.stream1.send_object, {"foo": "bar"})
+        channel.close()
+
+    def test_timeout(self) -> None:
+        channel = SharedMemoryChannel(ring_size=1000)
+        self.assertRaises(TimeoutError, channel.stream1.receive_object, 0.1)
+        channel.close()
@@ -17,7 +17,9 @@
 
 import os
 from unittest import TestCase
+from unittest.mock import patch
 
+from bfebench.utils import xor
 from bfebench.utils.xor import xor_crypt
 
 
@@ -27,3 +29,24 @@ class UtilXorTest(TestCase):
         key = os.urandom(13)
 
         self.assertEqual(data, xor_crypt(xor_crypt(data, key), key))
+
+    @staticmethod
+    def xor_crypt_bytewise(data: bytes, key: bytes) -> bytes:
+        result = bytearray()
+        for i in range(0, len(data), len(key)):
+            for x, y in zip(data[i : i + len(key)], key):
+                result.append(x ^ y)
+        return bytes(result)
+
+    def test_xor_crypt_bytewise_equivalence(self) -> None:
+        for chunk_size in [xor.CHUNK_SIZE, 32, 7]:
+            with patch.object(xor, "CHUNK_SIZE", chunk_size):
+                for data_len in [0, 1, 31, 32, 33, 64, 100, 1000]:
+                    for key_len in [1, 13, 32, 64]:
+                        data = os.urandom(data_len)
+                        key = os.urandom(key_len)
+                        self.assertEqual(xor_crypt(data, key), self.xor_crypt_bytewise(data, key))
+                        self.assertEqual(xor_crypt(memoryview(data), key), self.xor_crypt_bytewise(data, key))
+
+    def test_xor_crypt_empty_key(self) -> None:
+        self.assertRaises(ValueError, xor_crypt, b"foo", b"")
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import time
+import tracemalloc
+from typing import Callable, List
+
+from tabulate import tabulate
+
+from bfebench.utils.keccak import keccak
+from bfebench.utils.merkle import FlatMerkleTree, MerkleTreeLeaf, MerkleTreeNode
+
+argument_parser = argparse.ArgumentParser(
+    description="Compare build time and memory of the object graph and the flat Merkle tree implementation."
+)
+argument_parser.add_argument(
+    "--lower-boundary-power",
+    default=10,
+    metavar="I",
+    type=int,
+    help="Benchmarked input sizes start with 2^I bytes",
+)
+argument_parser.add_argument(
+    "--upper-boundary-power",
+    default=20,
+    metavar="J",
+    type=int,
+    help="Benchmarked input sizes end with 2^J bytes (use 30 for 1 GiB)",
+)
+argument_parser.add_argument(
+    "--object-graph-upper-boundary-power",
+    default=20,
+    metavar="K",
+    type=int,
+    help="Skip the object graph implementation for input sizes above 2^K bytes",
+)
+argument_parser.add_argument("--slice-length", default=32, type=int, help="Length of a single leaf in bytes")
+argument_parser.add_argument("--workers", default=1, type=int, help="Number of threads building the flat tree")
+args = argument_parser.parse_args()
+
+
+def build_object_graph(data: bytes, slice_count: int) -> MerkleTreeNode:
+    nodes: List[MerkleTreeNode] = [
+        MerkleTreeLeaf(keccak, data[args.slice_length * s : args.slice_length * (s + 1)]) for s in range(slice_count)
+    ]
+    while len(nodes) > 1:
+        nodes = [MerkleTreeNode(keccak, *nodes[i : i + 2]) for i in range(0, len(nodes), 2)]
+    nodes[0].digest  # object graph computes its digests lazily
+    return nodes[0]
+
+
+def build_flat(data: bytes, slice_count: int) -> MerkleTreeNode:
+    return FlatMerkleTree.from_buffer(keccak, data, slice_count, workers=args.workers)
+
+
+def measure(build: Callable[[bytes, int], MerkleTreeNode], data: bytes, slice_count: int) -> List[float]:
+    tracemalloc.start()
+    time_start = time.perf_counter()
+    tree = build(data, slice_count)
+    time_end = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tree
+    return [time_end - time_start, peak / 2**20]
+
+
+results = []
+for p in range(args.lower_boundary_power, args.upper_boundary_power + 1):
+    size = 2**p
+    slice_count = size // args.slice_length
+    if slice_count < 2:
+        continue
+    data = os.urandom(size)
+
+    if p <= args.object_graph_upper_boundary_power:
+        object_graph_result = measure(build_object_graph, data, slice_count)
+    else:
+        object_graph_result = [float("nan"), float("nan")]
+    flat_result = measure(build_flat, data, slice_count)
+
+    results.append([size, slice_count] + object_graph_result + flat_result)
+    print("finished %d bytes" % size, flush=True)
+
+print(
+    tabulate(
+        headers=["Bytes", "Leaves", "Graph time (s)", "Graph peak (MiB)", "Flat time (s)", "Flat peak (MiB)"],
+        tabular_data=results,
+    )
+)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+import argparse
+import time
+from typing import Any, Callable, List
+
+from tabulate import tabulate
+
+from bfebench.protocols.fairswap.util import encode, tree2obj
+from bfebench.utils.bytes import generate_bytes
+from bfebench.utils.keccak import keccak
+from bfebench.utils.merkle import from_bytes
+from bfebench.utils.serializer import get_available_serializers
+
+argument_parser = argparse.ArgumentParser(
+    description="Compare encoding time, decoding time and size of p2p messages for all available serializers."
+)
+argument_parser.add_argument("--slice-count", default=2**14, type=int, help="Number of slices of the sent tree")
+argument_parser.add_argument("--slice-length", default=64, type=int, help="Length of a single slice in bytes")
+argument_parser.add_argument("--repetitions", default=5, type=int, help="Number of measurements to average over")
+args = argument_parser.parse_args()
+
+tree_enc = encode(from_bytes(generate_bytes(args.slice_count * args.slice_length), keccak, args.slice_count), b"k" * 32)
+
+messages = {
+    "tree (hex lists)": {"action": "initialize", "tree": tree2obj(tree_enc)},
+    "tree (binary)": {"action": "initialize", "tree": tree2obj(tree_enc, binary=True)},
+    "state update": {
+        "action": "accept",
+        "price": 1000000000,
+        "signature": generate_bytes(65).hex(),
+        "file_root": generate_bytes(32).hex(),
+        "ciphertext_root": generate_bytes(32).hex(),
+    },
+}
+
+
+def measure(func: Callable[[], Any]) -> float:
+    time_start = time.perf_counter()
+    for _ in range(args.repetitions):
+        func()
+    return float((time.perf_counter() - time_start) / args.repetitions)
+
+
+results: List[List[Any]] = []
+for message_name, message in messages.items():
+    for serializer_name, serializer in get_available_serializers().items():
+        data = serializer.dumps(message)
+        results.append(
+            [
+                message_name,
+                serializer_name,
+                len(data),
+                measure(lambda: serializer.dumps(message)) * 1000,
+                measure(lambda: serializer.loads(data)) * 1000,
+            ]
+        )
+
+print(tabulate(headers=["Message", "Serializer", "Bytes", "Encode (ms)", "Decode (ms)"], tabular_data=results))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import time
+from typing import Callable, List
+
+from tabulate import tabulate
+
+from bfebench.utils.xor import xor_crypt
+
+argument_parser = argparse.ArgumentParser(
+    description="Measure the throughput of xor_crypt compared to the former byte by byte implementation."
+)
+argument_parser.add_argument(
+    "--lower-boundary-power",
+    default=10,
+    metavar="I",
+    type=int,
+    help="Benchmarked input sizes start with 2^I bytes",
+)
+argument_parser.add_argument(
+    "--upper-boundary-power",
+    default=24,
+    metavar="J",
+    type=int,
+    help="Benchmarked input sizes end with 2^J bytes (use 30 for 1 GiB)",
+)
+argument_parser.add_argument(
+    "--bytewise-upper-boundary-power",
+    default=20,
+    metavar="K",
+    type=int,
+    help="Skip the byte by byte implementation for input sizes above 2^K bytes",
+)
+argument_parser.add_argument("--key-length", default=32, type=int, help="Length of the key in bytes")
+args = argument_parser.parse_args()
+
+
+def xor_crypt_bytewise(data: bytes, key: bytes) -> bytes:
+    result = bytearray()
+    for i in range(0, len(data), len(key)):
+        for x, y in zip(data[i : i + len(key)], key):
+            result.append(x ^ y)
+    return bytes(result)
+
+
+def throughput(func: Callable[[bytes, bytes], bytes], data: bytes, key: bytes) -> float:
+    time_start = time.perf_counter()
+    func(data, key)
+    return len(data) / (time.perf_counter() - time_start) / 1e6
+
+
+key = os.urandom(args.key_length)
+results: List[List[float]] = []
+for p in range(args.lower_boundary_power, args.upper_boundary_power + 1):
+    data = os.urandom(2**p)
+    if p <= args.bytewise_upper_boundary_power:
+        bytewise_result = throughput(xor_crypt_bytewise, data, key)
+    else:
+        bytewise_result = float("nan")
+    results.append([2**p, bytewise_result, throughput(xor_crypt, data, key)])
+    print("finished %d bytes" % 2**p, flush=True)
+
+print(tabulate(headers=["Bytes", "Bytewise (MB/s)", "xor_crypt (MB/s)"], tabular_data=results))